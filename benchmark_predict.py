@@ -0,0 +1,343 @@
+#!/usr/bin/env python
+"""
+预测接口端到端基准测试
+
+用合成图像并发请求 /api/predict/（Django 测试客户端，进程内），统计总延迟与各阶段
+（解码、预处理、推理、支付）的 p50/p95/p99 以及每秒请求数，结果写入 JSON，便于比较
+不同预测模式（直接推理 / 微批处理）、推理后端和代码版本。
+
+测试在独立的临时数据库中进行，支付走本地模拟链（web3 的 EthereumTesterProvider，
+需要安装 eth-tester[py-evm]），不会触碰 db.sqlite3 和 Ganache。
+
+用法:
+    python benchmark_predict.py                                  # 随机初始化的 r8 模型
+    python benchmark_predict.py --task_id 1 --modes direct,batched --concurrency 16 --requests 500
+    python benchmark_predict.py --backend onnxruntime --output bench_onnx.json
+"""
+import argparse
+import contextvars
+import functools
+import io
+import json
+import os
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'federation_platform.settings')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.core.files.uploadedfile import SimpleUploadedFile  # noqa: E402
+from django.db import connection, connections  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.test.utils import override_settings, setup_test_environment  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from federation_app import blockchain_utils, business_logic, prediction  # noqa: E402
+from federation_app.models import FederationTask, ModelShareholding, User  # noqa: E402
+
+import preprocess  # noqa: E402  (federation_core 已由 prediction 加入 sys.path)
+from model_artifacts import find_task_dir, parse_task_dir_name, save_model_artifact  # noqa: E402
+from model_server import ModelServer  # noqa: E402
+from models.registry import create_model  # noqa: E402
+
+PHASES = ('decode', 'preprocess', 'inference', 'payment')
+BENCH_TASK_ID = 'bench'
+
+# ==================== 分阶段计时 ====================
+
+# 预测视图是异步的，推理与支付在线程池中执行；contextvars 会随调用传递过去
+_request_timings = contextvars.ContextVar('bench_request_timings', default=None)
+
+
+def _record(phase, seconds):
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[phase] = timings.get(phase, 0.0) + seconds * 1000.0
+
+
+def _timed(phase, func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _record(phase, time.perf_counter() - start)
+    return wrapper
+
+
+def _timed_future(phase, func):
+    """func 返回 Future，计时到 Future 完成为止（完成回调在微批处理线程中执行，提前取出本请求的计时表）"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        timings = _request_timings.get()
+        start = time.perf_counter()
+
+        def on_done(_):
+            if timings is not None:
+                timings[phase] = timings.get(phase, 0.0) + (time.perf_counter() - start) * 1000.0
+
+        future = func(*args, **kwargs)
+        future.add_done_callback(on_done)
+        return future
+    return wrapper
+
+
+def instrument():
+    """给预测路径的各阶段套上计时（推理从提交到微批处理器返回结果为止，含等待凑批的时间）"""
+    preprocess.decode_image = _timed('decode', preprocess.decode_image)
+    get_transform = preprocess.get_transform
+    preprocess.get_transform = lambda dataset_type: _timed('preprocess', get_transform(dataset_type))
+    ModelServer.submit_batched = _timed_future('inference', ModelServer.submit_batched)
+    service = business_logic.ModelUsageService
+    service.charge_and_distribute = staticmethod(_timed('payment', service.charge_and_distribute))
+
+
+# ==================== 测试环境 ====================
+
+def use_fake_chain():
+    """把业务逻辑使用的 web3 连接替换为进程内的模拟链（预置 10 个有余额的账户）"""
+    from web3 import EthereumTesterProvider, Web3
+
+    fake_w3 = Web3(EthereumTesterProvider())
+    blockchain_utils.w3 = fake_w3
+    business_logic.w3 = fake_w3
+    return fake_w3
+
+
+def create_test_database(db_dir):
+    """在临时文件中建立测试数据库（多线程共享，需要文件数据库而不是内存数据库）"""
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.settings_dict['TEST']['NAME'] = os.path.join(db_dir, 'bench.sqlite3')
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=False)
+    return old_name
+
+
+def create_synthetic_model(model_dir, architecture, dataset):
+    """随机初始化的模型，只用于测量延迟"""
+    model = create_model(architecture, dataset, num_classes=10)
+    save_model_artifact(model.state_dict(), {'epoch': 0, 'task_id': BENCH_TASK_ID, 'task_name': 'benchmark',
+                                             'architecture': architecture, 'dataset': dataset},
+                        os.path.join(model_dir, f'{BENCH_TASK_ID}_benchmark'))
+
+
+def create_task(task_id, task_name, architecture, dataset, shareholders, usage_fee):
+    creator = User.objects.create_user(username='bench_creator', password='bench', ganache_index=0)
+    client_user = User.objects.create_user(username='bench_client', password='bench', ganache_index=1)
+    task = FederationTask.objects.create(
+        task_id=task_id, task_name=task_name, status='completed', model_status='online',
+        payment_mode='shareholding', model_architecture=architecture, dataset=dataset,
+        usage_fee_per_request=Decimal(str(usage_fee)), creator=creator
+    )
+    for i in range(shareholders):
+        holder = User.objects.create_user(username=f'bench_holder_{i}', password='bench', ganache_index=2 + i)
+        ratio = Decimal(1) / Decimal(shareholders)
+        ModelShareholding.objects.create(task=task, user=holder, share_ratio=ratio, initial_contribution=ratio)
+    return task, client_user
+
+
+def synthetic_images(count, size, image_format):
+    """随机噪声图像（编码后的字节）"""
+    images = []
+    for _ in range(count):
+        image = Image.frombytes('RGB', (size, size), os.urandom(size * size * 3))
+        buffer = io.BytesIO()
+        image.save(buffer, format=image_format.upper())
+        images.append(buffer.getvalue())
+    return images
+
+
+# ==================== 压测 ====================
+
+def percentiles(values):
+    if not values:
+        return {'p50': None, 'p95': None, 'p99': None, 'mean': None}
+    ordered = sorted(values)
+
+    def rank(p):
+        return ordered[min(len(ordered) - 1, max(0, int(round(p / 100.0 * len(ordered))) - 1))]
+
+    return {'p50': rank(50), 'p95': rank(95), 'p99': rank(99), 'mean': sum(ordered) / len(ordered)}
+
+
+def run_load(user, task_id, dataset, images, requests, concurrency, extension):
+    """并发发起 requests 个预测请求，返回 (每个请求的记录, 总耗时秒)"""
+    counter = iter(range(requests))
+    counter_lock = threading.Lock()
+    records = []
+    records_lock = threading.Lock()
+
+    def worker():
+        client = Client()
+        client.force_login(user)
+        local = []
+        try:
+            while True:
+                with counter_lock:
+                    i = next(counter, None)
+                if i is None:
+                    break
+                upload = SimpleUploadedFile(f'bench_{i}.{extension}', images[i % len(images)])
+                timings = {}
+                token = _request_timings.set(timings)
+                start = time.perf_counter()
+                response = client.post('/api/predict/', {'image': upload, 'task_id': task_id,
+                                                         'dataset_type': dataset})
+                total = (time.perf_counter() - start) * 1000.0
+                body = response.json()
+                local.append({'total': total, 'success': bool(body.get('success')),
+                              'cached': bool(body.get('prediction', {}).get('cached')),
+                              'message': None if body.get('success') else body.get('message'),
+                              'phases': timings})
+                _request_timings.reset(token)
+        finally:
+            connections.close_all()
+        with records_lock:
+            records.extend(local)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    return records, time.perf_counter() - start
+
+
+def summarize(records, elapsed):
+    succeeded = [r for r in records if r['success']]
+    summary = {
+        'requests': len(records),
+        'succeeded': len(succeeded),
+        'failed': len(records) - len(succeeded),
+        'cached': sum(1 for r in succeeded if r['cached']),
+        'elapsed_s': elapsed,
+        'rps': len(succeeded) / elapsed if elapsed else None,
+        'latency_ms': percentiles([r['total'] for r in succeeded]),
+        'phases_ms': {phase: percentiles([r['phases'].get(phase, 0.0) for r in succeeded]) for phase in PHASES},
+    }
+    # 未计入上述阶段的部分：Django 请求处理、数据库读写、结果缓存查找等
+    summary['phases_ms']['other'] = percentiles(
+        [r['total'] - sum(r['phases'].get(p, 0.0) for p in PHASES) for r in succeeded])
+    errors = sorted({r['message'] for r in records if not r['success'] and r['message']})
+    if errors:
+        summary['errors'] = errors[:10]
+    return summary
+
+
+def print_summary(mode, summary):
+    print(f"\n[{mode}] {summary['succeeded']}/{summary['requests']} 成功, "
+          f"{summary['rps']:.1f} req/s, 耗时 {summary['elapsed_s']:.2f} s")
+    print(f"{'阶段':<12} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    rows = [('total', summary['latency_ms'])] + list(summary['phases_ms'].items())
+    for name, stats in rows:
+        if stats['p50'] is None:
+            continue
+        print(f"{name:<12} {stats['p50']:>10.2f} {stats['p95']:>10.2f} {stats['p99']:>10.2f}")
+    for error in summary.get('errors', []):
+        print(f"  错误: {error}")
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='预测接口端到端基准测试')
+    parser.add_argument('--task_id', type=str, help='使用 saved_models 中已发布的任务模型（默认随机初始化模型）')
+    parser.add_argument('--task_name', type=str,
+                        help='--task_id 对应的任务名称（模型目录为 <task_id>_<task_name>，目录唯一时可省略）')
+    parser.add_argument('--architecture', type=str, default='r8', help='随机初始化模型的结构')
+    parser.add_argument('--dataset_type', type=str, default='CIFAR10', choices=['CIFAR10', 'MNIST'])
+    parser.add_argument('--modes', type=str, default='direct,batched',
+                        help='逗号分隔的预测模式: direct（逐请求推理）/ batched（微批处理）')
+    parser.add_argument('--batch_size', type=int, default=16, help='batched 模式的微批大小')
+    parser.add_argument('--batch_wait_ms', type=int, default=5, help='batched 模式的微批等待时间')
+    parser.add_argument('--backend', type=str, default='pytorch', choices=['pytorch', 'onnxruntime'])
+    parser.add_argument('--requests', type=int, default=200, help='每种模式的请求数')
+    parser.add_argument('--concurrency', type=int, default=8, help='并发请求数')
+    parser.add_argument('--warmup', type=int, default=10, help='每种模式正式计时前的预热请求数')
+    parser.add_argument('--unique_images', type=int, default=0, help='不同图像数（默认与请求数相同）')
+    parser.add_argument('--image_size', type=int, default=256, help='合成图像边长（像素）')
+    parser.add_argument('--image_format', type=str, default='jpeg', choices=['jpeg', 'png'])
+    parser.add_argument('--shareholders', type=int, default=4, help='分红股东数（模拟链最多 8 个）')
+    parser.add_argument('--result_cache', action='store_true', help='保留预测结果缓存（默认关闭，测量真实推理）')
+    parser.add_argument('--output', type=str, default='benchmark_predict.json', help='结果 JSON 文件')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='bench_predict_')
+    old_db_name = create_test_database(work_dir)
+    use_fake_chain()
+    instrument()
+
+    if args.task_id:
+        task_id = args.task_id
+        model_dir = None
+        task_name = args.task_name
+        if task_name is None:
+            task_dir = find_task_dir(prediction.get_model_server().model_dir, task_id)
+            if task_dir is None:
+                raise SystemExit(f"未找到任务 {task_id} 的模型目录")
+            task_name = parse_task_dir_name(os.path.basename(task_dir))[1]
+    else:
+        task_id = BENCH_TASK_ID
+        task_name = 'benchmark'
+        model_dir = os.path.join(work_dir, 'saved_models')
+        create_synthetic_model(model_dir, args.architecture, args.dataset_type)
+
+    task, client_user = create_task(task_id, task_name, args.architecture, args.dataset_type, min(args.shareholders, 8), 0.01)
+    task.inference_backend = args.backend
+    task.save()
+
+    images = synthetic_images(args.unique_images or args.requests, args.image_size, args.image_format)
+    extension = 'jpg' if args.image_format == 'jpeg' else 'png'
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': time.time(),
+        'config': vars(args),
+        'modes': {},
+    }
+
+    prediction_config = dict(getattr(settings, 'PREDICTION_CONFIG', {}), model_dir=model_dir,
+                             preload_on_startup=False, watch_model_files=False)
+    if not args.result_cache:
+        prediction_config['result_cache_size'] = 0
+
+    with override_settings(PREDICTION_CONFIG=prediction_config):
+        for mode in [m.strip() for m in args.modes.split(',') if m.strip()]:
+            if mode not in ('direct', 'batched'):
+                print(f"未知模式 {mode}，跳过")
+                continue
+            task.predict_batch_size = args.batch_size if mode == 'batched' else 1
+            task.predict_batch_wait_ms = args.batch_wait_ms if mode == 'batched' else 0
+            task.save()
+            prediction.reset_prediction_state()
+
+            if args.warmup:
+                run_load(client_user, task_id, args.dataset_type, images, args.warmup, 1, extension)
+            records, elapsed = run_load(client_user, task_id, args.dataset_type, images, args.requests,
+                                        args.concurrency, extension)
+            summary = summarize(records, elapsed)
+            report['modes'][mode] = summary
+            print_summary(mode, summary)
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\n结果已写入 {args.output}")
+
+    connection.creation.destroy_test_db(old_db_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -16,10 +16,14 @@ contract FederationManager is Ownable {
         address[] participants;
     }
 
-    // 这里需要映射存储每个参与者的比例
+    // 这里需要映射存储每个参与者的比例（万分比）
     mapping(string => mapping(address => uint256)) public taskShareRatios;
     mapping(string => Task) public tasks;
 
+    // 模型使用费分红：每个股东一条 RevenueShared，余数（取整误差）转给 remainderTo
+    event RevenueShared(string taskId, address indexed shareholder, uint256 amount);
+    event RevenuePaid(string taskId, address indexed payer, uint256 amount, uint256 distributed, address remainderTo);
+
     // 这里的 Ownable(msg.sender) 是修复关键
     constructor(address payable _tokenAddress) Ownable(msg.sender) {
         token = HyperCoin(_tokenAddress);
@@ -51,6 +55,34 @@ contract FederationManager is Ownable {
         task.isCompleted = true;
     }
 
+    // 模型使用者随交易支付使用费（ETH），按 taskShareRatios 一次性分给全部参与者，
+    // 余数转给 _remainderTo（任务创建者）。一次预测只需一笔交易，与股东人数无关
+    function payRevenue(string memory _taskId, address payable _remainderTo) public payable {
+        Task storage task = tasks[_taskId];
+        require(task.isCompleted, "Task not completed");
+        require(msg.value > 0, "No fee paid");
+
+        uint256 distributed = 0;
+        for (uint i = 0; i < task.participants.length; i++) {
+            address payable user = payable(task.participants[i]);
+            uint256 userShare = (msg.value * taskShareRatios[_taskId][user]) / 10000;
+            if (userShare > 0) {
+                distributed += userShare;
+                require(distributed <= msg.value, "Ratios exceed 100%");
+                (bool sent, ) = user.call{value: userShare}("");
+                require(sent, "Revenue transfer failed");
+                emit RevenueShared(_taskId, user, userShare);
+            }
+        }
+
+        uint256 remainder = msg.value - distributed;
+        if (remainder > 0) {
+            (bool sent, ) = _remainderTo.call{value: remainder}("");
+            require(sent, "Remainder transfer failed");
+        }
+        emit RevenuePaid(_taskId, msg.sender, msg.value, distributed, _remainderTo);
+    }
+
     // 后续每次使用模型分发收益
     function distributeRevenue(string memory _taskId, uint256 _amount) public {
         Task storage task = tasks[_taskId];
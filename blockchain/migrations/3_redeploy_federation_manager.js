@@ -0,0 +1,11 @@
+const HyperCoin = artifacts.require("HyperCoin");
+const FederationManager = artifacts.require("FederationManager");
+
+// 重新部署带 payRevenue 的 FederationManager，沿用已部署的 HyperCoin（代币余额不变）。
+// 运行后 build/contracts/FederationManager.json 的 ABI 与地址随之更新:
+//   truffle migrate --network ganache -f 3 --to 3
+// 新合约中没有旧任务的股份比例，首次收费时后端会按数据库中的股份补写（ModelUsageService._revenue_contract）
+module.exports = async function (deployer) {
+  const token = await HyperCoin.deployed();
+  await deployer.deploy(FederationManager, token.address);
+};
@@ -1,6 +1,40 @@
+import os
+import sys
+import threading
+
 from django.apps import AppConfig
 
+# 由 ASGI/WSGI 入口（federation_platform/asgi.py、wsgi.py）在加载 Django 前设置，
+# 标记当前进程对外提供服务；管理命令、shell、测试等进程不会设置
+SERVING_ENV = 'FEDERATION_SERVING'
+
+
+def is_serving_process():
+    """当前进程是否处理 HTTP 请求：ASGI/WSGI 入口，或 runserver 实际处理请求的子进程"""
+    if os.environ.get(SERVING_ENV) == '1':
+        return True
+    if len(sys.argv) > 1 and os.path.basename(sys.argv[0]) == 'manage.py' and sys.argv[1] == 'runserver':
+        # 自动重载的父进程只负责监视代码变更，不处理请求
+        return '--noreload' in sys.argv or os.environ.get('RUN_MAIN') == 'true'
+    return False
+
+
 class FederationAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'federation_app'
-    verbose_name = '联邦学习应用'
\ No newline at end of file
+    verbose_name = '联邦学习应用'
+
+    def ready(self):
+        """服务进程启动后在后台预热上线模型并监听模型文件（其他进程不预热）"""
+        if not is_serving_process():
+            return
+
+        def warm_up():
+            try:
+                from .prediction import start_warm_serving
+                start_warm_serving()
+            except Exception as e:
+                import logging
+                logging.getLogger("logger").error(f"启动预测服务预热失败: {e}")
+
+        threading.Thread(target=warm_up, name='prediction-warmup', daemon=True).start()
@@ -97,13 +97,18 @@ def sync_contribution_to_chain(task_id, contribution_data, model_hash):
         ratios = []
 
         from .models import User
+        total_contribution = sum(float(c) for c in contribution_data.values())
+        if total_contribution <= 0:
+            print("总贡献度为0，跳过上链")
+            return False
         for user_id, contribution in contribution_data.items():
             user = User.objects.get(id=user_id)
 
             # 使用新的wallet_address属性
             if user.wallet_address:
                 addresses.append(user.wallet_address)
-                ratios.append(int(float(contribution) * 10000))  # 放大一万倍
+                # 归一化后放大一万倍（向下取整，总和不超过 100%，合约分红依赖这一点）
+                ratios.append(int(float(contribution) / total_contribution * 10000))
             else:
                 print(f"警告: 用户{user.username}(ID:{user_id})未绑定Ganache账户，跳过")
 
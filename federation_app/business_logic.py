@@ -70,40 +70,54 @@ class ShareManagementService:
         # ------------------------
 
         # 2. [新增逻辑] 同步到区块链
+        ShareManagementService.sync_share_ratios(task)
+
+        return created_holdings
+
+    @staticmethod
+    def sync_share_ratios(task, manager_contract=None):
+        """
+        把任务当前的股东钱包地址与股份比例写入 FederationManager（payRevenue 按这些比例分红）
+
+        Returns:
+            bool: 是否上链成功
+        """
         try:
-            manager_contract = get_contract('FederationManager')
+            if manager_contract is None:
+                manager_contract = get_contract('FederationManager')
             admin_account = w3.eth.accounts[0]  # 使用 Ganache 第一个账号作为管理员
-            
-            # 转换数据格式
+
+            # 转换数据格式：股东钱包地址与股份比例
             user_addresses = []
             ratios = []
-            for user_id, contribution in contribution_data.items():
-                # 暂时模拟地址：每个用户 ID 对应 Ganache 的一个账号
-                # 生产环境下你需要在 User 模型里加一个 wallet_address 字段
-                simulated_address = w3.eth.accounts[int(user_id) % 10]
-                user_addresses.append(simulated_address)
-                # Solidity 不支持浮点数，比例放大 10000 倍（例如 0.4567 -> 4567）
-                ratios.append(int(float(contribution) * 10000))
-
-            # 调用合约的 setContributionRatios 方法
+            for holding in ModelShareholding.objects.filter(task=task).select_related('user'):
+                if not holding.user.wallet_address:
+                    continue
+                user_addresses.append(holding.user.wallet_address)
+                # Solidity 不支持浮点数，比例放大 10000 倍（例如 0.4567 -> 4567），向下取整保证总和不超过 100%
+                ratios.append(int(holding.share_ratio * 10000))
+            if not user_addresses:
+                print(f"任务{task.task_id}没有绑定钱包的股东，跳过股份比例上链")
+                return False
+
             # model_hash 可以取模型文件的路径哈希
             model_hash = f"hash_{task.task_id}_{task.current_epoch}"
-            
+
             tx_hash = manager_contract.functions.setContributionRatios(
-                task.task_id, 
-                user_addresses, 
-                ratios, 
+                task.task_id,
+                user_addresses,
+                ratios,
                 model_hash
             ).transact({'from': admin_account})
-            
+
             # 等待交易确认
             receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
             print(f"区块链同步成功！交易哈希: {receipt.transactionHash.hex()}")
-            
+            return receipt.status == 1
+
         except Exception as e:
             print(f"区块链同步失败: {str(e)}")
-
-        return created_holdings
+            return False
 
     @staticmethod
     @transaction.atomic
@@ -209,15 +223,21 @@ class ModelUsageService:
 
     @staticmethod
     @transaction.atomic
-    def charge_and_distribute(task, user, prediction_result='', input_hash=''):
+    def charge_and_distribute(task, user, prediction_result='', input_hash='', quantity=1):
         """
         模型使用付费并自动分配收益给股东 - 使用ETH转账
 
+        股份制任务通过 FederationManager.payRevenue 一笔交易完成付费与分红（按链上 taskShareRatios），
+        只等待一次确认。payRevenue 需要用 blockchain/migrations/3_redeploy_federation_manager.js
+        重新编译部署合约后才可用；仓库中的 build/contracts 产物更新前，或股份比例上链失败时，
+        回退为逐个股东转账。
+
         Args:
             task: FederationTask实例
             user: 使用者User实例
             prediction_result: 预测结果
             input_hash: 输入数据哈希
+            quantity: 本次计费的预测次数（批量预测一次性合并收费）
 
         Returns:
             dict: 使用记录和分配详情
@@ -228,26 +248,34 @@ class ModelUsageService:
         if not user.wallet_address:
             raise ValueError(f"用户未绑定Ganache账户，无法使用模型")
 
-        usage_fee = task.usage_fee_per_request
+        usage_fee = task.usage_fee_per_request * quantity
 
         if user.eth_balance < float(usage_fee):
             raise ValueError(f"ETH余额不足，需要{usage_fee} ETH，当前余额{user.eth_balance:.4f} ETH")
 
         balance_before = user.eth_balance
 
-        # 将使用费转到任务创建者或收益池账户
-        # 简化处理：直接转给任务创建者
         if not task.creator or not task.creator.wallet_address:
             raise ValueError("任务创建者未绑定Ganache账户，无法收款")
 
-        # 执行ETH转账（用户->创建者）
         amount_wei = w3.to_wei(usage_fee, 'ether')
-        tx_hash = w3.eth.send_transaction({
-            'from': user.wallet_address,
-            'to': task.creator.wallet_address,
-            'value': amount_wei,
-            'gas': 21000
-        })
+        manager_contract = None
+        if task.payment_mode == 'shareholding':
+            manager_contract = ModelUsageService._revenue_contract(task)
+
+        if manager_contract is not None:
+            # 一笔交易：合约按 taskShareRatios 把使用费分给全部股东，余数转给创建者
+            tx_hash = manager_contract.functions.payRevenue(
+                task.task_id, task.creator.wallet_address
+            ).transact({'from': user.wallet_address, 'value': amount_wei})
+        else:
+            # 执行ETH转账（用户->创建者）
+            tx_hash = w3.eth.send_transaction({
+                'from': user.wallet_address,
+                'to': task.creator.wallet_address,
+                'value': amount_wei,
+                'gas': 21000
+            })
 
         receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
 
@@ -262,7 +290,7 @@ class ModelUsageService:
             amount=usage_fee,
             balance_before=Decimal(str(balance_before)),
             balance_after=Decimal(str(balance_after)),
-            description=f'使用模型{task.task_name}进行预测，交易哈希: {receipt.transactionHash.hex()[:10]}...',
+            description=f'使用模型{task.task_name}进行{quantity}次预测，交易哈希: {receipt.transactionHash.hex()[:10]}...',
             related_task=task
         )
 
@@ -270,86 +298,184 @@ class ModelUsageService:
             task=task,
             user=user,
             usage_fee=usage_fee,
-            usage_type='prediction',
+            usage_type='prediction' if quantity == 1 else 'batch_prediction',
             input_data_hash=input_hash,
             prediction_result=prediction_result
         )
 
         task.total_revenue += usage_fee
-        task.total_usage_count += 1
+        task.total_usage_count += quantity
         task.save()
 
         distributions = []
 
         # 如果是股份制模式，分配收益给股东
         if task.payment_mode == 'shareholding':
-            shareholdings = ModelShareholding.objects.filter(task=task)
-
-            for holding in shareholdings:
-                revenue_amount = usage_fee * holding.share_ratio
-
-                if not holding.user.wallet_address:
-                    print(f"警告: 股东{holding.user.username}未绑定Ganache账户，跳过分红")
-                    continue
-
-                shareholder_balance_before = holding.user.eth_balance
-
-                # 从创建者账户转账给股东
-                try:
-                    revenue_wei = w3.to_wei(revenue_amount, 'ether')
-                    dist_tx_hash = w3.eth.send_transaction({
-                        'from': task.creator.wallet_address,
-                        'to': holding.user.wallet_address,
-                        'value': revenue_wei,
-                        'gas': 21000
-                    })
-
-                    dist_receipt = w3.eth.wait_for_transaction_receipt(dist_tx_hash)
-
-                    if dist_receipt.status != 1:
-                        print(f"警告: 分红给{holding.user.username}失败")
-                        continue
-
-                    shareholder_balance_after = holding.user.eth_balance
-
-                    Transaction.objects.create(
-                        user=holding.user,
-                        transaction_type='revenue',
-                        amount=revenue_amount,
-                        balance_before=Decimal(str(shareholder_balance_before)),
-                        balance_after=Decimal(str(shareholder_balance_after)),
-                        description=f'模型{task.task_name}使用收益分红 ({float(holding.share_ratio*100):.2f}%)',
-                        related_task=task
-                    )
-
-                    RevenueDistribution.objects.create(
-                        task=task,
-                        shareholder=holding.user,
-                        revenue_amount=revenue_amount,
-                        source_usage=usage_record,
-                        share_ratio_snapshot=holding.share_ratio
-                    )
-
-                    distributions.append({
-                        'shareholder_id': holding.user.id,
-                        'shareholder_name': holding.user.username,
-                        'share_ratio': float(holding.share_ratio),
-                        'revenue_amount': float(revenue_amount),
-                        'tx_hash': dist_receipt.transactionHash.hex()
-                    })
-
-                except Exception as e:
-                    print(f"分红给股东{holding.user.username}失败: {e}")
-                    continue
+            if manager_contract is not None:
+                distributions = ModelUsageService._record_contract_distributions(
+                    task, usage_record, manager_contract, receipt)
+            else:
+                distributions = ModelUsageService._distribute_by_transfers(task, usage_fee, usage_record)
 
         return {
             'usage_record_id': usage_record.id,
             'usage_fee': float(usage_fee),
+            'quantity': quantity,
             'user_balance_after': user.eth_balance,
             'tx_hash': receipt.transactionHash.hex(),
             'distributions': distributions
         }
 
+    @staticmethod
+    def _revenue_contract(task):
+        """
+        返回可用于一笔交易分红的 FederationManager 合约；合约未重新部署（没有 payRevenue）
+        或任务股份比例尚未上链时返回 None，改用逐个股东转账
+        """
+        try:
+            manager_contract = get_contract('FederationManager')
+        except Exception as e:
+            print(f"加载FederationManager合约失败，改用逐个转账分红: {e}")
+            return None
+        if not any(item.get('name') == 'payRevenue' for item in manager_contract.abi):
+            print("FederationManager合约没有payRevenue方法（请用 truffle migrate -f 3 重新部署合约），改用逐个转账分红")
+            return None
+        # tasks() 返回 (taskId, creator, modelHash, rewardPool, isCompleted)
+        try:
+            registered = manager_contract.functions.tasks(task.task_id).call()[4]
+        except Exception as e:
+            print(f"查询任务{task.task_id}的链上状态失败，改用逐个转账分红: {e}")
+            return None
+        if not registered:
+            # 合约重新部署后链上没有旧任务的比例，按数据库中的股份补写一次
+            print(f"任务{task.task_id}的股份比例尚未上链，正在同步")
+            if not ShareManagementService.sync_share_ratios(task, manager_contract):
+                print(f"任务{task.task_id}的股份比例上链失败，改用逐个转账分红")
+                return None
+        return manager_contract
+
+    @staticmethod
+    def _record_contract_distributions(task, usage_record, manager_contract, receipt):
+        """
+        按 payRevenue 交易的 RevenueShared 事件记录每位股东实际收到的分红
+
+        余额取该交易所在区块前后的链上余额（Ganache 每笔交易单独出块，前一区块即交易前的状态）
+        """
+        paid = {}
+        for event in manager_contract.events.RevenueShared().process_receipt(receipt):
+            paid[event.args.shareholder] = paid.get(event.args.shareholder, 0) + event.args.amount
+
+        accounts = w3.eth.accounts
+        tx_hash = receipt.transactionHash.hex()
+        transactions = []
+        revenues = []
+        distributions = []
+        for holding in ModelShareholding.objects.filter(task=task).select_related('user'):
+            index = holding.user.ganache_index
+            address = accounts[index] if index is not None and index < len(accounts) else None
+            if address not in paid:
+                print(f"警告: 股东{holding.user.username}未收到链上分红（未绑定Ganache账户或比例为0）")
+                continue
+
+            revenue_amount = Decimal(str(w3.from_wei(paid[address], 'ether')))
+            shareholder_balance_before = Decimal(str(w3.from_wei(
+                w3.eth.get_balance(address, block_identifier=receipt.blockNumber - 1), 'ether')))
+            shareholder_balance_after = Decimal(str(w3.from_wei(
+                w3.eth.get_balance(address, block_identifier=receipt.blockNumber), 'ether')))
+
+            transactions.append(Transaction(
+                user=holding.user,
+                transaction_type='revenue',
+                amount=revenue_amount,
+                balance_before=shareholder_balance_before,
+                balance_after=shareholder_balance_after,
+                description=f'模型{task.task_name}使用收益分红 ({float(holding.share_ratio*100):.2f}%)',
+                related_task=task
+            ))
+            revenues.append(RevenueDistribution(
+                task=task,
+                shareholder=holding.user,
+                revenue_amount=revenue_amount,
+                source_usage=usage_record,
+                share_ratio_snapshot=holding.share_ratio
+            ))
+            distributions.append({
+                'shareholder_id': holding.user.id,
+                'shareholder_name': holding.user.username,
+                'share_ratio': float(holding.share_ratio),
+                'revenue_amount': float(revenue_amount),
+                'tx_hash': tx_hash
+            })
+
+        Transaction.objects.bulk_create(transactions)
+        RevenueDistribution.objects.bulk_create(revenues)
+        return distributions
+
+    @staticmethod
+    def _distribute_by_transfers(task, usage_fee, usage_record):
+        """逐个股东从创建者账户转账分红（合约不支持 payRevenue 时的回退）"""
+        distributions = []
+        shareholdings = ModelShareholding.objects.filter(task=task)
+
+        for holding in shareholdings:
+            revenue_amount = usage_fee * holding.share_ratio
+
+            if not holding.user.wallet_address:
+                print(f"警告: 股东{holding.user.username}未绑定Ganache账户，跳过分红")
+                continue
+
+            shareholder_balance_before = holding.user.eth_balance
+
+            # 从创建者账户转账给股东
+            try:
+                revenue_wei = w3.to_wei(revenue_amount, 'ether')
+                dist_tx_hash = w3.eth.send_transaction({
+                    'from': task.creator.wallet_address,
+                    'to': holding.user.wallet_address,
+                    'value': revenue_wei,
+                    'gas': 21000
+                })
+
+                dist_receipt = w3.eth.wait_for_transaction_receipt(dist_tx_hash)
+
+                if dist_receipt.status != 1:
+                    print(f"警告: 分红给{holding.user.username}失败")
+                    continue
+
+                shareholder_balance_after = holding.user.eth_balance
+
+                Transaction.objects.create(
+                    user=holding.user,
+                    transaction_type='revenue',
+                    amount=revenue_amount,
+                    balance_before=Decimal(str(shareholder_balance_before)),
+                    balance_after=Decimal(str(shareholder_balance_after)),
+                    description=f'模型{task.task_name}使用收益分红 ({float(holding.share_ratio*100):.2f}%)',
+                    related_task=task
+                )
+
+                RevenueDistribution.objects.create(
+                    task=task,
+                    shareholder=holding.user,
+                    revenue_amount=revenue_amount,
+                    source_usage=usage_record,
+                    share_ratio_snapshot=holding.share_ratio
+                )
+
+                distributions.append({
+                    'shareholder_id': holding.user.id,
+                    'shareholder_name': holding.user.username,
+                    'share_ratio': float(holding.share_ratio),
+                    'revenue_amount': float(revenue_amount),
+                    'tx_hash': dist_receipt.transactionHash.hex()
+                })
+
+            except Exception as e:
+                print(f"分红给股东{holding.user.username}失败: {e}")
+                continue
+
+        return distributions
+
     @staticmethod
     def check_model_available(task):
         """检查模型是否可用"""
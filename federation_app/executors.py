@@ -0,0 +1,102 @@
+"""
+ASGI 异步视图使用的有界线程池与按模型的并发上限
+
+推理、链上调用（Web3/Ganache 与支付事务）和任务状态查询分别在固定大小的线程池中执行，
+事件循环只等待结果，一个 ASGI worker 可以同时挂起大量请求。推理线程只负责解码并提交给
+微批处理器，批次结果通过 asyncio.wrap_future 在事件循环上等待，因此线程数不限制批大小。线程池的排队长度由
+InflightLimiter 约束：某个模型同时处理中的预测请求达到上限后，新请求直接返回 429。
+配置见 settings.ASYNC_CONFIG。
+"""
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+DEFAULT_WORKERS = {
+    'inference': 8,
+    'chain': 4,
+    'status': 4,
+}
+
+_executors = {}
+_lock = threading.Lock()
+_limiter = None
+
+
+def _config():
+    return getattr(settings, 'ASYNC_CONFIG', {})
+
+
+def get_executor(kind):
+    """返回（必要时创建）kind 对应的线程池：inference / chain / status"""
+    executor = _executors.get(kind)
+    if executor is None:
+        with _lock:
+            executor = _executors.get(kind)
+            if executor is None:
+                workers = _config().get(f'{kind}_workers', DEFAULT_WORKERS[kind])
+                executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'async-{kind}')
+                _executors[kind] = executor
+    return executor
+
+
+def _run_with_connections(func, *args, **kwargs):
+    # 线程池线程不经过请求周期，按请求的方式打开/回收数据库连接
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def offload(kind, func, *args, **kwargs):
+    """在 kind 对应的线程池中执行阻塞调用并等待结果（保留调用方的 contextvars）"""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, _run_with_connections, func, *args, **kwargs)
+    return await loop.run_in_executor(get_executor(kind), call)
+
+
+class InflightLimiter:
+    """按键（任务）限制同时处理中的请求数，超出时立即拒绝而不是排队"""
+
+    def __init__(self, limit):
+        self.limit = max(1, int(limit))
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def try_acquire(self, key):
+        with self._lock:
+            count = self._inflight.get(key, 0)
+            if count >= self.limit:
+                self.rejected += 1
+                return False
+            self._inflight[key] = count + 1
+            return True
+
+    def release(self, key):
+        with self._lock:
+            count = self._inflight.get(key, 0) - 1
+            if count > 0:
+                self._inflight[key] = count
+            else:
+                self._inflight.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {'limit': self.limit, 'inflight': dict(self._inflight), 'rejected': self.rejected}
+
+
+def get_inflight_limiter():
+    """返回进程内共享的按模型并发上限"""
+    global _limiter
+    if _limiter is None:
+        with _lock:
+            if _limiter is None:
+                _limiter = InflightLimiter(_config().get('max_inflight_per_model', 32))
+    return _limiter
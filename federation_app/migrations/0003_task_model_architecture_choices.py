@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("federation_app", "0002_user_ganache_index_alter_user_balance_and_more"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="federationtask",
+            name="model_architecture",
+            field=models.CharField(choices=[("CNN", "CNN"), ("cnn_small", "CNN-Small (MNIST)"), ("r8", "ResNet8"), ("r8_half", "ResNet8-0.5x"), ("r8_slim", "ResNet8-0.25x"), ("r18", "ResNet18"), ("r34", "ResNet34")], default="r8", max_length=20, verbose_name="模型结构"),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('federation_app', '0003_task_model_architecture_choices'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='federationtask',
+            name='predict_batch_size',
+            field=models.IntegerField(default=16, verbose_name='预测微批大小'),
+        ),
+        migrations.AddField(
+            model_name='federationtask',
+            name='predict_batch_wait_ms',
+            field=models.IntegerField(default=5, verbose_name='预测微批等待时间(毫秒)'),
+        ),
+    ]
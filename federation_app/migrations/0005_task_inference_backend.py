@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('federation_app', '0004_task_predict_batching'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='federationtask',
+            name='inference_backend',
+            field=models.CharField(choices=[('pytorch', 'PyTorch'), ('onnxruntime', 'ONNX Runtime')], default='pytorch', max_length=20, verbose_name='推理后端'),
+        ),
+    ]
@@ -59,7 +59,10 @@ class FederationTask(models.Model):
 
     MODEL_CHOICES = [
         ('CNN', 'CNN'),
+        ('cnn_small', 'CNN-Small (MNIST)'),
         ('r8', 'ResNet8'),
+        ('r8_half', 'ResNet8-0.5x'),
+        ('r8_slim', 'ResNet8-0.25x'),
         ('r18', 'ResNet18'),
         ('r34', 'ResNet34'),
     ]
@@ -74,6 +77,11 @@ class FederationTask(models.Model):
         ('shareholding', '股份制模式'),
     ]
 
+    INFERENCE_BACKENDS = [
+        ('pytorch', 'PyTorch'),
+        ('onnxruntime', 'ONNX Runtime'),
+    ]
+
     MODEL_STATUS = [
         ('training', '训练中'),
         ('online', '已上线'),
@@ -100,6 +108,9 @@ class FederationTask(models.Model):
     usage_fee_per_request = models.DecimalField(max_digits=10, decimal_places=2, default=0.50, verbose_name="单次使用费")
     total_revenue = models.DecimalField(max_digits=10, decimal_places=2, default=0.00, verbose_name="累计收益")
     total_usage_count = models.IntegerField(default=0, verbose_name="累计使用次数")
+    predict_batch_size = models.IntegerField(default=16, verbose_name="预测微批大小")
+    predict_batch_wait_ms = models.IntegerField(default=5, verbose_name="预测微批等待时间(毫秒)")
+    inference_backend = models.CharField(max_length=20, choices=INFERENCE_BACKENDS, default='pytorch', verbose_name="推理后端")
     creator = models.ForeignKey('User', on_delete=models.SET_NULL, null=True, blank=True, related_name='created_tasks', verbose_name="创建者")
 
     class Meta:
@@ -0,0 +1,288 @@
+"""
+进程内预测服务入口：Django 进程内共享一个 ModelServer，按 settings.PREDICTION_CONFIG 配置
+"""
+import logging
+import os
+import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import torch
+from django.conf import settings
+
+# 添加 federation_core 到 Python 路径
+FEDERATION_CORE_PATH = os.path.join(settings.BASE_DIR, 'federation_core')
+if FEDERATION_CORE_PATH not in sys.path:
+    sys.path.insert(0, FEDERATION_CORE_PATH)
+
+from model_server import ModelServer  # noqa: E402
+from model_watcher import ModelWatcher  # noqa: E402
+from preprocess import preprocess_bytes  # noqa: E402
+from result_cache import ResultCache, content_hash  # noqa: E402
+
+logger = logging.getLogger("logger")
+
+_server = None
+_server_lock = threading.Lock()
+_decode_pool = None
+_result_cache = None
+_watcher = None
+_task_names = {}
+
+
+def _config():
+    return getattr(settings, 'PREDICTION_CONFIG', {})
+
+
+def get_model_server():
+    """返回进程内共享的模型服务，首次调用时创建"""
+    global _server
+    if _server is None:
+        with _server_lock:
+            if _server is None:
+                config = _config()
+                _server = ModelServer(
+                    model_dir=config.get('model_dir') or os.path.join(FEDERATION_CORE_PATH, 'saved_models'),
+                    max_models=config.get('model_cache_size', 8),
+                    max_memory_mb=config.get('model_cache_memory_mb', 512),
+                    intra_op_threads=config.get('onnx_intra_op_threads', 2),
+                    logger=logger,
+                    task_name_resolver=task_name
+                )
+    return _server
+
+
+def task_name(task_id):
+    """
+    任务ID -> 任务名称（来自 FederationTask 记录，任务名称创建后不变，结果缓存在进程内）。
+    模型目录按 "<task_id>_<task_name>" 定位；任务不存在时抛出 FileNotFoundError
+    """
+    from .models import FederationTask
+
+    task_id = str(task_id)
+    name = _task_names.get(task_id)
+    if name is None:
+        name = FederationTask.objects.filter(task_id=task_id).values_list('task_name', flat=True).first()
+        if name is None:
+            raise FileNotFoundError(f"任务 {task_id} 不存在")
+        _task_names[task_id] = name
+    return name
+
+
+def get_result_cache():
+    """返回进程内共享的预测结果缓存，首次调用时创建"""
+    global _result_cache
+    if _result_cache is None:
+        with _server_lock:
+            if _result_cache is None:
+                config = _config()
+                _result_cache = ResultCache(max_entries=config.get('result_cache_size', 10000),
+                                            ttl_seconds=config.get('result_cache_ttl', 3600))
+    return _result_cache
+
+
+def reset_prediction_state():
+    """丢弃进程内共享的模型服务与结果缓存，下次使用时按当前配置重建（基准测试切换配置时使用）"""
+    global _server, _result_cache
+    with _server_lock:
+        _server = None
+        _result_cache = None
+        _task_names.clear()
+
+
+def _model_version(task_id, version, backend=None):
+    """结果缓存键中的模型版本（加载的模型文件轮次 + mtime + 推理后端）"""
+    return get_model_server().get_model(task_id, version, backend).cache_version
+
+
+def resolve_dataset_type(task_id, dataset_type=None, version=None, backend=None):
+    """
+    预测使用的数据集类型：默认取加载的模型元数据中记录的数据集；请求指定的数据集与之不一致时
+    抛出 ValueError（按错误的预处理推理只会得到无意义的结果）
+    """
+    loaded = get_model_server().get_model(task_id, version, backend)
+    if dataset_type and dataset_type != loaded.dataset:
+        raise ValueError(f"指定的数据集 {dataset_type} 与模型训练数据集 {loaded.dataset} 不一致")
+    return loaded.dataset
+
+
+def submit_prediction(image_data, task_id, dataset_type='CIFAR10', version=None, max_batch_size=1, max_wait_ms=0,
+                      input_hash=None, backend=None):
+    """
+    从内存中的图像数据解码预处理并提交给缓存的模型，返回结果的 concurrent Future，不等待推理完成；
+    max_batch_size > 1 时并发请求经微批处理器合并推理。异步视图用 asyncio.wrap_future 在事件循环上
+    等待，推理线程池的线程不会在批次凑满前被占住。
+    相同内容（按 blake2b 哈希）在同一模型版本上的结果直接取自结果缓存，返回值中 cached 标明是否命中。
+    backend 为任务选择的推理后端（pytorch / onnxruntime）。
+    """
+    key = (str(task_id), _model_version(task_id, version, backend), dataset_type,
+           input_hash or content_hash(image_data))
+    cache = get_result_cache()
+    result = Future()
+    cached = cache.get(key)
+    if cached is not None:
+        result.set_result(dict(cached, cached=True))
+        return result
+
+    image_tensor = preprocess_bytes(image_data, dataset_type)
+    # 置为运行中后不可取消：客户端断开时请求照常完成并写入结果缓存，回调中的 set_result 不会失败
+    result.set_running_or_notify_cancel()
+    pending = get_model_server().submit_batched(task_id, image_tensor, dataset_type, version,
+                                                max_batch_size=max_batch_size, max_wait_ms=max_wait_ms,
+                                                backend=backend)
+
+    def on_done(future):
+        try:
+            prediction = future.result()
+        except Exception as e:
+            result.set_exception(e)
+            return
+        cache.put(key, prediction)
+        result.set_result(dict(prediction, cached=False))
+
+    pending.add_done_callback(on_done)
+    return result
+
+
+def _get_decode_pool():
+    global _decode_pool
+    if _decode_pool is None:
+        with _server_lock:
+            if _decode_pool is None:
+                _decode_pool = ThreadPoolExecutor(max_workers=_config().get('decode_workers', 4),
+                                                  thread_name_prefix='predict-decode')
+    return _decode_pool
+
+
+def _decode(item, dataset_type):
+    name, data = item
+    try:
+        return preprocess_bytes(data, dataset_type), None
+    except Exception as e:
+        return None, f"图像解码失败: {e}"
+
+
+class PreparedBatch:
+    """
+    已查完结果缓存并完成解码、尚未推理的一批图像（prepare_batch_prediction 的返回值）
+
+    调用方可以先按 succeeded（将会成功的图像数）计费检查，再调用 run() 推理
+    """
+
+    def __init__(self, items, hashes, unique, outcomes, valid, task_id, model_version, dataset_type, version,
+                 backend):
+        self.items = items
+        self.hashes = hashes
+        self._unique = unique
+        self._outcomes = outcomes  # 哈希 -> (预测结果, 错误, 是否命中缓存)
+        self._valid = valid        # [(下标, 张量)]，待推理
+        self._task_id = task_id
+        self._model_version = model_version
+        self._dataset_type = dataset_type
+        self._version = version
+        self._backend = backend
+        # 命中缓存或解码成功的图像（批内重复的按张计）
+        self.succeeded = sum(1 for h in hashes if h not in outcomes or outcomes[h][0] is not None)
+
+    def _cache_key(self, input_hash):
+        return str(self._task_id), self._model_version, self._dataset_type, input_hash
+
+    def run(self):
+        """
+        推理未命中缓存的图像
+
+        Returns:
+            与 items 一一对应的结果列表，每项为 {'name', 'input_hash', 'success', 'prediction' 或 'error'}
+        """
+        cache = get_result_cache()
+        chunk_size = max(1, int(_config().get('batch_chunk_size', 256)))
+        server = get_model_server()
+        for start in range(0, len(self._valid), chunk_size):
+            chunk = self._valid[start:start + chunk_size]
+            images = torch.stack([tensor for _, tensor in chunk])
+            predictions = server.predict_batch(self._task_id, images, self._dataset_type, self._version,
+                                               self._backend)
+            for (i, _), prediction in zip(chunk, predictions):
+                cache.put(self._cache_key(self.hashes[i]), prediction)
+                self._outcomes[self.hashes[i]] = (prediction, None, False)
+        self._valid = []
+
+        results = []
+        for i, ((name, _), input_hash) in enumerate(zip(self.items, self.hashes)):
+            prediction, error, hit = self._outcomes[input_hash]
+            if prediction is None:
+                results.append({'name': name, 'input_hash': input_hash, 'success': False, 'error': error})
+            else:
+                # 批内重复的图像也视为命中缓存
+                hit = hit or self._unique[input_hash] != i
+                results.append({'name': name, 'input_hash': input_hash, 'success': True,
+                                'prediction': dict(prediction, cached=hit)})
+        return results
+
+
+def prepare_batch_prediction(items, task_id, dataset_type='CIFAR10', version=None, backend=None):
+    """
+    批量预测第一步：[(文件名, 字节)] 按内容哈希去重并查结果缓存，未命中的图像并行解码；
+    返回的 PreparedBatch.run() 按 batch_chunk_size 分块批量推理
+    """
+    hashes = [content_hash(data) for _, data in items]
+    cache = get_result_cache()
+    model_version = _model_version(task_id, version, backend)
+
+    # 每个不同的内容只查一次缓存、最多推理一次
+    unique = {}
+    for i, input_hash in enumerate(hashes):
+        unique.setdefault(input_hash, i)
+    outcomes = {}
+    pending = []
+    for input_hash, i in unique.items():
+        cached = cache.get((str(task_id), model_version, dataset_type, input_hash))
+        if cached is not None:
+            outcomes[input_hash] = (cached, None, True)
+        else:
+            pending.append(i)
+
+    decoded = list(_get_decode_pool().map(lambda i: _decode(items[i], dataset_type), pending))
+    valid = []
+    for i, (tensor, error) in zip(pending, decoded):
+        if tensor is None:
+            outcomes[hashes[i]] = (None, error, False)
+        else:
+            valid.append((i, tensor))
+
+    return PreparedBatch(items, hashes, unique, outcomes, valid, task_id, model_version, dataset_type, version,
+                         backend)
+
+
+def preload_online_models():
+    """
+    预热加载所有已上线任务的模型。使用量小的先加载、使用量大的后加载，
+    受缓存个数与内存上限约束时，最常用的模型留在缓存中。
+    """
+    from .models import FederationTask
+
+    tasks = list(FederationTask.objects.filter(model_status='online')
+                 .order_by('total_usage_count').values_list('task_id', 'inference_backend'))
+    task_ids = [task_id for task_id, _ in tasks]
+    resident = get_model_server().preload(task_ids, backends=dict(tasks))
+    logger.info(f"预热加载上线模型完成：{len(resident)}/{len(task_ids)} 个常驻缓存 {resident}")
+    return resident
+
+
+def start_warm_serving():
+    """启动时预热上线模型并启动模型文件监听（热替换），只执行一次"""
+    global _watcher
+    with _server_lock:
+        if _watcher is not None:
+            return
+        config = _config()
+        _watcher = ModelWatcher(get_model_server(), debounce=config.get('watch_debounce', 1.0),
+                                poll_interval=config.get('watch_poll_interval', 5.0), logger=logger)
+
+    if config.get('watch_model_files', True):
+        _watcher.start()
+    if config.get('preload_on_startup', True):
+        try:
+            preload_online_models()
+        except Exception as e:
+            logger.error(f"预热加载上线模型失败: {e}")
@@ -67,6 +67,36 @@ class FederationTaskManager:
             task_obj.delete()
             raise e
     
+    def load_task(self, task_obj):
+        """
+        为数据库中已有的任务重建联邦学习实例（进程重启后重启任务时使用），不新建数据库记录；
+        沿用任务已有的参数文件，并从任务目录中最近的检查点恢复
+        """
+        from .tasks import DynamicFederation
+
+        task_id = task_obj.task_id
+        if task_id in self.tasks:
+            raise ValueError(f"任务 {task_id} 已加载")
+
+        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        params_path = os.path.join(base_dir, 'federation_core', f'saved_models/task_{task_id}', 'params.yaml')
+        if not os.path.exists(params_path):
+            params_path = self._generate_params_file(task_obj)
+
+        federation = DynamicFederation(task_id, task_obj.task_name, params_path, resume=True)
+        self.tasks[task_id] = {
+            'instance': federation,
+            'object': task_obj,
+            'thread': None
+        }
+
+        TaskLog.objects.create(
+            task=task_obj,
+            level='info',
+            message=f"联邦任务 {task_obj.task_name} 已重新加载，从第 {task_obj.current_epoch} 轮继续"
+        )
+        return task_obj
+
     def _generate_params_file(self, task_obj):
         """为任务生成动态参数文件"""
         # 基础配置
@@ -74,11 +104,43 @@ class FederationTaskManager:
             'model': task_obj.model_architecture,
             'type': task_obj.dataset,
             'algorithm': 'FedAvg',
+            'async_buffer_size': 3,
+            'async_concurrency': 2,
+            'async_staleness_exponent': 0.5,
             'epochs': task_obj.epochs,
             'eta': 1,
             'local_epochs': 2,
+            'local_steps': 0,
+            'local_deadline_seconds': 0,
             'batch_size': 128,
             'num_clients': 10,
+            'min_clients': 2,
+            'round_min_interval': 0,
+            'model_save_every': 100,
+            'checkpoint_every': 100,
+            'checkpoint_keep': 3,
+            # 版本历史默认关闭，按版本预测时在任务参数中开启
+            'model_history': False,
+            'history_every': 10,
+            'history_keyframe_every': 20,
+            'history_delta_dtype': 'fp16',
+            'history_keep_keyframes': 10,
+            'publish_optimize': True,
+            'publish_export': 'torchscript',
+            'publish_quantize': 'static',
+            'publish_calibration_size': 512,
+            'publish_accuracy_tolerance': 1.0,
+            'distill_student': '',
+            'distill_epochs': 20,
+            'distill_temperature': 4.0,
+            'distill_alpha': 0.7,
+            'distill_batch_size': 256,
+            'distill_lr': 0.05,
+            'distill_holdout': 0.2,
+            'distill_accuracy_tolerance': 2.0,
+            'client_selection': 'all',
+            'client_fraction': 0,
+            'poc_candidates': 0,
             'number_of_total_participants': 100,
             'lr': 0.01,
             'lr_decay': True,
@@ -86,6 +148,14 @@ class FederationTaskManager:
             'lr_decay_gamma': 0.998,
             'momentum': 0.9,
             'decay': 0.0005,
+            'use_block_shards': False,
+            'eval_cached_tensor': True,
+            'eval_batch_size': 1024,
+            'eval_subset_size': 0,
+            'eval_full_every': 10,
+            'cpu_accel': False,
+            'cpu_compile': 'compile',
+            'cpu_bf16': True,
             'sampling_dirichlet': True,
             'dirichlet_alpha': 1,
             'is_poison': True,
@@ -149,6 +219,36 @@ class FederationTaskManager:
 
         logger.info(f"任务 {task_id} 已启动，状态更新为 running")
 
+    def pause_task(self, task_id):
+        """手动暂停任务（当前轮结束后生效），成员变化不会自动恢复"""
+        if task_id not in self.tasks:
+            raise ValueError(f"任务 {task_id} 未在运行")
+
+        task_data = self.tasks[task_id]
+        task_data['instance'].pause_federation()
+
+        TaskLog.objects.create(
+            task=task_data['object'],
+            level='info',
+            message="任务已手动暂停，当前轮结束后生效"
+        )
+        logger.info(f"任务 {task_id} 已手动暂停")
+
+    def resume_task(self, task_id):
+        """恢复手动暂停的任务；用户数不足时仍保持挂起直到满足要求"""
+        if task_id not in self.tasks:
+            raise ValueError(f"任务 {task_id} 未在运行")
+
+        task_data = self.tasks[task_id]
+        task_data['instance'].resume_federation()
+
+        TaskLog.objects.create(
+            task=task_data['object'],
+            level='info',
+            message="任务已手动恢复"
+        )
+        logger.info(f"任务 {task_id} 已手动恢复")
+
     def add_user_to_task(self, task_id, user):
         """添加用户到任务（user是User对象）"""
         if task_id not in self.tasks:
@@ -176,7 +276,7 @@ class FederationTaskManager:
             task_obj.active_users = current_users
 
             # 立即检查并更新状态
-            if task_obj.status == 'paused' and current_users >= 2:
+            if task_obj.status == 'paused' and current_users >= 2 and not federation.handle.scheduler.paused:
                 task_obj.status = 'running'
                 federation.training_paused = False
                 logger.info(f"任务 {task_id}: 用户加入后立即恢复训练状态")
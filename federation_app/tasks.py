@@ -18,7 +18,11 @@ if FEDERATION_CORE_PATH not in sys.path:
 class DynamicFederation:
     """修改后的联邦学习任务类，初始参与者为0"""
     
-    def __init__(self, task_id, task_name, config_path=None):
+    def __init__(self, task_id, task_name, config_path=None, resume=False):
+        """
+        resume 为 True 时（重建已有任务）从任务目录中最近的检查点恢复；新任务不恢复，
+        目录中遗留的其他运行的检查点会被移到一旁
+        """
         # 如果没有提供配置文件路径，则使用任务特定的参数文件
         if config_path is None:
             base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -52,9 +56,17 @@ class DynamicFederation:
         self.is_training = False
         self.training_paused = False
         self.task_id = task_id
+        self.last_round_result = None
+
+        # 重建已有任务时从最近的检查点恢复（模型、学习率、轮次、成员、贡献度游标）
+        resumed_epoch = None
+        if resume:
+            resumed_epoch = self.handle.checkpoint_manager.restore_latest()
+        else:
+            self.handle.checkpoint_manager.archive_stale_checkpoints()
 
         self._update_task_status('running')
-        self._update_current_epoch(0)
+        self._update_current_epoch(resumed_epoch or 0)
         
         self.logger.info(f"联邦学习任务 {task_id} 初始化完成 - 模型:{self.params['model']}, 数据集:{self.params['type']}, 轮数:{self.params['epochs']}")
 
@@ -64,6 +76,7 @@ class DynamicFederation:
         
         # 启动训练线程
         self.is_training = True
+        self.handle.scheduler.start()
         self.training_thread = threading.Thread(target=self._training_loop)
         self.training_thread.daemon = True
         self.training_thread.start()
@@ -74,66 +87,80 @@ class DynamicFederation:
         """停止联邦学习系统"""
         self.logger.info(f"正在停止联邦学习任务 {self.task_id}...")  # 使用任务专属logger
         self.is_training = False
+        self.handle.scheduler.stop()
         
         if self.training_thread:
             self.training_thread.join(timeout=10)
+        self.handle.checkpoint_manager.flush()
             
         self.logger.info(f"联邦学习任务 {self.task_id} 已停止")  # 使用任务专属logger
 
+    def pause_federation(self):
+        """暂停训练（当前轮结束后生效）"""
+        self.logger.info(f"任务 {self.task_id}: 收到暂停请求")
+        self.handle.scheduler.pause()
+
+    def resume_federation(self):
+        """恢复训练"""
+        self.logger.info(f"任务 {self.task_id}: 收到恢复请求")
+        self.handle.scheduler.resume()
+
     def _training_loop(self):
         """训练循环 - 修改为非阻塞版本"""
         # 在训练线程中也修改工作目录
         original_cwd = os.getcwd()
         os.chdir(FEDERATION_CORE_PATH)
         
+        scheduler = self.handle.scheduler
+
         try:
-            last_check_time = 0
-            check_interval = 5  # 检查间隔（秒）
-            
             while self.is_training:
-                current_time = time.time()
-                
-                # 只在达到检查间隔时执行检查，避免频繁循环
-                if current_time - last_check_time < check_interval:
-                    time.sleep(0.1)  # 短暂休眠，避免CPU占用过高
-                    continue
-                    
-                last_check_time = current_time
-                
+                runnable, generation = scheduler.poll()
                 current_users = len(self.handle.namelist)
-                    
-                # 检查用户数量条件
-                if current_users < 2:
+
+                if scheduler.stopped:
+                    break
+
+                # 用户数不足或被暂停时阻塞等待，成员变化/恢复/停止会立即唤醒
+                if not runnable:
                     if not self.training_paused:
-                        self.logger.warning(f"任务 {self.task_id}: 当前用户数 {current_users} 少于2人，训练挂起")  # 使用任务专属logger
+                        self.logger.warning(f"任务 {self.task_id}: 当前用户数 {current_users} 少于{scheduler.min_clients}人或已暂停，训练挂起")  # 使用任务专属logger
                         self.training_paused = True
                         # 更新数据库状态为暂停
                         self._update_task_status('paused')
+                    scheduler.wait_for_change(generation)
                     continue
-                
+
                 if self.training_paused:
                     self.logger.info(f"任务 {self.task_id}: 当前用户数 {current_users} 达到要求，恢复训练")  # 使用任务专属logger
                     self.training_paused = False
                     # 更新数据库状态为运行中
                     self._update_task_status('running')
-            
-                # 执行联邦训练
+
+                # 执行联邦训练：同步算法每次只跑一轮，暂停/停止/成员变化在轮次边界生效
                 try:
-                    self.logger.info(f"任务 {self.task_id}: 开始第 {self.handle.start_epoch} 轮联邦训练，当前用户数: {current_users}")  # 使用任务专属logger
-                    from federation_core.algorithm import FedAvg
-                    FedAvg(self.handle)
-                    self.handle.start_epoch += 1
-                    
+                    from federation_core.algorithm import run_round, run_training
+                    if self.params.get('algorithm', 'FedAvg') == 'FedBuff':
+                        self.logger.info(f"任务 {self.task_id}: 从版本 {self.handle.start_epoch} 开始异步联邦训练，当前用户数: {current_users}")
+                        run_training(self.handle)
+                    else:
+                        # 显式限速；等待期间被暂停或停止则回到循环顶部处理
+                        if not scheduler.pace():
+                            continue
+                        self.logger.info(f"任务 {self.task_id}: 开始第 {self.handle.start_epoch} 轮联邦训练，当前用户数: {current_users}")  # 使用任务专属logger
+                        self.last_round_result = run_round(self.handle, self.handle.start_epoch)
+
                     # 更新数据库中的当前轮次
-                    self._update_current_epoch(self.handle.start_epoch - 1)  # -1 因为已经递增了
-                    
+                    self._update_current_epoch(self.handle.start_epoch - 1)
+
                     # 检查是否达到最大训练轮数
                     if self.handle.start_epoch > self.params['epochs']:
                         self.logger.info(f"任务 {self.task_id}: 达到最大训练轮数，停止训练")
                         self.is_training = False
 
-                        # 训练结束时保存最终模型
-                        self._save_final_model()
+                        # 训练结束时保存最终模型，并生成预测服务使用的推理产物
+                        model_path = self._save_final_model()
+                        self._publish_serving_artifacts(model_path)
 
                         # 执行股份/奖金分配
                         self._distribute_rewards_or_shares()
@@ -141,11 +168,11 @@ class DynamicFederation:
                         # 更新数据库状态为已完成
                         self._update_task_status('completed')
                         break
-                        
+
                 except Exception as e:
                     self.logger.error(f"任务 {self.task_id}: 训练过程中发生错误: {e}")  # 使用任务专属logger
-                    # 错误时短暂休眠
-                    time.sleep(1)
+                    # 错误时短暂退避（停止请求会立即打断）
+                    scheduler.wait_stopped(timeout=1)
         finally:
             # 恢复原始工作目录
             os.chdir(original_cwd)
@@ -173,30 +200,29 @@ class DynamicFederation:
             self.logger.error(f"更新当前轮次失败: {e}")  # 使用任务专属logger
 
     def _save_final_model(self):
-        """训练结束时保存最终模型"""
+        """训练结束时保存最终模型（等待后台写入完成后同步原子写出）"""
         try:
-            import torch
-
-            # 确保保存目录存在
-            os.makedirs(self.handle.folder_path, exist_ok=True)
-
-            # 模型文件路径
-            model_path = os.path.join(self.handle.folder_path, "global_model.pth")
-
-            # 保存模型状态字典
-            torch.save({
-                'epoch': self.handle.start_epoch - 1,  # 当前已完成的轮次
-                'model_state_dict': self.handle.model.state_dict(),
-                'task_id': self.handle.task_id,
-                'task_name': self.handle.name
-            }, model_path)
-
+            model_path = self.handle.checkpoint_manager.save_final_model(self.handle.start_epoch - 1)
             self.logger.info(f"任务 {self.task_id}: 最终模型已保存到: {model_path}")
+            return model_path
 
         except Exception as e:
             self.logger.error(f"任务 {self.task_id}: 保存最终模型失败: {e}")
             import traceback
             self.logger.error(traceback.format_exc())
+            return None
+
+    def _publish_serving_artifacts(self, model_path):
+        """为最终模型生成推理优化产物（BN 折叠、导出、int8 量化），失败不影响任务完成"""
+        if not model_path or not self.params.get('publish_optimize', True):
+            return
+        try:
+            from publish import publish_serving_artifacts
+            publish_serving_artifacts(self.handle, model_path)
+        except Exception as e:
+            self.logger.error(f"任务 {self.task_id}: 生成推理产物失败: {e}")
+            import traceback
+            self.logger.error(traceback.format_exc())
 
     def _distribute_rewards_or_shares(self):
         """任务完成后分配股份或奖金"""
@@ -272,6 +298,8 @@ class DynamicFederation:
         status.update({
             'is_training': self.is_training,
             'training_paused': self.training_paused,
-            'task_id': self.task_id
+            'manually_paused': self.handle.scheduler.paused,
+            'task_id': self.task_id,
+            'last_round': self.last_round_result.to_dict() if self.last_round_result else None
         })
         return status
\ No newline at end of file
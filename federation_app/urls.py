@@ -42,6 +42,8 @@ urlpatterns = [
     path('api/tasks/leave/', views.leave_task, name='leave_task'),
     path('api/tasks/delete/', views.delete_task, name='delete_task'),
     path('api/tasks/restart/', views.restart_task, name='restart_task'),
+    path('api/tasks/pause/', views.pause_task, name='pause_task'),
+    path('api/tasks/resume/', views.resume_task, name='resume_task'),
     path('api/tasks/clear-logs/', views.clear_logs, name='clear_logs'),
     path('api/tasks/status/', views.get_all_status, name='get_all_status'),
     path('api/tasks/<str:task_id>/status/', views.get_task_status, name='get_task_status'),
@@ -50,6 +52,8 @@ urlpatterns = [
 
     # 模型预测相关路由
     path('api/predict/', views.predict_image, name='predict_image'),
+    path('api/predict/batch/', views.predict_batch, name='predict_batch'),
     path('api/models/available/', views.get_available_models, name='get_available_models'),
+    path('api/models/registry/', views.get_model_registry, name='get_model_registry'),
     path('api/models/<str:task_id>/info/', views.get_model_info, name='get_model_info'),
 ]
\ No newline at end of file
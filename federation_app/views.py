@@ -1,5 +1,7 @@
 from .services import task_manager
+from .executors import get_inflight_limiter, offload
 from .models import FederationTask, TaskLog, TaskParticipant, GlobalAccuracy
+import asyncio
 import traceback
 import logging
 from decimal import Decimal
@@ -7,7 +9,9 @@ from decimal import Decimal
 import os
 import time
 import json
-import torch
+from federation_core.model_artifacts import ModelIndex
+from federation_core.model_history import ModelHistory
+from federation_core.models.registry import get_model_spec, list_models
 import logging
 
 from django.shortcuts import render, redirect
@@ -19,6 +23,9 @@ from django.db import transaction
 
 logger = logging.getLogger("logger")
 
+# 预测接口支持的图像格式
+ALLOWED_IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff']
+
 
 def index_redirect(request):
     """根路径重定向"""
@@ -71,12 +78,18 @@ def create_task(request):
                 return JsonResponse({'success': False, 'message': '任务编号和名称不能为空'})
 
             # 参数验证
-            if model_architecture not in ['CNN', 'r8', 'r18', 'r34']:
+            if model_architecture not in [choice[0] for choice in FederationTask.MODEL_CHOICES]:
                 return JsonResponse({'success': False, 'message': '不支持的模型结构'})
 
             if dataset not in ['MNIST', 'CIFAR10']:
                 return JsonResponse({'success': False, 'message': '不支持的数据集'})
 
+            # 模型与数据集的组合以模型注册表为准
+            try:
+                get_model_spec(model_architecture, dataset)
+            except ValueError:
+                return JsonResponse({'success': False, 'message': f'模型 {model_architecture} 不支持数据集 {dataset}'})
+
             if epochs <= 0:
                 return JsonResponse({'success': False, 'message': '训练轮数必须大于0'})
 
@@ -252,21 +265,9 @@ def restart_task(request):
             if task_obj.status == 'completed':
                 return JsonResponse({'success': False, 'message': '已完成的任务无法重启'})
 
-            # 如果任务不在内存中，需要重新创建
+            # 任务不在内存中（如进程重启后）时按已有记录重建，并从检查点恢复
             if task_id not in task_manager.tasks:
-                # 重新创建任务
-                task_manager.create_task(
-                    task_id=task_obj.task_id,
-                    task_name=task_obj.task_name,
-                    description=task_obj.description,
-                    model_architecture=task_obj.model_architecture,
-                    dataset=task_obj.dataset,
-                    epochs=task_obj.epochs,
-                    reward_pool=float(task_obj.reward_pool),
-                    payment_mode=task_obj.payment_mode,
-                    usage_fee_per_request=float(task_obj.usage_fee_per_request),
-                    creator=task_obj.creator
-                )
+                task_manager.load_task(task_obj)
 
             # 启动任务
             task_manager.start_task(task_id)
@@ -283,6 +284,56 @@ def restart_task(request):
 
     return JsonResponse({'success': False, 'message': '仅支持POST请求'})
 
+def _set_task_paused(request, paused):
+    """pause_task / resume_task 的公共实现：只有创建者可以操作运行中的任务"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': '仅支持POST请求'})
+
+    action = '暂停' if paused else '恢复'
+    try:
+        data = json.loads(request.body)
+        task_id = data.get('task_id')
+
+        if not task_id:
+            return JsonResponse({'success': False, 'message': '任务编号不能为空'})
+
+        try:
+            task_obj = FederationTask.objects.get(task_id=task_id)
+        except FederationTask.DoesNotExist:
+            return JsonResponse({'success': False, 'message': f'任务 {task_id} 不存在'})
+
+        # 权限检查：只有创建者可以暂停/恢复任务
+        if request.user.is_authenticated and task_obj.creator:
+            if request.user.id != task_obj.creator.id:
+                return JsonResponse({'success': False, 'message': f'只有任务创建者才能{action}任务'})
+
+        if paused:
+            task_manager.pause_task(task_id)
+        else:
+            task_manager.resume_task(task_id)
+
+        return JsonResponse({
+            'success': True,
+            'message': f'任务 {task_obj.task_name} 已{action}'
+        })
+
+    except Exception as e:
+        logger.error(f"{action}任务失败: {e}")
+        return JsonResponse({'success': False, 'message': f'{action}任务失败: {str(e)}'})
+
+
+@csrf_exempt
+def pause_task(request):
+    """暂停任务（当前轮结束后生效）"""
+    return _set_task_paused(request, True)
+
+
+@csrf_exempt
+def resume_task(request):
+    """恢复手动暂停的任务"""
+    return _set_task_paused(request, False)
+
+
 @csrf_exempt
 def clear_logs(request):
     """清空所有日志"""
@@ -304,18 +355,18 @@ def clear_logs(request):
     
     return JsonResponse({'success': False, 'message': '仅支持POST请求'})
 
-def get_task_status(request, task_id):
-    """获取任务状态"""
+async def get_task_status(request, task_id):
+    """获取任务状态（异步，查询在状态线程池中执行）"""
     try:
-        status = task_manager.get_task_status(task_id)
+        status = await offload('status', task_manager.get_task_status, task_id)
         return JsonResponse({'success': True, 'status': status})
     except Exception as e:
         return JsonResponse({'success': False, 'message': str(e)})
 
-def get_all_status(request):
-    """获取所有任务状态"""
+async def get_all_status(request):
+    """获取所有任务状态（异步，查询在状态线程池中执行）"""
     try:
-        status_list = task_manager.get_all_tasks_status()
+        status_list = await offload('status', task_manager.get_all_tasks_status)
         return JsonResponse({'success': True, 'tasks': status_list})
     except Exception as e:
         return JsonResponse({'success': False, 'message': str(e)})
@@ -369,8 +420,13 @@ def get_logs(request):
 
 @csrf_exempt
 @login_required
-def predict_image(request):
-    """图像预测API - 使用ETH支付并自动分红给股东"""
+async def predict_image(request):
+    """
+    图像预测API - 使用ETH支付并自动分红给股东
+
+    异步视图：推理与链上调用在有界线程池中执行（见 executors），同一模型同时处理中的请求
+    达到上限时返回 429，不会无限排队
+    """
     if request.method == 'POST':
         try:
             # 检查是否有文件上传
@@ -379,15 +435,16 @@ def predict_image(request):
 
             image_file = request.FILES['image']
             task_id = request.POST.get('task_id')
-            dataset_type = request.POST.get('dataset_type', 'CIFAR10')
-            user = request.user
+            dataset_type = request.POST.get('dataset_type') or None
+            version = request.POST.get('version') or None
+            user = await request.auser()
 
             if not task_id:
                 return JsonResponse({'success': False, 'message': '任务ID不能为空'})
 
             # 获取任务信息
             try:
-                task = FederationTask.objects.get(task_id=task_id)
+                task = await FederationTask.objects.aget(task_id=task_id)
             except FederationTask.DoesNotExist:
                 return JsonResponse({'success': False, 'message': f'任务 {task_id} 不存在'})
 
@@ -399,128 +456,285 @@ def predict_image(request):
                     'model_offline': True
                 })
 
-            # 检查用户ETH余额
-            usage_fee = float(task.usage_fee_per_request)
-            if user.eth_balance < usage_fee:
-                return JsonResponse({
+            # 按模型限制同时处理中的请求数（背压）
+            limiter = get_inflight_limiter()
+            if not limiter.try_acquire(task_id):
+                response = JsonResponse({
                     'success': False,
-                    'message': f'ETH余额不足！需要{usage_fee} ETH，当前余额{user.eth_balance:.4f} ETH',
-                    'insufficient_eth': True
-                })
+                    'message': f'模型 {task_id} 当前请求过多，请稍后重试',
+                    'busy': True
+                }, status=429)
+                response['Retry-After'] = str(getattr(settings, 'ASYNC_CONFIG', {}).get('retry_after', 1))
+                return response
+            try:
+                return await _predict_and_charge(user, task, image_file, dataset_type, version)
+            finally:
+                limiter.release(task_id)
 
-            # 验证文件类型
-            allowed_extensions = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff']
-            file_extension = os.path.splitext(image_file.name)[1].lower()
-            if file_extension not in allowed_extensions:
-                return JsonResponse({
-                    'success': False,
-                    'message': f'不支持的文件格式。支持的格式: {", ".join(allowed_extensions)}'
-                })
+        except Exception as e:
+            logger.error(f"图像预测失败: {e}")
+            return JsonResponse({'success': False, 'message': str(e)})
 
-            # 创建临时文件保存上传的图像
-            temp_dir = os.path.join(settings.BASE_DIR, 'temp_uploads')
-            os.makedirs(temp_dir, exist_ok=True)
+    return JsonResponse({'success': False, 'message': '仅支持POST请求'})
 
-            temp_file_path = os.path.join(temp_dir, f'temp_{int(time.time())}{file_extension}')
 
-            with open(temp_file_path, 'wb+') as destination:
-                for chunk in image_file.chunks():
-                    destination.write(chunk)
+async def _predict_and_charge(user, task, image_file, dataset_type, version):
+    """predict_image 的余额检查、推理与付费部分（已占用该模型的并发名额）"""
+    task_id = task.task_id
 
-            try:
-                # 先运行预测（预测失败不扣钱）
-                prediction_result = run_model_prediction(temp_file_path, task_id, dataset_type)
+    # 数据集默认取模型元数据中记录的数据集，请求指定的不一致时拒绝
+    from .prediction import resolve_dataset_type
+    try:
+        dataset_type = await offload('inference', resolve_dataset_type, task_id, dataset_type, version,
+                                     task.inference_backend)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'message': str(e)})
 
-                # 预测成功后，调用区块链分红系统
-                from .business_logic import ModelUsageService
+    # 检查用户ETH余额（读取 Ganache）
+    usage_fee = float(task.usage_fee_per_request)
+    eth_balance = await offload('chain', lambda: user.eth_balance)
+    if eth_balance < usage_fee:
+        return JsonResponse({
+            'success': False,
+            'message': f'ETH余额不足！需要{usage_fee} ETH，当前余额{eth_balance:.4f} ETH',
+            'insufficient_eth': True
+        })
+
+    # 验证文件类型
+    allowed_extensions = ALLOWED_IMAGE_EXTENSIONS
+    file_extension = os.path.splitext(image_file.name)[1].lower()
+    if file_extension not in allowed_extensions:
+        return JsonResponse({
+            'success': False,
+            'message': f'不支持的文件格式。支持的格式: {", ".join(allowed_extensions)}'
+        })
+
+    # 直接在内存中解码上传数据，不写临时文件
+    image_data = image_file.read()
+    from .prediction import content_hash
+    input_hash = content_hash(image_data)
 
-                # 转换预测结果为字符串
-                prediction_str = f"Class: {prediction_result.get('class_name', 'Unknown')} (ID: {prediction_result.get('predicted_class', -1)}), Confidence: {prediction_result.get('confidence', 0):.2f}%"
+    try:
+        # 先运行预测（预测失败不扣钱）
+        prediction_result = await run_model_prediction(image_data, task_id, dataset_type, version,
+                                                       max_batch_size=task.predict_batch_size,
+                                                       max_wait_ms=task.predict_batch_wait_ms, input_hash=input_hash,
+                                                       backend=task.inference_backend)
+
+        # 预测成功后，调用区块链分红系统
+        from .business_logic import ModelUsageService
+
+        # 转换预测结果为字符串
+        prediction_str = f"Class: {prediction_result.get('class_name', 'Unknown')} (ID: {prediction_result.get('predicted_class', -1)}), Confidence: {prediction_result.get('confidence', 0):.2f}%"
+
+        # 调用付费和分红逻辑（命中结果缓存同样计费）
+        payment_result = await offload('chain', ModelUsageService.charge_and_distribute,
+                                       task=task,
+                                       user=user,
+                                       prediction_result=prediction_str,
+                                       input_hash=input_hash)
+
+        return JsonResponse({
+            'success': True,
+            'prediction': prediction_result,
+            'payment': {
+                'usage_fee': payment_result['usage_fee'],
+                'user_balance_after': payment_result['user_balance_after'],
+                'tx_hash': payment_result['tx_hash'],
+                'distributions': payment_result['distributions']
+            },
+            'message': f'预测成功！已支付{payment_result["usage_fee"]} ETH，分红已自动发放给{len(payment_result["distributions"])}位股东'
+        })
+
+    except ValueError as e:
+        # 余额不足或其他业务逻辑错误
+        return JsonResponse({
+            'success': False,
+            'message': f'支付失败: {str(e)}'
+        })
+
+
+def _collect_batch_images(request, max_images, max_bytes):
+    """
+    从请求中收集 [(文件名, 字节)]：支持多文件字段 images 或一个 zip 压缩包 archive
+
+    读取前按上传大小 / zip 条目的解压后大小检查总字节数，超过 max_bytes 直接拒绝（防止 zip 炸弹）
+    """
+    import zipfile
+
+    def check_size(total):
+        if total > max_bytes:
+            raise ValueError(f'单次批量预测的图像总大小不能超过 {max_bytes / 1024 / 1024:.0f} MB')
+
+    image_files = [f for f in request.FILES.getlist('images')
+                   if os.path.splitext(f.name)[1].lower() in ALLOWED_IMAGE_EXTENSIONS]
+    total_bytes = sum(f.size for f in image_files)
+    check_size(total_bytes)
+    items = [(f.name, f.read()) for f in image_files]
+
+    if 'archive' in request.FILES:
+        with zipfile.ZipFile(request.FILES['archive']) as archive:
+            entries = []
+            for info in archive.infolist():
+                name = info.filename
+                if info.is_dir() or name.startswith('__MACOSX/') or \
+                        os.path.splitext(name)[1].lower() not in ALLOWED_IMAGE_EXTENSIONS:
+                    continue
+                if len(items) + len(entries) >= max_images:
+                    break
+                entries.append(info)
+            # file_size 是条目解压后的大小，zipfile 读取时不会超出它
+            total_bytes += sum(info.file_size for info in entries)
+            check_size(total_bytes)
+            items.extend((info.filename, archive.read(info)) for info in entries)
 
-                # 调用付费和分红逻辑
-                payment_result = ModelUsageService.charge_and_distribute(
-                    task=task,
-                    user=user,
-                    prediction_result=prediction_str,
-                    input_hash=''
-                )
+    if len(items) > max_images:
+        raise ValueError(f'单次批量预测最多 {max_images} 张图像，当前 {len(items)} 张')
+    return items
 
-                # 清理临时文件
-                os.remove(temp_file_path)
 
-                return JsonResponse({
-                    'success': True,
-                    'prediction': prediction_result,
-                    'payment': {
-                        'usage_fee': payment_result['usage_fee'],
-                        'user_balance_after': payment_result['user_balance_after'],
-                        'tx_hash': payment_result['tx_hash'],
-                        'distributions': payment_result['distributions']
-                    },
-                    'message': f'预测成功！已支付{payment_result["usage_fee"]} ETH，分红已自动发放给{len(payment_result["distributions"])}位股东'
-                })
+@csrf_exempt
+@login_required
+async def predict_batch(request):
+    """
+    批量图像预测API - 一次请求多张图像（多文件或 zip），按成功预测数合并收费一次
+
+    异步视图：解码与推理在 inference 线程池、余额查询与付费在 chain 线程池中执行，
+    与 predict_image 共用按模型的并发上限，达到上限时返回 429
+    """
+    if request.method == 'POST':
+        try:
+            task_id = request.POST.get('task_id')
+            dataset_type = request.POST.get('dataset_type') or None
+            version = request.POST.get('version') or None
+            user = await request.auser()
+
+            if not task_id:
+                return JsonResponse({'success': False, 'message': '任务ID不能为空'})
 
-            except ValueError as e:
-                # 余额不足或其他业务逻辑错误
-                if os.path.exists(temp_file_path):
-                    os.remove(temp_file_path)
+            try:
+                task = await FederationTask.objects.aget(task_id=task_id)
+            except FederationTask.DoesNotExist:
+                return JsonResponse({'success': False, 'message': f'任务 {task_id} 不存在'})
+
+            if task.model_status != 'online':
                 return JsonResponse({
                     'success': False,
-                    'message': f'支付失败: {str(e)}'
+                    'message': f'模型未上线，当前状态: {task.get_model_status_display()}',
+                    'model_offline': True
                 })
-            except Exception as e:
-                # 其他错误（预测失败等）
-                if os.path.exists(temp_file_path):
-                    os.remove(temp_file_path)
-                raise e
+
+            # 按模型限制同时处理中的请求数（背压）
+            limiter = get_inflight_limiter()
+            if not limiter.try_acquire(task_id):
+                response = JsonResponse({
+                    'success': False,
+                    'message': f'模型 {task_id} 当前请求过多，请稍后重试',
+                    'busy': True
+                }, status=429)
+                response['Retry-After'] = str(getattr(settings, 'ASYNC_CONFIG', {}).get('retry_after', 1))
+                return response
+            try:
+                return await _predict_batch_and_charge(request, user, task, dataset_type, version)
+            finally:
+                limiter.release(task_id)
 
         except Exception as e:
-            logger.error(f"图像预测失败: {e}")
+            logger.error(f"批量图像预测失败: {e}")
             return JsonResponse({'success': False, 'message': str(e)})
 
     return JsonResponse({'success': False, 'message': '仅支持POST请求'})
 
 
-def run_model_prediction(image_path, task_id, dataset_type='CIFAR10'):
-    """运行模型预测"""
+async def _predict_batch_and_charge(request, user, task, dataset_type, version):
+    """predict_batch 的收集、推理与付费部分（已占用该模型的并发名额）"""
+    from .prediction import content_hash, prepare_batch_prediction, resolve_dataset_type
+    task_id = task.task_id
+
+    config = getattr(settings, 'PREDICTION_CONFIG', {})
+    max_images = config.get('max_batch_images', 1000)
+    max_bytes = config.get('max_batch_bytes', 200 * 1024 * 1024)
+    try:
+        items = await offload('inference', _collect_batch_images, request, max_images, max_bytes)
+    except Exception as e:
+        return JsonResponse({'success': False, 'message': str(e)})
+    if not items:
+        return JsonResponse({'success': False, 'message': '没有上传可识别的图像文件'})
+
+    # 数据集默认取模型元数据中记录的数据集，请求指定的不一致时拒绝
     try:
-        # 构建预测脚本路径
-        base_dir = settings.BASE_DIR
-        core_dir = os.path.join(base_dir, 'federation_core')
-        predict_script = os.path.join(core_dir, 'model_predict.py')
-
-        # 检查预测脚本是否存在
-        if not os.path.exists(predict_script):
-            raise FileNotFoundError(f"模型预测脚本不存在: {predict_script}")
-
-        # 执行预测命令
-        import subprocess
-        cmd = [
-            'python', predict_script,
-            '--image', image_path,
-            '--task_id', task_id,
-            '--dataset_type', dataset_type,
-            '--output_format', 'json'
-        ]
-
-        logger.info(f"执行预测命令: {' '.join(cmd)}")
-        logger.info(f"工作目录: {core_dir}")
-
-        result = subprocess.run(cmd, capture_output=True, text=True, cwd=core_dir)
-
-        logger.info(f"预测命令返回码: {result.returncode}")
-        logger.info(f"预测命令标准输出: {result.stdout}")
-        logger.info(f"预测命令标准错误: {result.stderr}")
-
-        if result.returncode != 0:
-            error_msg = f"预测执行失败: {result.stderr}"
-            if result.stdout:
-                error_msg += f"\n标准输出: {result.stdout}"
-            raise Exception(error_msg)
-
-        # 解析JSON输出
-        prediction_result = json.loads(result.stdout)
+        dataset_type = await offload('inference', resolve_dataset_type, task_id, dataset_type, version,
+                                     task.inference_backend)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'message': str(e)})
 
+    # 先查缓存并解码，按实际会成功的图像数检查余额（解码失败的图像不计费）
+    start_time = time.perf_counter()
+    prepared = await offload('inference', prepare_batch_prediction, items, task_id, dataset_type, version,
+                             backend=task.inference_backend)
+    if prepared.succeeded == 0:
+        results = await offload('inference', prepared.run)
+        return JsonResponse({'success': False, 'message': '所有图像均预测失败', 'results': results})
+
+    balance = await offload('chain', lambda: user.eth_balance)
+    usage_fee = float(task.usage_fee_per_request) * prepared.succeeded
+    if balance < usage_fee:
+        return JsonResponse({
+            'success': False,
+            'message': f'ETH余额不足！{prepared.succeeded}张图像需要{usage_fee} ETH，当前余额{balance:.4f} ETH',
+            'insufficient_eth': True
+        })
+
+    results = await offload('inference', prepared.run)
+    succeeded = [r for r in results if r['success']]
+    logger.info(f"任务 {task_id} 批量预测 {len(items)} 张（成功 {len(succeeded)}），"
+                f"耗时 {(time.perf_counter() - start_time) * 1000:.1f} ms")
+
+    # 批次的输入哈希取各图像内容哈希按顺序拼接后的哈希
+    batch_hash = content_hash(''.join(r['input_hash'] for r in results).encode())
+
+    from .business_logic import ModelUsageService
+    try:
+        payment_result = await offload('chain', ModelUsageService.charge_and_distribute,
+                                       task=task,
+                                       user=user,
+                                       prediction_result=f"Batch prediction: {len(succeeded)}/{len(items)} images",
+                                       input_hash=batch_hash,
+                                       quantity=len(succeeded))
+    except ValueError as e:
+        return JsonResponse({'success': False, 'message': f'支付失败: {str(e)}'})
+
+    return JsonResponse({
+        'success': True,
+        'results': results,
+        'total': len(items),
+        'succeeded': len(succeeded),
+        'payment': {
+            'usage_fee': payment_result['usage_fee'],
+            'quantity': payment_result['quantity'],
+            'user_balance_after': payment_result['user_balance_after'],
+            'tx_hash': payment_result['tx_hash'],
+            'distributions': payment_result['distributions']
+        },
+        'message': f'批量预测完成！{len(succeeded)}张图像共支付{payment_result["usage_fee"]} ETH'
+    })
+
+
+async def run_model_prediction(image_data, task_id, dataset_type='CIFAR10', version=None, max_batch_size=1,
+                               max_wait_ms=0, input_hash=None, backend=None):
+    """
+    对内存中的图像数据运行模型预测（进程内模型服务，模型按任务缓存）；version 为空时使用最新发布的模型，
+    max_batch_size > 1 时与并发请求合并为微批次推理，backend 为任务选择的推理后端。
+    推理线程池只做缓存查询、解码和提交，批次结果在事件循环上等待，线程不会因等待凑批而被占住
+    """
+    try:
+        from .prediction import submit_prediction
+        start_time = time.perf_counter()
+        future = await offload('inference', submit_prediction, image_data, task_id, dataset_type, version,
+                               max_batch_size=max_batch_size, max_wait_ms=max_wait_ms,
+                               input_hash=input_hash, backend=backend)
+        prediction_result = await asyncio.wrap_future(future)
+        logger.info(f"任务 {task_id} 预测完成，耗时 {(time.perf_counter() - start_time) * 1000:.1f} ms")
         return prediction_result
 
     except Exception as e:
@@ -538,37 +752,18 @@ def get_available_models(request):
             core_dir = os.path.join(base_dir, 'federation_core')
             models_dir = os.path.join(core_dir, 'saved_models')
 
-            available_models = []
-
-            if os.path.exists(models_dir):
-                for item in os.listdir(models_dir):
-                    item_path = os.path.join(models_dir, item)
-                    model_path = os.path.join(item_path, 'global_model.pth')
-
-                    if os.path.isdir(item_path) and os.path.exists(model_path):
-                        # 解析任务ID和名称
-                        if '_' in item:
-                            parts = item.split('_', 1)
-                            task_id = parts[0]
-                            task_name = parts[1] if len(parts) > 1 else task_id
-                        else:
-                            task_id = item
-                            task_name = item
-
-                        # 获取模型信息
-                        try:
-                            checkpoint = torch.load(model_path, map_location='cpu')
-                            epoch = checkpoint.get('epoch', '未知')
-
-                            available_models.append({
-                                'task_id': task_id,
-                                'task_name': task_name,
-                                'epoch': epoch,
-                                'path': item_path
-                            })
-                        except Exception as e:
-                            logger.warning(f"无法读取模型信息 {item_path}: {e}")
-                            continue
+            # 元数据来自模型索引，只对每个模型文件做一次 stat，不读取模型；
+            # 每个任务只取其 "<task_id>_<task_name>" 目录
+            tasks = dict(FederationTask.objects.values_list('task_id', 'task_name'))
+            available_models = [{
+                'task_id': entry['task_id'],
+                'task_name': entry['task_name'],
+                'epoch': entry['epoch'] if entry['epoch'] is not None else '未知',
+                'architecture': entry['architecture'],
+                'size': entry['size'],
+                'hash': entry['hash'],
+                'path': os.path.join(models_dir, entry['dir'])
+            } for entry in ModelIndex(models_dir).list(tasks)]
 
             return JsonResponse({
                 'success': True,
@@ -582,6 +777,16 @@ def get_available_models(request):
     return JsonResponse({'success': False, 'message': '仅支持GET请求'})
 
 
+@csrf_exempt
+def get_model_registry(request):
+    """列出可用于创建任务的模型结构（可按数据集过滤），附参数量和 FLOPs"""
+    if request.method == 'GET':
+        dataset = request.GET.get('dataset') or None
+        return JsonResponse({'success': True, 'models': list_models(dataset)})
+
+    return JsonResponse({'success': False, 'message': '仅支持GET请求'})
+
+
 @csrf_exempt
 def get_model_info(request, task_id):
     """获取特定模型的详细信息"""
@@ -591,30 +796,24 @@ def get_model_info(request, task_id):
             core_dir = os.path.join(base_dir, 'federation_core')
             models_dir = os.path.join(core_dir, 'saved_models')
 
-            # 查找匹配的模型目录
-            model_dir = None
-            for item in os.listdir(models_dir):
-                if item.startswith(task_id):
-                    model_dir = os.path.join(models_dir, item)
-                    break
-
-            if not model_dir or not os.path.exists(model_dir):
+            # 按任务记录的 "<task_id>_<task_name>" 目录查找索引条目（过期时自动刷新）
+            task_obj = FederationTask.objects.filter(task_id=task_id).first()
+            entry = ModelIndex(models_dir).get(task_id, task_obj.task_name) if task_obj else None
+            if entry is None:
                 return JsonResponse({'success': False, 'message': f'未找到任务 {task_id} 的模型'})
-
-            model_path = os.path.join(model_dir, 'global_model.pth')
-
-            if not os.path.exists(model_path):
-                return JsonResponse({'success': False, 'message': '模型文件不存在'})
-
-            # 读取模型信息
-            checkpoint = torch.load(model_path, map_location='cpu')
+            model_dir = os.path.join(models_dir, entry['dir'])
 
             model_info = {
                 'task_id': task_id,
-                'task_name': checkpoint.get('task_name', '未知'),
-                'epoch': checkpoint.get('epoch', '未知'),
-                'model_size': f"{os.path.getsize(model_path) / 1024 / 1024:.2f} MB",
-                'last_modified': time.ctime(os.path.getmtime(model_path))
+                'task_name': entry['task_name'] or '未知',
+                'epoch': entry['epoch'] if entry['epoch'] is not None else '未知',
+                'architecture': entry['architecture'],
+                'dataset': entry['dataset'],
+                'format': entry['format'],
+                'hash': entry['hash'],
+                'versions': ModelHistory(model_dir).versions(),
+                'model_size': f"{entry['size'] / 1024 / 1024:.2f} MB",
+                'last_modified': time.ctime(entry['mtime'])
             }
 
             return JsonResponse({
@@ -0,0 +1,106 @@
+# accel.py
+"""
+CPU 加速训练模式（params['cpu_accel'] 开启）
+
+每个任务只创建一个训练用模型实例并编译一次（torch.compile，不可用时 TorchScript），
+各客户端训练前把全局权重加载进这个实例，编译开销按任务而非按客户端支付。
+模型使用 channels_last 内存格式，CPU 支持时前向使用 bfloat16 autocast。
+编译失败时回退到 eager 模式。
+"""
+import contextlib
+import copy
+
+import torch
+from torch import nn
+
+from device import device
+from models.registry import INPUT_SHAPES
+
+
+def cpu_accel_enabled(params):
+    return bool(params.get('cpu_accel', False)) and device.type == 'cpu'
+
+
+def cpu_supports_bf16():
+    """检查 CPU（oneDNN）是否支持 bfloat16 计算"""
+    try:
+        return torch.backends.mkldnn.is_available() and torch.ops.mkldnn._is_mkldnn_bf16_supported()
+    except Exception:
+        return False
+
+
+class CPUAccelerator:
+    """按任务持有的加速训练模型"""
+
+    def __init__(self, handle):
+        self.logger = handle.logger
+        self.params = handle.params
+
+        self.module = copy.deepcopy(handle.model).to(device).to(memory_format=torch.channels_last)
+        self.runner = self.module
+        self.use_bf16 = bool(self.params.get('cpu_bf16', True)) and cpu_supports_bf16()
+        self.backend = 'eager'
+
+        self._compile()
+        self.logger.info(f"CPU 加速训练已启用 - 后端: {self.backend}, channels_last: True, bfloat16: {self.use_bf16}")
+
+    def _compile(self):
+        backend = self.params.get('cpu_compile', 'compile')
+        if backend == 'compile' and hasattr(torch, 'compile'):
+            try:
+                runner = torch.compile(self.module)
+                self._warmup(runner)
+                self.runner = runner
+                self.backend = 'torch.compile'
+                return
+            except Exception as e:
+                self.logger.warning(f"torch.compile 失败，尝试 TorchScript: {e}")
+                backend = 'torchscript'
+
+        if backend == 'torchscript':
+            try:
+                scripted = torch.jit.script(self.module)
+                self._warmup(scripted)
+                # TorchScript 模块与原模块共享参数，但状态字典读写统一走脚本模块
+                self.module = scripted
+                self.runner = scripted
+                self.backend = 'torchscript'
+                return
+            except Exception as e:
+                self.logger.warning(f"TorchScript 编译失败，回退到 eager 模式: {e}")
+
+        self.runner = self.module
+        self.backend = 'eager'
+
+    def _warmup(self, runner):
+        """用一个假批次跑一次前向和反向，触发编译；状态随后会被全局权重覆盖"""
+        shape = INPUT_SHAPES[self.params['type']]
+        batch = torch.zeros(2, *shape, device=device).contiguous(memory_format=torch.channels_last)
+        labels = torch.zeros(2, dtype=torch.long, device=device)
+        runner.train()
+        with self.autocast():
+            loss = nn.functional.cross_entropy(runner(batch), labels)
+        loss.backward()
+        self.module.zero_grad(set_to_none=True)
+
+    def autocast(self):
+        if self.use_bf16:
+            return torch.autocast(device_type='cpu', dtype=torch.bfloat16)
+        return contextlib.nullcontext()
+
+    def load_global(self, state_dict):
+        """把全局权重载入共享的训练实例"""
+        self.module.load_state_dict(state_dict)
+        return self.module
+
+    def state_dict(self):
+        """返回与共享实例解耦的权重副本（连续内存格式，便于聚合）"""
+        return {k: v.detach().clone(memory_format=torch.contiguous_format)
+                for k, v in self.module.state_dict().items()}
+
+
+def get_accelerator(handle):
+    """返回任务的 CPU 加速器，首次调用时创建并编译"""
+    if handle.accelerator is None:
+        handle.accelerator = CPUAccelerator(handle)
+    return handle.accelerator
@@ -9,16 +9,35 @@ import os
 from itertools import permutations, combinations
 import train
 import test
+from accel import cpu_accel_enabled, get_accelerator
+from client_selection import select_clients
 from models.ResNet8 import ResNet8
 from device import device
 
 
 def get_clients(epoch, handle):
-    agent_name_keys = handle.namelist
-    handle.logger.info(f'Server Epoch:{epoch} choose agents : {agent_name_keys}.')
+    agent_name_keys, inclusion_probs = select_clients(epoch, handle)
+    handle.client_inclusion_probs = inclusion_probs
+    handle.logger.info(f'Server Epoch:{epoch} choose agents ({handle.params.get("client_selection", "all")}): '
+                       f'{agent_name_keys} / {len(handle.namelist)}.')
     return agent_name_keys
 
 
+def get_client_weights(handle, clients):
+    """
+    按客户端实际完成的本地步数计算聚合权重：
+    完成预算的客户端权重为 1，被截止时间打断的客户端按 steps / planned_steps 缩小其更新
+    """
+    beta = []
+    for client in clients:
+        stats = handle.client_train_stats.get(client)
+        if not stats or not stats['planned_steps']:
+            beta.append(1)
+        else:
+            beta.append(min(1.0, stats['steps'] / stats['planned_steps']))
+    return beta
+
+
 def Aggregation(w_ori, w_list, lens, beta, eta, defence_method, params):
     """优化聚合函数，使用向量化操作减少循环"""
     keys = [k for k in w_ori.keys() if w_ori[k].dtype != torch.int64]
@@ -48,6 +67,11 @@ def calculate_model_accuracy(model_state_dict, handle):
     model.load_state_dict(model_state_dict)
     model.eval()
 
+    if handle.params.get('eval_cached_tensor', True) and handle.test_dataset is not None:
+        images, labels = handle.get_test_tensors()
+        _, correct = test.evaluate_tensors(model, images, labels, int(handle.params.get('eval_batch_size', 1024)))
+        return correct.item() / labels.size(0)
+
     correct = 0
     total = 0
     with torch.no_grad():
@@ -147,8 +171,9 @@ def evaluate_contribution(handle, epoch, active_users, w_locals, w_glob, previou
         # 使用Shapley值计算函数
         user_contributions = calculate_shapley_values(handle, w_locals, active_users, w_glob)
 
-        # 记录贡献度
-        handle.contribution_manager.record_round_contribution(epoch, user_contributions)
+        # 记录贡献度（按入选概率做逆概率加权，补偿未被采样的轮次）
+        handle.contribution_manager.record_round_contribution(epoch, user_contributions,
+                                                              handle.client_inclusion_probs)
 
         handle.logger.info(f"第 {epoch} 轮贡献度评估完成: {user_contributions}")
 
@@ -156,86 +181,161 @@ def evaluate_contribution(handle, epoch, active_users, w_locals, w_glob, previou
         handle.logger.error(f"贡献度计算错误: {e}")
         # 后备方案：平均分配
         user_contributions = {user_id: 1.0 / len(active_users) for user_id in active_users}
-        handle.contribution_manager.record_round_contribution(epoch, user_contributions)
+        handle.contribution_manager.record_round_contribution(epoch, user_contributions,
+                                                              handle.client_inclusion_probs)
         handle.logger.info(f"使用平均分配作为后备方案: {user_contributions}")
 
 
 def save_global_model(handle, epoch):
-    """保存全局模型，每100轮保存一次，只保留一个模型"""
-    if epoch % 100 == 0:
-        try:
-            # 确保保存目录存在
-            os.makedirs(handle.folder_path, exist_ok=True)
+    """
+    轮次结束时发布全局模型并写完整训练状态检查点（分别按 model_save_every /
+    checkpoint_every 轮触发）。训练线程只拷贝权重，序列化在后台线程完成。
+    """
+    try:
+        handle.checkpoint_manager.on_round_end(epoch)
+    except Exception as e:
+        handle.logger.error(f"保存模型失败: {e}")
+
+
+def apply_lr_decay(handle, epoch):
+    """按轮次衰减学习率"""
+    if handle.params['lr_decay'] is True:
+        if epoch % handle.params['lr_decay_epoch'] == 0:
+            handle.params['lr'] = handle.params['lr'] * handle.params['lr_decay_gamma']
+            handle.params['poison_lr'] = handle.params['poison_lr'] * handle.params['lr_decay_gamma']
 
-            # 模型文件路径
-            model_path = os.path.join(handle.folder_path, "global_model.pth")
 
-            # 保存模型状态字典
-            torch.save({
-                'epoch': epoch,
-                'model_state_dict': handle.model.state_dict(),
-                'task_id': handle.task_id,
-                'task_name': handle.name
-            }, model_path)
+def record_global_accuracy(handle, epoch, acc):
+    """记录全局准确度到数据库（可选）；轮换子集评估的准确度不入库，只保存完整评估的结果"""
+    if not handle.last_eval_full:
+        return
+    try:
+        from federation_app.models import GlobalAccuracy, FederationTask
+        task_obj = FederationTask.objects.get(task_id=handle.task_id)
+        GlobalAccuracy.objects.create(
+            task=task_obj,
+            epoch=epoch,
+            accuracy=acc
+        )
+        handle.logger.info(f"任务 {handle.task_id} 第 {epoch} 轮全局准确度 {acc:.2f}% 已记录到数据库")
+    except Exception as e:
+        handle.logger.error(f"记录全局准确度失败: {e}")
+
+
+def run_training(handle):
+    """按 params['algorithm'] 选择训练引擎"""
+    if handle.params.get('algorithm', 'FedAvg') == 'FedBuff':
+        from async_fl import FedBuff
+        return FedBuff(handle)
+    return FedAvg(handle)
+
+
+class RoundResult:
+    """单轮训练结果：耗时、准确度与聚合统计"""
+
+    def __init__(self, epoch, clients):
+        self.epoch = epoch
+        self.clients = list(clients)
+        self.accuracy = None
+        self.weights = {}
+        self.client_steps = {}
+        self.train_time = 0.0
+        self.aggregate_time = 0.0
+        self.eval_time = 0.0
+        self.contribution_time = 0.0
+        self.total_time = 0.0
+
+    def to_dict(self):
+        return {
+            'epoch': self.epoch,
+            'clients': self.clients,
+            'accuracy': self.accuracy,
+            'weights': self.weights,
+            'client_steps': self.client_steps,
+            'train_time': self.train_time,
+            'aggregate_time': self.aggregate_time,
+            'eval_time': self.eval_time,
+            'contribution_time': self.contribution_time,
+            'total_time': self.total_time,
+        }
+
+
+def run_round(handle, epoch):
+    """
+    执行一轮 FedAvg：客户端本地训练、聚合、评估、贡献度、保存与记录。
+
+    训练进度保存在 handle 上（学习率衰减、start_epoch），外层循环可在轮次之间
+    处理暂停、停止、成员变化和检查点，随后从 handle.start_epoch 继续。
+
+    Returns:
+        RoundResult
+    """
+    handle.model.to(device)
+    apply_lr_decay(handle, epoch)
 
-            handle.logger.info(f"第 {epoch} 轮全局模型已保存到: {model_path}")
+    start_time = time.time()
+    agent_name_keys = get_clients(epoch, handle)
+    lens = len(agent_name_keys)
+    result = RoundResult(epoch, agent_name_keys)
 
-        except Exception as e:
-            handle.logger.error(f"保存模型失败: {e}")
+    ori_weight = handle.model.state_dict()
+    w_locals = []
 
+    for client in agent_name_keys:
+        if cpu_accel_enabled(handle.params):
+            # 复用任务级的编译模型，只加载本轮全局权重
+            model_copy = get_accelerator(handle).load_global(ori_weight)
+        else:
+            model_copy = copy.deepcopy(handle.model)
+        w = train.standard_train(epoch, handle.clients_data_num[client], client, handle.params,
+                                 model_copy.to(device),
+                                 handle.train_data[client], handle)
+        w_locals.append(w)
+    result.train_time = time.time() - start_time
+
+    beta = get_client_weights(handle, agent_name_keys)
+    result.weights = dict(zip(agent_name_keys, beta))
+    result.client_steps = {c: handle.client_train_stats[c]['steps'] for c in agent_name_keys}
+    handle.logger.info(f'Server Epoch:{epoch} client steps: {result.client_steps}, weights: {result.weights}')
+
+    phase_start = time.time()
+    w_glob = Aggregation({k: v.clone() for k, v in ori_weight.items()},
+                         w_locals, lens, beta, handle.params['eta'],
+                         handle.params['defence_method'], handle.params)
+
+    handle.model.load_state_dict(w_glob)
+    result.aggregate_time = time.time() - phase_start
+
+    phase_start = time.time()
+    acc = test.normal_test(epoch, handle.model, handle.test_data, handle.params, handle, poison=False)
+    result.accuracy = acc
+    result.eval_time = time.time() - phase_start
+
+    # 贡献度评估部分
+    phase_start = time.time()
+    try:
+        evaluate_contribution(handle, epoch, agent_name_keys, w_locals, w_glob, ori_weight)
+    except Exception as e:
+        handle.logger.error(f"贡献度评估失败: {e}")
+    result.contribution_time = time.time() - phase_start
 
-def FedAvg(handle):
-    handle.model.to(device)
+    # 保存全局模型（每100轮）
+    save_global_model(handle, epoch)
 
-    for epoch in range(handle.start_epoch, handle.params['epochs'] + 1):
-        if handle.params['lr_decay'] is True:
-            if epoch % handle.params['lr_decay_epoch'] == 0:
-                handle.params['lr'] = handle.params['lr'] * handle.params['lr_decay_gamma']
-                handle.params['poison_lr'] = handle.params['poison_lr'] * handle.params['lr_decay_gamma']
+    # 记录全局准确度到数据库（可选）
+    record_global_accuracy(handle, epoch, acc)
 
-        start_time = time.time()
-        agent_name_keys = get_clients(epoch, handle)
-        lens = len(agent_name_keys)
+    handle.start_epoch = epoch + 1
+    result.total_time = time.time() - start_time
+    handle.logger.info('Epoch {} completed in {:.2f} seconds (train {:.2f}s, eval {:.2f}s, contribution {:.2f}s)'.format(
+        epoch, result.total_time, result.train_time, result.eval_time, result.contribution_time))
+    return result
 
-        beta = [1] * lens
-        ori_weight = handle.model.state_dict()
-        w_locals = []
 
-        for client in agent_name_keys:
-            model_copy = copy.deepcopy(handle.model)
-            w = train.standard_train(epoch, handle.clients_data_num[client], client, handle.params,
-                                     model_copy.to(device),
-                                     handle.train_data[client], handle)
-            w_locals.append(w)
-
-        w_glob = Aggregation({k: v.clone() for k, v in ori_weight.items()},
-                             w_locals, lens, beta, handle.params['eta'],
-                             handle.params['defence_method'], handle.params)
-
-        handle.model.load_state_dict(w_glob)
-        acc = test.normal_test(epoch, handle.model, handle.test_data, handle.params, handle, poison=False)
-
-        # 贡献度评估部分
-        try:
-            evaluate_contribution(handle, epoch, agent_name_keys, w_locals, w_glob, ori_weight)
-        except Exception as e:
-            handle.logger.error(f"贡献度评估失败: {e}")
-
-        # 保存全局模型（每100轮）
-        save_global_model(handle, epoch)
-
-        # 记录全局准确度到数据库（可选）
-        try:
-            from federation_app.models import GlobalAccuracy, FederationTask
-            task_obj = FederationTask.objects.get(task_id=handle.task_id)
-            GlobalAccuracy.objects.create(
-                task=task_obj,
-                epoch=epoch,
-                accuracy=acc
-            )
-            handle.logger.info(f"任务 {handle.task_id} 第 {epoch} 轮全局准确度 {acc:.2f}% 已记录到数据库")
-        except Exception as e:
-            handle.logger.error(f"记录全局准确度失败: {e}")
-
-        handle.logger.info('Epoch {} completed in {:.2f} seconds'.format(epoch, time.time() - start_time))
-        time.sleep(15)
\ No newline at end of file
+def FedAvg(handle):
+    """连续执行剩余轮次，调度器不可运行时返回"""
+    while handle.start_epoch <= handle.params['epochs']:
+        # 按配置限速；暂停、停止或成员不足时返回，由外层训练循环等待
+        if not handle.scheduler.pace():
+            break
+        run_round(handle, handle.start_epoch)
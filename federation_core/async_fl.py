@@ -0,0 +1,197 @@
+# async_fl.py
+"""
+异步缓冲联邦学习（FedBuff 风格，params['algorithm'] = 'FedBuff'）
+
+若干训练线程各自拉取当前全局权重与版本号，训练一个客户端后把权重增量推入缓冲区；
+服务器线程在缓冲区攒够 B 个更新时聚合一次，每个增量按陈旧度
+s(τ) = 1 / (1 + τ)^a 缩放（τ 为当前版本与该更新基线版本之差）。
+全局准确度、贡献度记录与模型保存都以服务器版本号代替轮次。
+"""
+import copy
+import random
+import threading
+import time
+
+import torch
+
+import test
+import train
+from algorithm import (apply_lr_decay, evaluate_contribution, record_global_accuracy,
+                       save_global_model)
+from device import device
+
+
+class BufferedUpdate:
+    def __init__(self, client, delta, base_version, steps):
+        self.client = client
+        self.delta = delta
+        self.base_version = base_version
+        self.steps = steps
+
+
+class FedBuffServer:
+    def __init__(self, handle):
+        self.handle = handle
+        self.params = handle.params
+        self.logger = handle.logger
+
+        self.buffer_size = int(self.params.get('async_buffer_size', 3))
+        self.concurrency = int(self.params.get('async_concurrency', 2))
+        self.staleness_exponent = float(self.params.get('async_staleness_exponent', 0.5))
+        self.eta = float(self.params.get('eta', 1))
+
+        self.version = handle.start_epoch - 1
+        self._cond = threading.Condition()
+        self._buffer = []
+        self._busy = set()  # 正在训练或已有更新在缓冲区中的客户端
+        self._running = False
+        self._workers = []
+
+    # ==================== 训练线程 ====================
+
+    def _pick_client(self):
+        """在锁内选择一个空闲客户端，没有时返回 None"""
+        idle = [c for c in self.handle.namelist if c not in self._busy and c in self.handle.train_data]
+        if not idle:
+            return None
+        client = random.choice(idle)
+        self._busy.add(client)
+        return client
+
+    def _snapshot(self):
+        return self.version, {k: v.detach().clone() for k, v in self.handle.model.state_dict().items()}
+
+    def _worker_loop(self, worker_id):
+        local_model = copy.deepcopy(self.handle.model).to(device)
+
+        while self._running:
+            with self._cond:
+                client = self._pick_client()
+                if client is None:
+                    self._cond.wait()
+                    continue
+                base_version, global_weights = self._snapshot()
+
+            try:
+                local_model.load_state_dict(global_weights)
+                w = train.standard_train(base_version + 1, self.handle.clients_data_num.get(client, 0), client,
+                                         self.params, local_model, self.handle.train_data[client], self.handle)
+                delta = {k: w[k].detach() - global_weights[k] for k in global_weights
+                         if global_weights[k].dtype != torch.int64}
+                steps = self.handle.client_train_stats.get(client, {}).get('steps', 0)
+            except Exception as e:
+                self.logger.error(f"异步训练线程 {worker_id} 训练客户端 {client} 失败: {e}")
+                with self._cond:
+                    self._busy.discard(client)
+                    self._cond.notify_all()
+                continue
+
+            with self._cond:
+                self._buffer.append(BufferedUpdate(client, delta, base_version, steps))
+                self._cond.notify_all()
+
+    # ==================== 服务器 ====================
+
+    def _staleness_scale(self, staleness):
+        return 1.0 / ((1.0 + staleness) ** self.staleness_exponent)
+
+    def _aggregate(self, updates):
+        """把一批缓冲更新按陈旧度加权平均后应用到全局模型，返回聚合前后的权重与各客户端权重"""
+        handle = self.handle
+        w_prev = {k: v.detach().clone() for k, v in handle.model.state_dict().items()}
+        w_glob = {k: v.clone() for k, v in w_prev.items()}
+        scales = [self._staleness_scale(self.version - u.base_version) for u in updates]
+
+        w_locals = []
+        with torch.no_grad():
+            for k in updates[0].delta:
+                stacked = torch.stack([u.delta[k] * s for u, s in zip(updates, scales)])
+                w_glob[k] += self.eta * torch.mean(stacked, dim=0)
+            for u, s in zip(updates, scales):
+                w_local = {k: v.clone() for k, v in w_prev.items()}
+                for k in u.delta:
+                    w_local[k] += u.delta[k] * s
+                w_locals.append(w_local)
+
+        handle.model.load_state_dict(w_glob)
+        return w_prev, w_glob, w_locals, scales
+
+    def _wait_for_buffer(self):
+        """等待缓冲区攒够 B 个更新（成员数不足 B 时以当前成员数为准）"""
+        with self._cond:
+            while self._running and self.handle.scheduler.runnable():
+                target = max(1, min(self.buffer_size, len(self.handle.namelist)))
+                if len(self._buffer) >= target:
+                    updates, self._buffer = self._buffer[:target], self._buffer[target:]
+                    return updates
+                self._cond.wait()
+        return []
+
+    def _wake(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def run(self):
+        handle = self.handle
+        epochs = self.params['epochs']
+        self._running = True
+        handle.scheduler.add_listener(self._wake)
+        self._workers = [threading.Thread(target=self._worker_loop, args=(i,), daemon=True)
+                         for i in range(self.concurrency)]
+        for t in self._workers:
+            t.start()
+        self.logger.info(f"FedBuff 异步训练启动 - 缓冲区 {self.buffer_size}, 并发 {self.concurrency}, "
+                         f"陈旧度指数 {self.staleness_exponent}")
+
+        try:
+            while self.version < epochs:
+                if not handle.scheduler.pace():
+                    break
+                start_time = time.time()
+                updates = self._wait_for_buffer()
+                if not updates:
+                    break
+
+                with self._cond:
+                    next_version = self.version + 1
+                    apply_lr_decay(handle, next_version)
+                    w_prev, w_glob, w_locals, scales = self._aggregate(updates)
+                    self.version = next_version
+                    for u in updates:
+                        self._busy.discard(u.client)
+                    self._cond.notify_all()
+
+                clients = [u.client for u in updates]
+                staleness = {u.client: self.version - 1 - u.base_version for u in updates}
+                client_steps = {u.client: u.steps for u in updates}
+                self.logger.info(f"Server Version:{self.version} aggregated {clients}, staleness: {staleness}, "
+                                 f"steps: {client_steps}")
+
+                handle.client_inclusion_probs = {c: 1.0 for c in clients}
+                acc = test.normal_test(self.version, handle.model, handle.test_data, self.params, handle, poison=False)
+
+                try:
+                    evaluate_contribution(handle, self.version, clients, w_locals, w_glob, w_prev)
+                except Exception as e:
+                    self.logger.error(f"贡献度评估失败: {e}")
+
+                save_global_model(handle, self.version)
+                record_global_accuracy(handle, self.version, acc)
+                handle.start_epoch = self.version + 1
+
+                self.logger.info('Version {} completed in {:.2f} seconds'.format(self.version, time.time() - start_time))
+        finally:
+            self.stop()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        self.handle.scheduler.remove_listener(self._wake)
+        for t in self._workers:
+            t.join(timeout=30)
+
+
+def FedBuff(handle):
+    handle.model.to(device)
+    FedBuffServer(handle).run()
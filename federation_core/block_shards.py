@@ -0,0 +1,249 @@
+# block_shards.py
+"""
+数据块预分片：离线把每个数据块写成连续的 uint8 张量文件（含标签），
+训练时客户端只内存映射自己拥有的数据块并按批流式读取。
+
+manifest 记录生成分片所用的采样文件路径与内容哈希，Handle 只在与其加载的采样文件一致时使用分片。
+
+用法:
+    python block_shards.py --type CIFAR10
+"""
+import argparse
+import hashlib
+import json
+import os
+import pickle
+
+import numpy as np
+import torch
+
+# 各数据集的归一化参数（与 Handle.load_data 中的 transforms.Normalize 保持一致）
+NORMALIZE_STATS = {
+    'CIFAR10': ([0.485, 0.456, 0.406], [0.229, 0.224, 0.225]),
+    'MNIST': ([0.1307], [0.3081]),
+}
+
+MANIFEST_NAME = 'manifest.json'
+
+# Handle 加载的数据块划分文件（相对 federation_core）
+SAMPLING_FILE = 'sampling_results/sampling_cifar10.pkl'
+
+
+def get_core_dir():
+    return os.path.dirname(os.path.abspath(__file__))
+
+
+def get_shard_dir(dataset_type, core_dir=None):
+    """返回某个数据集的分片目录 data/shards/<type>"""
+    if core_dir is None:
+        core_dir = get_core_dir()
+    return os.path.join(core_dir, 'data', 'shards', dataset_type.lower())
+
+
+def get_sampling_file(core_dir=None):
+    """返回 Handle 使用的采样文件路径"""
+    if core_dir is None:
+        core_dir = get_core_dir()
+    return os.path.join(core_dir, SAMPLING_FILE)
+
+
+def sampling_file_hash(path):
+    """采样文件内容的 blake2b 哈希"""
+    digest = hashlib.blake2b(digest_size=32)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def manifest_matches_sampling(manifest, sampling_file):
+    """
+    检查分片是否由给定的采样文件生成（路径与内容哈希都一致），返回 (是否一致, 原因)
+    """
+    recorded = manifest.get('sampling_file')
+    if recorded is None or manifest.get('sampling_hash') is None:
+        return False, 'manifest 未记录采样文件'
+    if not os.path.isabs(recorded):
+        recorded = os.path.join(get_core_dir(), recorded)
+    if os.path.normpath(recorded) != os.path.normpath(os.path.abspath(sampling_file)):
+        return False, f'分片由 {recorded} 生成，当前采样文件为 {sampling_file}'
+    if not os.path.exists(sampling_file):
+        return False, f'采样文件 {sampling_file} 不存在'
+    if sampling_file_hash(sampling_file) != manifest['sampling_hash']:
+        return False, f'采样文件 {sampling_file} 在生成分片后已被修改'
+    return True, None
+
+
+def _block_paths(shard_dir, block_id):
+    return (os.path.join(shard_dir, f'block_{block_id}_images.npy'),
+            os.path.join(shard_dir, f'block_{block_id}_labels.npy'))
+
+
+def _load_raw_train_set(dataset_type, data_path):
+    """读取未经变换的训练集，返回 (N, C, H, W) uint8 图像和 int64 标签"""
+    from torchvision import datasets
+
+    if dataset_type == 'CIFAR10':
+        dataset = datasets.CIFAR10(data_path, train=True, download=True)
+        images = np.asarray(dataset.data, dtype=np.uint8).transpose(0, 3, 1, 2)
+    elif dataset_type == 'MNIST':
+        dataset = datasets.MNIST(data_path, train=True, download=True)
+        images = dataset.data.numpy().astype(np.uint8)[:, None, :, :]
+    else:
+        raise ValueError(f"不支持的数据集类型: {dataset_type}")
+
+    labels = np.asarray(dataset.targets, dtype=np.int64)
+    return images, labels
+
+
+def build_block_shards(dataset_type='CIFAR10', sampling_file=None, shard_dir=None, data_path=None):
+    """
+    按采样文件中的数据块划分，把每个数据块写成独立的分片文件
+
+    Returns:
+        dict: manifest 内容
+    """
+    core_dir = get_core_dir()
+    if sampling_file is None:
+        sampling_file = get_sampling_file(core_dir)
+    sampling_file = os.path.abspath(sampling_file)
+    if shard_dir is None:
+        shard_dir = get_shard_dir(dataset_type, core_dir)
+    if data_path is None:
+        data_path = os.path.join(core_dir, 'data')
+
+    with open(sampling_file, 'rb') as f:
+        blocks = pickle.load(f)['indices_per_participant']
+    sampling_hash = sampling_file_hash(sampling_file)
+    # 采样文件在 federation_core 下时记录相对路径，项目目录移动后仍可校验
+    recorded_path = os.path.relpath(sampling_file, core_dir)
+    if recorded_path.startswith(os.pardir):
+        recorded_path = sampling_file
+
+    images, labels = _load_raw_train_set(dataset_type, data_path)
+    os.makedirs(shard_dir, exist_ok=True)
+
+    manifest = {
+        'dataset_type': dataset_type,
+        'sample_shape': list(images.shape[1:]),
+        'sampling_file': recorded_path,
+        'sampling_hash': sampling_hash,
+        'blocks': {}
+    }
+
+    for block_id, indices in blocks.items():
+        indices = np.asarray(sorted(indices), dtype=np.int64)
+        image_path, label_path = _block_paths(shard_dir, block_id)
+
+        # 先写临时文件再重命名，避免训练进程读到写了一半的分片
+        for path, array in ((image_path, images[indices]), (label_path, labels[indices])):
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                np.save(f, np.ascontiguousarray(array))
+            os.replace(tmp_path, path)
+
+        manifest['blocks'][str(block_id)] = len(indices)
+
+    with open(os.path.join(shard_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    return manifest
+
+
+def load_manifest(shard_dir):
+    """读取分片目录的 manifest，不存在时返回 None"""
+    manifest_path = os.path.join(shard_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, 'r') as f:
+        return json.load(f)
+
+
+class BlockShardLoader:
+    """
+    只内存映射指定数据块的训练数据加载器
+
+    每次迭代打乱一次样本顺序，按批从 memmap 中读取 uint8 数据，
+    再在张量上批量完成数据增强与归一化。迭代返回 (images, labels)，
+    与 DataLoader 的接口一致，可直接交给 train.standard_train 使用。
+    """
+
+    def __init__(self, shard_dir, block_ids, dataset_type, batch_size, augment=True, limit=None):
+        self.batch_size = batch_size
+        self.augment = augment and dataset_type == 'CIFAR10'
+
+        self._images = []
+        self._labels = []
+        for block_id in block_ids:
+            image_path, label_path = _block_paths(shard_dir, block_id)
+            self._images.append(np.load(image_path, mmap_mode='r'))
+            self._labels.append(np.load(label_path, mmap_mode='r'))
+
+        sizes = [len(labels) for labels in self._labels]
+        # 全局样本 -> (块序号, 块内偏移)
+        self._block_of = np.repeat(np.arange(len(sizes)), sizes)
+        self._offset_of = np.concatenate([np.arange(n) for n in sizes]) if sizes else np.zeros(0, dtype=np.int64)
+        if limit is not None:
+            self._block_of = self._block_of[:limit]
+            self._offset_of = self._offset_of[:limit]
+
+        mean, std = NORMALIZE_STATS[dataset_type]
+        self._mean = torch.tensor(mean).view(1, -1, 1, 1) * 255.0
+        self._std = torch.tensor(std).view(1, -1, 1, 1) * 255.0
+
+    def __len__(self):
+        return (len(self._block_of) + self.batch_size - 1) // self.batch_size
+
+    @property
+    def num_samples(self):
+        return len(self._block_of)
+
+    def _gather(self, sample_ids):
+        """按块分组读取一批样本，块内按偏移排序以保持顺序访问"""
+        blocks = self._block_of[sample_ids]
+        offsets = self._offset_of[sample_ids]
+        images, labels = [], []
+        for b in np.unique(blocks):
+            local = np.sort(offsets[blocks == b])
+            images.append(self._images[b][local])
+            labels.append(self._labels[b][local])
+        return np.concatenate(images), np.concatenate(labels)
+
+    def _augment(self, images):
+        """RandomCrop(32, padding=4) + RandomHorizontalFlip 的批量实现"""
+        n, c, h, w = images.shape
+        padded = torch.nn.functional.pad(images, (4, 4, 4, 4))
+        oy = torch.randint(0, 9, (n,))
+        ox = torch.randint(0, 9, (n,))
+        rows = (oy[:, None] + torch.arange(h))[:, None, :, None]
+        cols = (ox[:, None] + torch.arange(w))[:, None, None, :]
+        images = padded[torch.arange(n)[:, None, None, None], torch.arange(c)[None, :, None, None], rows, cols]
+        flip = torch.rand(n) < 0.5
+        images[flip] = images[flip].flip(3)
+        return images
+
+    def __iter__(self):
+        order = np.random.permutation(len(self._block_of))
+        for start in range(0, len(order), self.batch_size):
+            images, labels = self._gather(order[start:start + self.batch_size])
+            images = torch.from_numpy(images).float()
+            if self.augment:
+                images = self._augment(images)
+            images = (images - self._mean) / self._std
+            yield images, torch.from_numpy(labels)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='数据块预分片构建')
+    parser.add_argument('--type', type=str, default='CIFAR10', choices=['CIFAR10', 'MNIST'], help='数据集类型')
+    parser.add_argument('--sampling_file', type=str,
+                        help=f'采样文件路径（可选，默认为训练时 Handle 使用的 {SAMPLING_FILE}）')
+    parser.add_argument('--shard_dir', type=str, help='分片输出目录（可选）')
+    args = parser.parse_args()
+
+    manifest = build_block_shards(args.type, args.sampling_file, args.shard_dir)
+    print(f"已生成 {len(manifest['blocks'])} 个数据块分片，样本形状: {manifest['sample_shape']}")
+
+
+if __name__ == "__main__":
+    main()
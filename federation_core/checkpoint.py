@@ -0,0 +1,230 @@
+# checkpoint.py
+"""
+完整训练状态检查点
+
+训练线程只负责在轮次结束时拍快照（权重拷贝到 CPU、学习率、轮次、成员、贡献度游标），
+序列化由后台写线程完成：先写临时文件再 os.replace 原子替换，保留最近 N 个检查点。
+发布用的全局模型（safetensors，见 model_artifacts）和模型版本历史（见 model_history）
+也走同一个写线程。
+"""
+import copy
+import os
+import queue
+import re
+import threading
+import time
+
+import torch
+
+from model_artifacts import save_model_artifact
+from model_history import ModelHistory
+
+CHECKPOINT_PATTERN = re.compile(r'^ckpt_(\d+)\.pt$')
+
+
+def atomic_torch_save(obj, path):
+    """先写临时文件再原子替换，读者永远不会看到写了一半的文件"""
+    tmp_path = f'{path}.tmp'
+    torch.save(obj, tmp_path)
+    os.replace(tmp_path, path)
+
+
+class CheckpointManager:
+    def __init__(self, handle):
+        self.handle = handle
+        self.logger = handle.logger
+        self.checkpoint_dir = os.path.join(handle.folder_path, 'checkpoints')
+        self.checkpoint_every = int(handle.params.get('checkpoint_every', 100))
+        self.model_save_every = int(handle.params.get('model_save_every', 100))
+        self.keep_last = int(handle.params.get('checkpoint_keep', 3))
+        self.history_every = int(handle.params.get('history_every', 10))
+        self.history = None
+        if handle.params.get('model_history', False):
+            self.history = ModelHistory.from_params(handle.folder_path, handle.params, logger=self.logger)
+
+        self._queue = queue.Queue()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+
+    # ==================== 后台写线程 ====================
+
+    def _ensure_writer(self):
+        with self._writer_lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._writer_loop, daemon=True)
+                self._writer.start()
+
+    def _writer_loop(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                kind, payload, path = job
+                if kind == 'history':
+                    state_dict, metadata = payload
+                    self.history.append(metadata['epoch'], state_dict, metadata)
+                elif kind == 'checkpoint':
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    atomic_torch_save(payload, path)
+                    self._apply_retention()
+                    self.logger.info(f"检查点已写入: {path}")
+                else:
+                    state_dict, metadata = payload
+                    path = save_model_artifact(state_dict, metadata, path)
+                    self.logger.info(f"第 {metadata['epoch']} 轮全局模型已保存到: {path}")
+            except Exception as e:
+                self.logger.error(f"写入检查点失败: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _submit(self, kind, payload, path):
+        self._ensure_writer()
+        self._queue.put((kind, payload, path))
+
+    def flush(self):
+        """等待所有已提交的写入完成"""
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.join()
+
+    def _apply_retention(self):
+        for path in self.list_checkpoints()[:-self.keep_last] if self.keep_last > 0 else []:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    # ==================== 快照 ====================
+
+    def _model_snapshot(self):
+        return {k: v.detach().to('cpu', copy=True) for k, v in self.handle.model.state_dict().items()}
+
+    def _model_metadata(self, epoch):
+        return {
+            'epoch': epoch,
+            'task_id': self.handle.task_id,
+            'task_name': self.handle.name,
+            'architecture': self.handle.params['model'],
+            'dataset': self.handle.params['type']
+        }
+
+    def snapshot(self, epoch, model_state=None):
+        """在训练线程上构建完整训练状态快照（只做内存拷贝）"""
+        handle = self.handle
+        with handle._user_lock:
+            namelist = list(handle.namelist)
+        return {
+            'epoch': epoch,
+            'model_state_dict': model_state if model_state is not None else self._model_snapshot(),
+            # 当前聚合为无状态的 eta 缩放，没有服务器端优化器；保留字段便于以后扩展
+            'server_optimizer_state': None,
+            'lr': handle.params['lr'],
+            'poison_lr': handle.params.get('poison_lr'),
+            'namelist': namelist,
+            'contribution_cursor': epoch,
+            'client_train_stats': copy.deepcopy(handle.client_train_stats),
+            'client_selection_counts': dict(handle.client_selection_counts),
+            'selection_rounds': handle.selection_rounds,
+            'task_id': handle.task_id,
+            'task_name': handle.name,
+            'architecture': handle.params['model'],
+            'dataset': handle.params['type'],
+        }
+
+    def on_round_end(self, epoch):
+        """轮次结束时按配置发布模型和写检查点（异步）"""
+        save_model = self.model_save_every > 0 and epoch % self.model_save_every == 0
+        save_ckpt = self.checkpoint_every > 0 and epoch % self.checkpoint_every == 0
+        save_history = self.history is not None and self.history_every > 0 and epoch % self.history_every == 0
+        if not (save_model or save_ckpt or save_history):
+            return
+
+        state = self._model_snapshot()
+        if save_history:
+            self._submit('history', (state, self._model_metadata(epoch)), None)
+        if save_model:
+            self._submit('model', (state, self._model_metadata(epoch)), self.handle.folder_path)
+        if save_ckpt:
+            self._submit('checkpoint', self.snapshot(epoch, state),
+                         os.path.join(self.checkpoint_dir, f'ckpt_{epoch}.pt'))
+
+    def save_final_model(self, epoch):
+        """同步写出最终模型（任务完成后立即要读取它）"""
+        self.flush()
+        return save_model_artifact(self._model_snapshot(), self._model_metadata(epoch), self.handle.folder_path)
+
+    # ==================== 恢复 ====================
+
+    def list_checkpoints(self):
+        """按轮次升序返回检查点路径"""
+        if not os.path.isdir(self.checkpoint_dir):
+            return []
+        found = []
+        for name in os.listdir(self.checkpoint_dir):
+            match = CHECKPOINT_PATTERN.match(name)
+            if match:
+                found.append((int(match.group(1)), os.path.join(self.checkpoint_dir, name)))
+        return [path for _, path in sorted(found)]
+
+    def archive_stale_checkpoints(self):
+        """新任务复用了已有目录时，把其中其他运行留下的检查点移到 checkpoints_stale_<时间戳>，避免被误恢复"""
+        if not self.list_checkpoints():
+            return None
+        stale_dir = f'{self.checkpoint_dir}_stale_{int(time.time())}'
+        os.replace(self.checkpoint_dir, stale_dir)
+        self.logger.warning(f"任务目录中存在其他运行的检查点，已移至 {stale_dir}")
+        return stale_dir
+
+    def _matches_task(self, state):
+        """检查点记录的任务ID、模型结构和数据集是否与当前任务一致"""
+        handle = self.handle
+        expected = {
+            'task_id': str(handle.task_id),
+            'architecture': handle.params['model'],
+            'dataset': handle.params['type'],
+        }
+        actual = {
+            'task_id': None if state.get('task_id') is None else str(state['task_id']),
+            'architecture': state.get('architecture'),
+            'dataset': state.get('dataset'),
+        }
+        return actual == expected, actual, expected
+
+    def restore_latest(self):
+        """
+        从最新的检查点恢复训练状态，返回恢复到的轮次；没有可用检查点时返回 None。
+        损坏的检查点以及任务ID、模型结构或数据集与当前任务不一致的检查点会被跳过，继续尝试更早的。
+        """
+        handle = self.handle
+        for path in reversed(self.list_checkpoints()):
+            try:
+                state = torch.load(path, map_location='cpu')
+            except Exception as e:
+                self.logger.warning(f"检查点 {path} 无法读取，跳过: {e}")
+                continue
+            matches, actual, expected = self._matches_task(state)
+            if not matches:
+                self.logger.warning(f"检查点 {path} 属于其他任务或配置（{actual}，当前 {expected}），跳过")
+                continue
+
+            handle.model.load_state_dict(state['model_state_dict'])
+            handle.params['lr'] = state['lr']
+            if state.get('poison_lr') is not None:
+                handle.params['poison_lr'] = state['poison_lr']
+            handle.client_train_stats = state.get('client_train_stats', {})
+            handle.client_selection_counts = state.get('client_selection_counts', {})
+            handle.selection_rounds = state.get('selection_rounds', 0)
+            handle.start_epoch = state['epoch'] + 1
+
+            # 检查点之后的轮次会重新训练，丢弃其贡献度记录
+            handle.contribution_manager.truncate_after(state['contribution_cursor'])
+            if self.history is not None:
+                self.history.truncate_after(state['epoch'])
+
+            for user_id in state.get('namelist', []):
+                if user_id not in handle.namelist:
+                    handle.add_user_to_federation(user_id)
+
+            self.logger.info(f"已从检查点恢复: {path}（第 {state['epoch']} 轮，成员 {handle.namelist}）")
+            return state['epoch']
+        return None
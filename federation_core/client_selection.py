@@ -0,0 +1,103 @@
+# client_selection.py
+"""
+每轮客户端采样策略（params['client_selection']）:
+    all             - 全部联邦用户参与（默认，保持原有行为）
+    uniform         - 均匀随机采样
+    size_weighted   - 按数据量加权采样
+    power_of_choice - 按数据量采样 d 个候选，取最近一次本地损失最高的 k 个
+    contribution    - 按累计贡献度加权采样
+
+采样数量 k 由 client_fraction（>0 时按比例）或 num_clients 决定。
+同时返回每个被选客户端的近似入选概率，贡献度记录据此做逆概率加权，
+使得未被采样的轮次不会让客户端的累计贡献产生系统性偏差。
+power_of_choice 的第二步按损失确定性地取前 k 个，入选概率取决于各客户端的损失排名，
+没有闭式近似，改为经验估计：记录各客户端在 power_of_choice 轮次中的入选次数，
+入选概率取平滑后的入选频率 (次数 + k/N) / (轮数 + 1)，先验为均匀采样的 k/N。
+"""
+import math
+
+import numpy as np
+
+SELECTION_POLICIES = ('all', 'uniform', 'size_weighted', 'power_of_choice', 'contribution')
+
+
+def _num_to_select(params, total):
+    fraction = float(params.get('client_fraction', 0) or 0)
+    if fraction > 0:
+        k = math.ceil(fraction * total)
+    else:
+        k = int(params.get('num_clients', total) or total)
+    # Shapley 评估至少需要 2 个用户
+    return max(min(2, total), min(k, total))
+
+
+def _weighted_sample(candidates, weights, k):
+    """按权重无放回采样，返回 (选中列表, 近似入选概率)"""
+    weights = np.asarray(weights, dtype=np.float64)
+    weights = weights + 1e-12
+    probs = weights / weights.sum()
+    chosen = np.random.choice(len(candidates), size=k, replace=False, p=probs)
+    selected = [candidates[i] for i in chosen]
+    inclusion = {candidates[i]: min(1.0, k * probs[i]) for i in chosen}
+    return selected, inclusion
+
+
+def _empirical_inclusion(handle, selected, prior):
+    """更新各客户端的入选次数，返回被选客户端按入选频率估计的入选概率（向先验 prior 平滑）"""
+    handle.selection_rounds += 1
+    for c in selected:
+        handle.client_selection_counts[c] = handle.client_selection_counts.get(c, 0) + 1
+    rounds = handle.selection_rounds
+    return {c: min(1.0, (handle.client_selection_counts[c] + prior) / (rounds + 1)) for c in selected}
+
+
+def _contribution_weights(handle, candidates):
+    totals = handle.contribution_manager._load_records().get('user_total_contributions', {})
+    values = [max(0.0, float(totals.get(str(c), 0.0))) for c in candidates]
+    # 尚无贡献记录的用户使用平均值，保证新用户有机会被选中
+    known = [v for v in values if v > 0]
+    default = sum(known) / len(known) if known else 1.0
+    return [v if v > 0 else default for v in values]
+
+
+def select_clients(epoch, handle):
+    """
+    按配置的策略选择本轮客户端
+
+    Returns:
+        (clients, inclusion_probs): 客户端列表与 {client: 入选概率}
+    """
+    params = handle.params
+    policy = params.get('client_selection', 'all')
+    candidates = list(handle.namelist)
+    total = len(candidates)
+
+    if policy == 'all' or total == 0:
+        return candidates, {c: 1.0 for c in candidates}
+
+    k = _num_to_select(params, total)
+    if k >= total:
+        return candidates, {c: 1.0 for c in candidates}
+
+    sizes = [handle.clients_data_num.get(c, 1) for c in candidates]
+
+    if policy == 'uniform':
+        return _weighted_sample(candidates, [1.0] * total, k)
+
+    if policy == 'size_weighted':
+        return _weighted_sample(candidates, sizes, k)
+
+    if policy == 'contribution':
+        return _weighted_sample(candidates, _contribution_weights(handle, candidates), k)
+
+    if policy == 'power_of_choice':
+        d = int(params.get('poc_candidates', 0) or 2 * k)
+        d = max(k, min(d, total))
+        pool, _ = _weighted_sample(candidates, sizes, d)
+        # 从未训练过的客户端损失视为无穷大，优先选中
+        losses = {c: handle.client_train_stats.get(c, {}).get('loss', float('inf')) for c in pool}
+        selected = sorted(pool, key=lambda c: losses[c], reverse=True)[:k]
+        # 按损失取前 k 个是确定性的，入选概率无法由采样权重推出，用运行中的入选频率估计
+        return selected, _empirical_inclusion(handle, selected, k / total)
+
+    raise ValueError(f"不支持的客户端采样策略: {policy}")
@@ -54,8 +54,13 @@ class ContributionManager:
         else:
             return random.sample(available_users, self.max_users)
 
-    def record_round_contribution(self, round_num, user_contributions):
-        """记录单轮贡献度"""
+    def record_round_contribution(self, round_num, user_contributions, inclusion_probs=None):
+        """
+        记录单轮贡献度
+
+        inclusion_probs 为本轮采样时各用户的入选概率；累计贡献按 contribution / p
+        逆概率加权，使部分采样下的累计值仍是全员参与时的无偏估计
+        """
         records = self._load_records()
 
         # 记录本轮贡献
@@ -64,9 +69,15 @@ class ContributionManager:
             "timestamp": datetime.now().isoformat(),
             "contributions": user_contributions
         }
+        if inclusion_probs:
+            records["round_records"][round_key]["inclusion_probs"] = {
+                str(user_id): inclusion_probs.get(user_id, 1.0) for user_id in user_contributions
+            }
 
         # 更新用户累计贡献
         for user_id, contribution in user_contributions.items():
+            if inclusion_probs:
+                contribution = contribution / max(inclusion_probs.get(user_id, 1.0), 1e-6)
             user_key = str(user_id)
             if user_key in records["user_total_contributions"]:
                 records["user_total_contributions"][user_key] += contribution
@@ -76,6 +87,30 @@ class ContributionManager:
         self._save_records(records)
         self.logger.info(f"第 {round_num} 轮贡献度记录已保存")
 
+    def truncate_after(self, round_num):
+        """
+        删除 round_num 之后的轮次记录并按剩余记录重算累计贡献
+        （从检查点恢复时，检查点之后的轮次会重新训练）
+        """
+        records = self._load_records()
+        kept = {key: record for key, record in records["round_records"].items()
+                if int(key.split('_', 1)[1]) <= round_num}
+        if len(kept) == len(records["round_records"]):
+            return
+
+        totals = {}
+        for record in kept.values():
+            probs = record.get("inclusion_probs", {})
+            for user_key, contribution in record["contributions"].items():
+                contribution = contribution / max(probs.get(user_key, 1.0), 1e-6)
+                totals[user_key] = totals.get(user_key, 0.0) + contribution
+
+        dropped = len(records["round_records"]) - len(kept)
+        records["round_records"] = kept
+        records["user_total_contributions"] = totals
+        self._save_records(records)
+        self.logger.info(f"已丢弃第 {round_num} 轮之后的 {dropped} 条贡献度记录")
+
     def get_user_final_ratios(self):
         """获取用户最终收益分配比例"""
         records = self._load_records()
@@ -0,0 +1,78 @@
+# distill.py
+"""
+发布时的知识蒸馏（params['distill_student'] 指定注册表中的学生模型，如 r8_slim）
+
+以最终全局模型为教师，在服务器持有的测试分布数据上训练学生模型：
+损失为 alpha * T^2 * KL(softmax(s/T) || softmax(t/T)) + (1 - alpha) * CE(s, y)。
+测试张量按 distill_holdout 切分，前一部分用于蒸馏，留出部分用于评估教师与学生，
+避免学生在自己的训练数据上评估。教师仍是规范模型，贡献度与股份不受影响。
+"""
+import copy
+
+import torch
+import torch.nn.functional as F
+
+from models.registry import create_model
+
+
+def split_transfer_set(images, labels, holdout):
+    """返回 (蒸馏集, 留出评估集)，各为 (images, labels)"""
+    split = int(labels.size(0) * (1.0 - holdout))
+    return (images[:split], labels[:split]), (images[split:], labels[split:])
+
+
+def distill_student(handle, teacher, images, labels):
+    """
+    在 (images, labels) 上把 teacher 蒸馏到 params['distill_student'] 指定的学生模型
+
+    Returns:
+        训练好的学生模型（CPU，eval 模式）
+    """
+    params = handle.params
+    logger = handle.logger
+    architecture = params['distill_student']
+    epochs = int(params.get('distill_epochs', 20))
+    temperature = float(params.get('distill_temperature', 4.0))
+    alpha = float(params.get('distill_alpha', 0.7))
+    batch_size = int(params.get('distill_batch_size', 256))
+    # 手写数字翻转后语义改变，只对 CIFAR10 做翻转增强
+    augment = params['type'] == 'CIFAR10'
+
+    train_device = images.device
+    teacher = copy.deepcopy(teacher).to(train_device).eval()
+    student = create_model(architecture, params['type'], num_classes=10).to(train_device)
+    optimizer = torch.optim.SGD(student.parameters(), lr=float(params.get('distill_lr', 0.05)),
+                                momentum=0.9, weight_decay=5e-4)
+    scheduler = torch.optim.lr_scheduler.CosineAnnealingLR(optimizer, T_max=max(1, epochs))
+
+    # 教师输出只需计算一次
+    with torch.inference_mode():
+        teacher_logits = torch.cat([teacher(images[i:i + batch_size]) for i in range(0, labels.size(0), batch_size)])
+    teacher_logits = teacher_logits.clone()
+
+    logger.info(f"开始知识蒸馏: 学生 {architecture}, 样本 {labels.size(0)}, 轮数 {epochs}, T={temperature}, alpha={alpha}")
+    for epoch in range(1, epochs + 1):
+        student.train()
+        order = torch.randperm(labels.size(0), device=train_device)
+        total_loss = 0.0
+        for start in range(0, labels.size(0), batch_size):
+            idx = order[start:start + batch_size]
+            data, target, soft = images[idx], labels[idx], teacher_logits[idx]
+            if augment:
+                # 随机水平翻转，教师输出对翻转近似不变
+                flip = torch.rand(data.size(0), device=train_device) < 0.5
+                data = torch.where(flip.view(-1, 1, 1, 1), data.flip(3), data)
+
+            outputs = student(data)
+            kd_loss = F.kl_div(F.log_softmax(outputs / temperature, dim=1), F.softmax(soft / temperature, dim=1),
+                               reduction='batchmean') * (temperature ** 2)
+            loss = alpha * kd_loss + (1 - alpha) * F.cross_entropy(outputs, target)
+
+            optimizer.zero_grad(set_to_none=True)
+            loss.backward()
+            optimizer.step()
+            total_loss += loss.item() * idx.size(0)
+        scheduler.step()
+        logger.info(f"___Distill epoch {epoch}/{epochs}, loss: {total_loss / labels.size(0):.4f}")
+
+    return student.cpu().eval()
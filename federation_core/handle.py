@@ -12,16 +12,21 @@ from torchvision.transforms import transforms
 from collections import defaultdict
 import pickle
 
-from models.ResNet8 import ResNet8
+from models.registry import get_model_spec
 from client_manager import ClientManager
+from block_shards import (BlockShardLoader, NORMALIZE_STATS, get_sampling_file, get_shard_dir, load_manifest,
+                          manifest_matches_sampling)
 from device import device
 from contribution_manager import ContributionManager  # 新增导入
+from scheduler import RoundScheduler
+from checkpoint import CheckpointManager
 
 
 class Handle:
     def __init__(self, current_time, params, task_id, name):
         self.current_time = current_time
         self.model = None
+        self.accelerator = None
 
         self.train_dataset = None
         self.test_dataset = None
@@ -29,7 +34,15 @@ class Handle:
 
         self.train_data = {}
         self.clients_data_num = {}
+        self.client_train_stats = {}
+        self.client_inclusion_probs = {}
+        # 最近一次全局评估是否覆盖完整测试集（见 test.normal_test）
+        self.last_eval_full = True
+        # power_of_choice 估计入选概率用：各客户端入选次数与采样轮数
+        self.client_selection_counts = {}
+        self.selection_rounds = 0
         self.test_data = None
+        self.test_tensors = None
 
         # 其他属性
         self.poisoned_test_data = None
@@ -54,6 +67,8 @@ class Handle:
         # 数据块相关属性
         self.data_blocks = {}
         self.total_blocks = 0
+        self.shard_dir = None
+        self.shard_manifest = None
 
         # 用户管理
         self.available_users_pool = []
@@ -100,16 +115,24 @@ class Handle:
         self.params['folder_path'] = self.folder_path
 
         # 采样文件路径
-        self.sampling_file_path = os.path.join(core_dir, 'sampling_results/sampling_cifar10.pkl')
+        self.sampling_file_path = get_sampling_file(core_dir)
 
         # 客户端管理器路径
         user_db_path = os.path.join(core_dir, 'user_database.json')
         self.client_manager = ClientManager(user_db_path)
         self._user_lock = threading.RLock()
 
+        # 轮次调度器：成员变化、暂停/恢复、停止时立即唤醒训练循环
+        self.scheduler = RoundScheduler(min_clients=int(self.params.get('min_clients', 2)),
+                                        min_round_interval=self.params.get('round_min_interval', 0))
+        self.scheduler.bind_member_count(lambda: len(self.namelist))
+
         # 新增：贡献度管理器
         self.contribution_manager = ContributionManager(task_id, self.folder_path)
 
+        # 训练状态检查点与模型发布（后台线程原子写入）
+        self.checkpoint_manager = CheckpointManager(self)
+
         self.logger.info("联邦学习环境初始化完成 - 初始用户数: 0")
 
     def load_data(self):
@@ -122,6 +145,22 @@ class Handle:
 
         os.makedirs(dataPath, exist_ok=True)
 
+        # 预分片模式：训练数据直接从数据块分片内存映射，不再打开完整训练集
+        if self.params.get('use_block_shards', False):
+            shard_dir = get_shard_dir(self.params['type'], core_dir)
+            manifest = load_manifest(shard_dir)
+            if manifest is None:
+                self.logger.warning(f'未找到数据块分片 {shard_dir}，回退到完整数据集加载')
+            else:
+                # 分片必须由当前使用的采样文件生成，否则数据块编号对应的样本不同
+                matches, reason = manifest_matches_sampling(manifest, self.sampling_file_path)
+                if matches:
+                    self.shard_manifest = manifest
+                    self.shard_dir = shard_dir
+                    self.logger.info(f'使用数据块分片: {shard_dir}')
+                else:
+                    self.logger.warning(f'数据块分片 {shard_dir} 与采样文件不匹配（{reason}），回退到完整数据集加载')
+
         # 数据加载
         if self.params['type'] == 'CIFAR10':
             transform_train = transforms.Compose([
@@ -134,7 +173,8 @@ class Handle:
                 transforms.ToTensor(),
                 transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
             ])
-            self.train_dataset = datasets.CIFAR10(dataPath, train=True, download=True, transform=transform_train)
+            if self.shard_dir is None:
+                self.train_dataset = datasets.CIFAR10(dataPath, train=True, download=True, transform=transform_train)
             self.test_dataset = datasets.CIFAR10(dataPath, train=False, download=True, transform=transform_test)
             self.test_dataset_poisoned = datasets.CIFAR10(dataPath, train=False, download=True,
                                                           transform=transform_test)
@@ -145,7 +185,8 @@ class Handle:
             transform_test = transforms.Compose([
                 transforms.ToTensor(), transforms.Normalize((0.1307,), (0.3081,))
             ])
-            self.train_dataset = datasets.MNIST(dataPath, train=True, download=True, transform=transform_train)
+            if self.shard_dir is None:
+                self.train_dataset = datasets.MNIST(dataPath, train=True, download=True, transform=transform_train)
             self.test_dataset = datasets.MNIST(dataPath, train=False, download=True, transform=transform_test)
             self.test_dataset_poisoned = datasets.MNIST(dataPath, train=False, download=True, transform=transform_test)
         else:
@@ -153,7 +194,8 @@ class Handle:
             return
 
         self.logger.info('reading data done')
-        self.classes_dict = self.build_classes_dict()
+        if self.train_dataset is not None:
+            self.classes_dict = self.build_classes_dict()
 
         self._load_data_blocks()
         self._load_user_data_assignments()
@@ -231,6 +273,10 @@ class Handle:
                 user_block_ids = self.user_data_blocks.get(user_id, [])
                 self.logger.info(f"用户 {user_id} 的数据块: {user_block_ids}")
 
+                if self.shard_dir is not None:
+                    self._build_shard_train_data(user_id, user_block_ids, train_loaders, clients_data_num)
+                    continue
+
                 all_indices = []
                 for block_id in user_block_ids:
                     if block_id in self.data_blocks:
@@ -262,6 +308,31 @@ class Handle:
             self.clients_data_num = clients_data_num
             self.logger.info(f"训练数据构建完成，共 {len(self.train_data)} 个联邦用户")
 
+    def _build_shard_train_data(self, user_id, user_block_ids, train_loaders, clients_data_num):
+        """从数据块分片为单个用户构建训练数据"""
+        blocks = self.shard_manifest['blocks']
+        block_ids = []
+        for block_id in user_block_ids:
+            if str(block_id) in blocks:
+                block_ids.append(block_id)
+            else:
+                self.logger.warning(f"用户 {user_id} 的数据块 {block_id} 没有分片")
+
+        limit = None
+        if not block_ids and blocks:
+            self.logger.warning(f"用户 {user_id} 没有有效数据")
+            block_ids = [next(iter(blocks))]
+            limit = 100
+
+        try:
+            train_loader = BlockShardLoader(self.shard_dir, block_ids, self.params['type'],
+                                            self.params['batch_size'], limit=limit)
+            train_loaders[user_id] = train_loader
+            clients_data_num[user_id] = train_loader.num_samples
+            self.logger.info(f"用户 {user_id} 有 {train_loader.num_samples} 个训练样本（分片）")
+        except Exception as e:
+            self.logger.error(f"为用户 {user_id} 构建分片训练数据时发生错误: {e}")
+
     def build_classes_dict(self):
         classes = {}
         for ind, x in enumerate(self.train_dataset):
@@ -290,19 +361,29 @@ class Handle:
         )
         return test_loader
 
+    def get_test_tensors(self):
+        """返回缓存在训练设备上的归一化测试集张量 (images, labels)，首次调用时构建"""
+        if self.test_tensors is None:
+            images = torch.as_tensor(np.asarray(self.test_dataset.data), dtype=torch.uint8)
+            if images.dim() == 3:
+                images = images.unsqueeze(1)
+            else:
+                images = images.permute(0, 3, 1, 2)
+            mean, std = NORMALIZE_STATS[self.params['type']]
+            mean = torch.tensor(mean).view(1, -1, 1, 1)
+            std = torch.tensor(std).view(1, -1, 1, 1)
+            images = ((images.float() / 255.0 - mean) / std).contiguous()
+            labels = torch.as_tensor(np.asarray(self.test_dataset.targets), dtype=torch.long)
+            self.test_tensors = (images.to(device), labels.to(device))
+            self.logger.info(f'测试集张量已缓存: {tuple(images.shape)}')
+        return self.test_tensors
+
     def create_model(self):
-        model = None
-        if self.params['model'] == 'CNN':
-            if self.params['type'] == 'MNIST':
-                model = CNNMnist()
-            elif self.params['type'] == 'CIFAR10':
-                model = CNNCifar10()
-        elif self.params['model'] == 'r8':
-            model = ResNet8()
-        elif self.params['model'] == 'r18':
-            model = ResNet18()
-        elif self.params['model'] == 'r34':
-            model = ResNet34()
+        spec = get_model_spec(self.params['model'], self.params['type'])
+        model = spec.build()
+        # 只记录登记时已有的统计，避免为日志再构建一次模型并做一次前向
+        params, flops = spec.cached_stats()
+        self.logger.info(f"创建模型 {spec.name} ({spec.dataset}) - 参数量: {params}, FLOPs: {flops}")
         model = model.to(device)
         self.model = model
 
@@ -327,6 +408,7 @@ class Handle:
             self.namelist.append(user_id)
             self.available_users_pool.remove(user_id)
             self._build_train_data()
+            self.scheduler.notify_membership_changed()
 
             self.logger.info(f"用户 {user_id} 已成功加入联邦")
             return True
@@ -346,6 +428,7 @@ class Handle:
                 self.available_users_pool.append(user_id)
 
             self._build_train_data()
+            self.scheduler.notify_membership_changed()
 
             self.logger.info(f"用户 {user_id} 已成功退出联邦")
             return True
@@ -5,7 +5,7 @@ import random
 import logging
 import yaml
 from handle import Handle
-from algorithm import FedAvg
+from algorithm import run_round, run_training
 
 
 # 配置主进程logger
@@ -40,6 +40,7 @@ class DynamicFederation:
         self.user_management_thread = None
         self.is_training = False
         self.is_user_management = False
+        self.handle.scheduler.stop()
         self.training_paused = False
 
         logger.info("动态联邦学习环境初始化完成")
@@ -49,6 +50,7 @@ class DynamicFederation:
         logger.info("启动动态联邦学习系统...")
 
         self.is_training = True
+        self.handle.scheduler.start()
         self.training_thread = threading.Thread(target=self._training_loop)
         self.training_thread.daemon = True
         self.training_thread.start()
@@ -66,6 +68,7 @@ class DynamicFederation:
 
         self.is_training = False
         self.is_user_management = False
+        self.handle.scheduler.stop()
 
         if self.training_thread:
             self.training_thread.join(timeout=10)
@@ -91,14 +94,17 @@ class DynamicFederation:
 
     def _training_loop(self):
         """训练循环"""
-        while self.is_training:
+        scheduler = self.handle.scheduler
+
+        while self.is_training and not scheduler.stopped:
+            runnable, generation = scheduler.poll()
             current_users = len(self.handle.namelist)
 
-            if current_users < 2:
+            if not runnable:
                 if not self.training_paused:
-                    logger.warning(f"当前用户数 {current_users} 少于2人，训练挂起")
+                    logger.warning(f"当前用户数 {current_users} 少于{scheduler.min_clients}人或已暂停，训练挂起")
                     self.training_paused = True
-                time.sleep(5)
+                scheduler.wait_for_change(generation)
                 continue
 
             if self.training_paused:
@@ -106,18 +112,24 @@ class DynamicFederation:
                 self.training_paused = False
 
             try:
-                logger.info(f"开始第 {self.handle.start_epoch} 轮联邦训练，当前用户数: {current_users}")
-                FedAvg(self.handle)
-                self.handle.start_epoch += 1
+                if self.params.get('algorithm', 'FedAvg') == 'FedBuff':
+                    logger.info(f"从版本 {self.handle.start_epoch} 开始异步联邦训练，当前用户数: {current_users}")
+                    run_training(self.handle)
+                else:
+                    if not scheduler.pace():
+                        continue
+                    logger.info(f"开始第 {self.handle.start_epoch} 轮联邦训练，当前用户数: {current_users}")
+                    run_round(self.handle, self.handle.start_epoch)
 
                 if self.handle.start_epoch > self.params['epochs']:
                     logger.info("达到最大训练轮数，停止训练")
                     self.is_training = False
+                    scheduler.stop()
                     break
 
             except Exception as e:
                 logger.error(f"训练过程中发生错误: {e}")
-                time.sleep(10)
+                scheduler.wait_stopped(timeout=10)
 
     def _user_management_loop(self):
         """用户管理循环"""
@@ -141,7 +153,9 @@ class DynamicFederation:
             except Exception as e:
                 logger.error(f"用户管理过程中发生错误: {e}")
 
-            time.sleep(check_interval)
+            # 模拟用户进出的节奏；停止时立即退出
+            if self.handle.scheduler.wait_stopped(timeout=check_interval):
+                break
 
     def _add_initial_users(self):
         """初始添加几个用户"""
@@ -174,7 +188,7 @@ def main():
                         f"活跃用户{status['active_users']}, "
                         f"可用用户池{status['available_users']}, "
                         f"训练{'暂停' if federation.training_paused else '进行中'}")
-            time.sleep(30)
+            federation.handle.scheduler.wait_stopped(timeout=30)
 
     except KeyboardInterrupt:
         logger.info("收到中断信号，正在停止系统...")
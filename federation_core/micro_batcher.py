@@ -0,0 +1,121 @@
+# micro_batcher.py
+"""
+预测请求的动态微批处理
+
+并发请求把预处理好的单张图像张量放入队列并拿到一个 Future；工作线程取出第一个请求后
+最多再等待 max_wait_ms 毫秒，攒够 max_batch_size 个或超时即合成一个批次推理，
+再把每张图像的结果交还给对应的 Future。单个请求的额外延迟不超过 max_wait_ms。
+stop() 后已入队的请求照常处理完，工作线程随后退出。
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import torch
+
+# 队列中的停止信号
+_STOP = object()
+
+
+class MicroBatcher:
+    def __init__(self, run_batch, max_batch_size=16, max_wait_ms=5, name='micro-batcher'):
+        """
+        Args:
+            run_batch: 接收 [N, C, H, W] 张量、返回 N 个结果的函数
+        """
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+
+        self._queue = queue.Queue()
+        self._submit_lock = threading.Lock()
+        self._stopped = False
+        self._worker = threading.Thread(target=self._worker_loop, name=name, daemon=True)
+        self._worker.start()
+        self.batches = 0
+        self.items = 0
+
+    def configure(self, max_batch_size=None, max_wait_ms=None):
+        """更新批大小与等待时间（下一个批次生效）"""
+        if max_batch_size is not None:
+            self.max_batch_size = max(1, int(max_batch_size))
+        if max_wait_ms is not None:
+            self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+
+    @property
+    def stopped(self):
+        return self._stopped
+
+    def submit(self, image_tensor):
+        """提交一张 [C, H, W] 图像，返回结果的 Future；已停止时抛出 RuntimeError"""
+        future = Future()
+        with self._submit_lock:
+            if self._stopped:
+                raise RuntimeError(f"微批处理器 {self.name} 已停止")
+            self._queue.put((image_tensor, future))
+        return future
+
+    def stop(self):
+        """停止接收新请求；已入队的请求处理完后工作线程退出（不等待）"""
+        with self._submit_lock:
+            if self._stopped:
+                return
+            self._stopped = True
+            self._queue.put(_STOP)
+
+    def _collect(self):
+        """
+        阻塞取第一个请求，然后在等待窗口内尽量凑满一个批次
+
+        Returns:
+            (批次, 是否取到停止信号)
+        """
+        item = self._queue.get()
+        if item is _STOP:
+            return [], True
+        batch = [item]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self, batch):
+        # 调用方已取消的请求不再推理
+        batch = [(tensor, future) for tensor, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        try:
+            results = self.run_batch(torch.stack([tensor for tensor, _ in batch]))
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        self.batches += 1
+        self.items += len(batch)
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def _worker_loop(self):
+        while True:
+            batch, stopping = self._collect()
+            self._run(batch)
+            if stopping:
+                return
+
+    def stats(self):
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000.0,
+            'batches': self.batches,
+            'items': self.items,
+            'avg_batch_size': round(self.items / self.batches, 2) if self.batches else 0,
+        }
@@ -0,0 +1,372 @@
+# model_artifacts.py
+"""
+发布模型文件的读写
+
+发布的全局模型保存为 safetensors（global_model.safetensors）：元数据
+（epoch、task_id、task_name、architecture、dataset）写在文件头，读取元数据只解析头部，
+不触碰张量；权重通过内存映射零拷贝加载。旧的 global_model.pth 仍可读取。
+
+saved_models/model_index.json 按模型目录名索引各任务发布模型的元数据（epoch、结构、大小、mtime、哈希），
+保存模型时更新；读取时以文件 mtime 和大小判断条目是否过期，过期或缺失的条目重新读取文件头补齐。
+
+转换旧模型:
+    python model_artifacts.py convert saved_models/1_TEST
+    python model_artifacts.py convert --all
+"""
+import argparse
+import hashlib
+import json
+import os
+import struct
+import threading
+
+import torch
+
+try:
+    from safetensors import safe_open
+    from safetensors.torch import save_file
+    HAS_SAFETENSORS = True
+except ImportError:
+    HAS_SAFETENSORS = False
+
+MODEL_FILENAME = 'global_model.safetensors'
+LEGACY_MODEL_FILENAME = 'global_model.pth'
+METADATA_KEYS = ('epoch', 'task_id', 'task_name', 'architecture', 'dataset')
+
+# 发布时生成的推理产物（见 publish.py）
+SERVING_DIRNAME = 'serving'
+MANIFEST_FILENAME = 'manifest.json'
+
+INDEX_FILENAME = 'model_index.json'
+_index_lock = threading.Lock()
+
+
+def parse_task_dir_name(name):
+    """模型目录名 "<task_id>_<task_name>" -> (task_id, task_name)"""
+    parts = name.split('_', 1)
+    return parts[0], parts[1] if len(parts) > 1 else parts[0]
+
+
+def task_dir_name(task_id, task_name):
+    """任务模型目录名，与 Handle.folder_path 一致"""
+    return f'{task_id}_{task_name}'
+
+
+def find_task_dir(models_dir, task_id, task_name=None):
+    """
+    返回任务的模型目录，不存在时返回 None。
+
+    给出 task_name 时按 "<task_id>_<task_name>" 精确定位（与训练时 Handle 写入的目录一致）；
+    未给出时按任务ID匹配（任务 1 不会匹配到 15_xxx），同一 task_id 有多个目录时无法确定
+    属于哪个任务，抛出 ValueError。
+    """
+    if task_name is not None:
+        path = os.path.join(models_dir, task_dir_name(task_id, task_name))
+        return path if os.path.isdir(path) else None
+    if not os.path.isdir(models_dir):
+        return None
+    matches = [name for name in sorted(os.listdir(models_dir))
+               if parse_task_dir_name(name)[0] == str(task_id) and os.path.isdir(os.path.join(models_dir, name))]
+    if len(matches) > 1:
+        raise ValueError(f"任务 {task_id} 对应多个模型目录 {matches}，请指定任务名称")
+    return os.path.join(models_dir, matches[0]) if matches else None
+
+
+def find_model_file(task_dir):
+    """返回任务目录下的模型文件路径（优先 safetensors），不存在时返回 None"""
+    for name in (MODEL_FILENAME, LEGACY_MODEL_FILENAME):
+        path = os.path.join(task_dir, name)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def _encode_metadata(metadata):
+    # safetensors 头部元数据只允许字符串
+    return {k: str(metadata[k]) for k in METADATA_KEYS if metadata.get(k) is not None}
+
+
+def _decode_metadata(raw):
+    metadata = dict(raw or {})
+    if 'epoch' in metadata:
+        try:
+            metadata['epoch'] = int(metadata['epoch'])
+        except ValueError:
+            pass
+    return metadata
+
+
+def save_model_artifact(state_dict, metadata, task_dir, filename=MODEL_FILENAME):
+    """
+    原子写出发布模型，返回文件路径。safetensors 不可用时退回 torch.save 的 .pth 格式。
+    filename 用于在同一目录写出其他模型（如蒸馏得到的学生模型）。
+    """
+    os.makedirs(task_dir, exist_ok=True)
+    tensors = {k: v.detach().to('cpu').contiguous() for k, v in state_dict.items()}
+
+    if HAS_SAFETENSORS:
+        path = os.path.join(task_dir, filename)
+        tmp_path = f'{path}.tmp'
+        save_file(tensors, tmp_path, metadata=_encode_metadata(metadata))
+        os.replace(tmp_path, path)
+        # 旧格式文件已过期，删除以免读者读到旧权重
+        legacy_path = os.path.join(task_dir, LEGACY_MODEL_FILENAME)
+        if filename == MODEL_FILENAME and os.path.exists(legacy_path):
+            os.remove(legacy_path)
+    else:
+        path = os.path.join(task_dir, LEGACY_MODEL_FILENAME if filename == MODEL_FILENAME
+                            else os.path.splitext(filename)[0] + '.pth')
+        tmp_path = f'{path}.tmp'
+        torch.save(dict(metadata, model_state_dict=tensors), tmp_path)
+        os.replace(tmp_path, path)
+
+    if filename == MODEL_FILENAME:
+        try:
+            ModelIndex(os.path.dirname(os.path.abspath(task_dir))).update(task_dir, path, metadata)
+        except (OSError, ValueError):
+            # 索引只是缓存，读取时会按 mtime 自行修复
+            pass
+    return path
+
+
+def read_safetensors_header(path):
+    """只读取 safetensors 文件头（8 字节长度 + JSON），不依赖 safetensors 包"""
+    with open(path, 'rb') as f:
+        (header_len,) = struct.unpack('<Q', f.read(8))
+        return json.loads(f.read(header_len))
+
+
+def read_model_metadata(path):
+    """读取模型元数据；safetensors 只解析头部，旧 .pth 需要完整反序列化"""
+    if path.endswith('.safetensors'):
+        return _decode_metadata(read_safetensors_header(path).get('__metadata__'))
+
+    checkpoint = torch.load(path, map_location='cpu')
+    if isinstance(checkpoint, dict) and 'model_state_dict' in checkpoint:
+        return {k: checkpoint[k] for k in METADATA_KEYS if k in checkpoint}
+    return {}
+
+
+def _legacy_state_dict(checkpoint):
+    """兼容旧 .pth 的几种保存格式"""
+    if isinstance(checkpoint, dict):
+        if 'model_state_dict' in checkpoint:
+            return checkpoint['model_state_dict']
+        if 'state_dict' in checkpoint:
+            return checkpoint['state_dict']
+    return checkpoint
+
+
+def load_model_artifact(path, map_location='cpu'):
+    """
+    加载模型文件，返回 (state_dict, metadata)
+
+    safetensors 通过内存映射加载；旧 .pth 按原有的几种格式解析
+    """
+    if path.endswith('.safetensors'):
+        if not HAS_SAFETENSORS:
+            raise ImportError("读取 safetensors 模型需要安装 safetensors 包")
+        device = str(map_location)
+        with safe_open(path, framework='pt', device=device) as f:
+            metadata = _decode_metadata(f.metadata())
+            state_dict = {k: f.get_tensor(k) for k in f.keys()}
+        return state_dict, metadata
+
+    checkpoint = torch.load(path, map_location=map_location)
+    metadata = {}
+    if isinstance(checkpoint, dict) and 'model_state_dict' in checkpoint:
+        metadata = {k: checkpoint[k] for k in METADATA_KEYS if k in checkpoint}
+    return _legacy_state_dict(checkpoint), metadata
+
+
+def serving_dir(task_dir):
+    return os.path.join(task_dir, SERVING_DIRNAME)
+
+
+def read_serving_manifest(task_dir):
+    try:
+        with open(os.path.join(serving_dir(task_dir), MANIFEST_FILENAME), 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def select_serving_artifact(task_dir, model_path, backend='pytorch'):
+    """
+    返回应当用于服务的推理产物条目（附带 path）；清单不存在、已过期（规范模型在发布后
+    被改写）或选中的是规范模型本身时返回 None。onnxruntime 后端使用清单中选出的 ONNX 产物
+    """
+    manifest = read_serving_manifest(task_dir)
+    selected = manifest.get('selected_onnx' if backend == 'onnxruntime' else 'selected') if manifest else None
+    if not selected:
+        return None
+    if manifest.get('source_file') != os.path.basename(model_path) or \
+            manifest.get('source_mtime') != os.path.getmtime(model_path):
+        return None
+    for artifact in manifest['artifacts']:
+        if artifact['name'] == selected and artifact.get('file'):
+            return dict(artifact, path=os.path.join(serving_dir(task_dir), artifact['file']))
+    return None
+
+
+# ==================== 元数据索引 ====================
+
+def file_hash(path):
+    """模型文件内容的 blake2b 哈希"""
+    digest = hashlib.blake2b(digest_size=32)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def build_index_entry(task_dir, model_path, metadata=None):
+    """读取（或使用给定的）元数据，生成模型索引条目"""
+    if metadata is None:
+        metadata = read_model_metadata(model_path)
+    metadata = _decode_metadata(_encode_metadata(metadata))
+    dir_name = os.path.basename(os.path.normpath(task_dir))
+    task_id, task_name = parse_task_dir_name(dir_name)
+    stat = os.stat(model_path)
+    return {
+        'task_id': task_id,
+        'task_name': metadata.get('task_name', task_name),
+        'dir': dir_name,
+        'file': os.path.basename(model_path),
+        'format': os.path.splitext(model_path)[1].lstrip('.'),
+        'epoch': metadata.get('epoch'),
+        'architecture': metadata.get('architecture'),
+        'dataset': metadata.get('dataset'),
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'hash': file_hash(model_path),
+    }
+
+
+class ModelIndex:
+    def __init__(self, models_dir):
+        self.models_dir = models_dir
+        self.path = os.path.join(models_dir, INDEX_FILENAME)
+
+    def _read(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f).get('models', {})
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _write(self, entries):
+        tmp_path = f'{self.path}.tmp.{os.getpid()}.{threading.get_ident()}'
+        with open(tmp_path, 'w') as f:
+            json.dump({'models': entries}, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def update(self, task_dir, model_path, metadata=None):
+        """模型保存后更新该任务的索引条目"""
+        entry = build_index_entry(task_dir, model_path, metadata)
+        with _index_lock:
+            entries = self._read()
+            entries[entry['dir']] = entry
+            self._write(entries)
+        return entry
+
+    @staticmethod
+    def _is_current(entry, dir_name, model_path):
+        if entry is None or entry.get('dir') != dir_name or entry.get('file') != os.path.basename(model_path):
+            return False
+        stat = os.stat(model_path)
+        return entry.get('mtime') == stat.st_mtime and entry.get('size') == stat.st_size
+
+    def list(self, tasks=None):
+        """
+        返回已发布模型的索引条目（按 task_id 排序）。只对每个任务目录做一次 stat，
+        过期或缺失的条目重新读取文件头，已删除的目录从索引移除。
+
+        tasks 为 {task_id: task_name} 时只返回这些任务的 "<task_id>_<task_name>" 目录，
+        同一 task_id 下其他运行留下的目录不会被当作该任务的模型。
+        """
+        if not os.path.isdir(self.models_dir):
+            return []
+        wanted = None
+        if tasks is not None:
+            wanted = {task_dir_name(task_id, task_name) for task_id, task_name in tasks.items()}
+        with _index_lock:
+            entries = self._read()
+            current = {}
+            changed = False
+            for dir_name in sorted(os.listdir(self.models_dir)):
+                task_dir = os.path.join(self.models_dir, dir_name)
+                model_path = find_model_file(task_dir) if os.path.isdir(task_dir) else None
+                if model_path is None:
+                    continue
+                entry = entries.get(dir_name)
+                if not self._is_current(entry, dir_name, model_path):
+                    try:
+                        entry = build_index_entry(task_dir, model_path)
+                    except Exception:
+                        continue
+                    changed = True
+                current[dir_name] = entry
+            if changed or current.keys() != entries.keys():
+                self._write(current)
+        listed = [entry for dir_name, entry in current.items() if wanted is None or dir_name in wanted]
+        return sorted(listed, key=lambda e: (len(e['task_id']), e['task_id'], e['dir']))
+
+    def get(self, task_id, task_name=None):
+        """返回单个任务的索引条目（必要时刷新），模型不存在时返回 None；task_name 的含义同 find_task_dir"""
+        task_dir = find_task_dir(self.models_dir, task_id, task_name)
+        model_path = find_model_file(task_dir) if task_dir else None
+        if model_path is None:
+            return None
+        dir_name = os.path.basename(task_dir)
+        entry = self._read().get(dir_name)
+        if self._is_current(entry, dir_name, model_path):
+            return entry
+        return self.update(task_dir, model_path)
+
+
+def convert_to_safetensors(task_dir):
+    """把任务目录下的 global_model.pth 转换为 safetensors，返回新文件路径"""
+    legacy_path = os.path.join(task_dir, LEGACY_MODEL_FILENAME)
+    if not os.path.exists(legacy_path):
+        raise FileNotFoundError(f"未找到 {legacy_path}")
+    if not HAS_SAFETENSORS:
+        raise ImportError("转换需要安装 safetensors 包")
+
+    state_dict, metadata = load_model_artifact(legacy_path)
+    if 'task_id' not in metadata or 'task_name' not in metadata:
+        # 旧文件可能没有记录任务信息，从目录名 "<task_id>_<task_name>" 推断
+        task_id, task_name = parse_task_dir_name(os.path.basename(os.path.normpath(task_dir)))
+        metadata.setdefault('task_id', task_id)
+        metadata.setdefault('task_name', task_name)
+    return save_model_artifact(state_dict, metadata, task_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='模型文件格式工具')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    convert = subparsers.add_parser('convert', help='把 global_model.pth 转换为 safetensors')
+    convert.add_argument('task_dirs', nargs='*', help='任务模型目录')
+    convert.add_argument('--all', action='store_true', help='转换 saved_models 下的全部任务')
+    convert.add_argument('--models_dir', type=str,
+                         default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'saved_models'),
+                         help='saved_models 目录（配合 --all 使用）')
+
+    args = parser.parse_args()
+
+    task_dirs = list(args.task_dirs)
+    if args.all:
+        task_dirs += [os.path.join(args.models_dir, d) for d in sorted(os.listdir(args.models_dir))
+                      if os.path.exists(os.path.join(args.models_dir, d, LEGACY_MODEL_FILENAME))]
+
+    for task_dir in task_dirs:
+        try:
+            path = convert_to_safetensors(task_dir)
+            print(f"已转换: {path}")
+        except Exception as e:
+            print(f"转换 {task_dir} 失败: {e}")
+
+
+if __name__ == '__main__':
+    main()
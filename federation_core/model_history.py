@@ -0,0 +1,265 @@
+# model_history.py
+"""
+按任务保存的全局模型版本历史
+
+每 K 个版本保存一个完整关键帧，其间只保存相对上一版本的权重增量。增量量化为
+fp16 或按张量缩放的 int8，再用 zstd 压缩（未安装 zstandard 时退回 zlib）。
+增量按"当前权重 - 上一版本重建结果"计算，量化误差不会沿链累积。
+
+目录结构:
+    <task_dir>/history/index.json       版本号 -> 文件、类型、所属关键帧
+    <task_dir>/history/v<version>.key   关键帧
+    <task_dir>/history/v<version>.delta 增量
+
+index.json 以版本号为键，查找是 O(1)；重建任一版本最多读取一个关键帧加 K-1 个增量。
+保留策略以关键帧为单位，只保留最近 N 段。
+"""
+import io
+import json
+import os
+import threading
+import zlib
+
+import torch
+
+try:
+    import zstandard
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+
+HISTORY_DIRNAME = 'history'
+DELTA_DTYPES = ('fp16', 'int8')
+
+
+def _compress(data):
+    if HAS_ZSTD:
+        return b'zstd' + zstandard.ZstdCompressor(level=3).compress(data)
+    return b'zlib' + zlib.compress(data, 6)
+
+
+def _decompress(blob):
+    codec, data = blob[:4], blob[4:]
+    if codec == b'zstd':
+        if not HAS_ZSTD:
+            raise ImportError("读取该历史版本需要安装 zstandard 包")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+def _quantize(delta, delta_dtype):
+    """把一个增量张量编码为可序列化的对象"""
+    if not delta.is_floating_point():
+        return {'raw': delta}
+    if delta_dtype == 'int8':
+        scale = delta.abs().max().item() / 127.0
+        if scale == 0:
+            return {'zero': list(delta.shape), 'dtype': str(delta.dtype)}
+        q = torch.clamp(torch.round(delta / scale), -127, 127).to(torch.int8)
+        return {'int8': q, 'scale': scale}
+    return {'fp16': delta.to(torch.float16)}
+
+
+def _dequantize(encoded, like):
+    if 'raw' in encoded:
+        return encoded['raw']
+    if 'zero' in encoded:
+        return torch.zeros_like(like)
+    if 'int8' in encoded:
+        return encoded['int8'].to(like.dtype) * encoded['scale']
+    return encoded['fp16'].to(like.dtype)
+
+
+class ModelHistory:
+    def __init__(self, task_dir, keyframe_every=20, delta_dtype='fp16', keep_keyframes=10, logger=None):
+        if delta_dtype not in DELTA_DTYPES:
+            raise ValueError(f"不支持的增量精度: {delta_dtype}，可选 {DELTA_DTYPES}")
+        self.history_dir = os.path.join(task_dir, HISTORY_DIRNAME)
+        self.index_path = os.path.join(self.history_dir, 'index.json')
+        self.keyframe_every = max(1, int(keyframe_every))
+        self.delta_dtype = delta_dtype
+        self.keep_keyframes = int(keep_keyframes)
+        self.logger = logger
+
+        self._lock = threading.RLock()
+        self._index = None
+        # 最近一次写入版本的重建结果，用于计算下一个增量（只在写入方使用）
+        self._last_version = None
+        self._last_state = None
+
+    @classmethod
+    def from_params(cls, task_dir, params, logger=None):
+        return cls(task_dir,
+                   keyframe_every=params.get('history_keyframe_every', 20),
+                   delta_dtype=params.get('history_delta_dtype', 'fp16'),
+                   keep_keyframes=params.get('history_keep_keyframes', 10),
+                   logger=logger)
+
+    # ==================== 索引 ====================
+
+    def _load_index(self):
+        if self._index is None:
+            try:
+                with open(self.index_path, 'r') as f:
+                    self._index = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                self._index = {'versions': {}, 'metadata': {}}
+        return self._index
+
+    def _save_index(self):
+        os.makedirs(self.history_dir, exist_ok=True)
+        tmp_path = f'{self.index_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self._index, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def versions(self):
+        """返回已保存的版本号（升序）"""
+        with self._lock:
+            return sorted(int(v) for v in self._load_index()['versions'])
+
+    def latest_version(self):
+        versions = self.versions()
+        return versions[-1] if versions else None
+
+    def version_file(self, version):
+        """返回某个版本的数据文件路径，不存在时返回 None"""
+        with self._lock:
+            entry = self._load_index()['versions'].get(str(version))
+        return os.path.join(self.history_dir, entry['file']) if entry else None
+
+    def metadata(self):
+        with self._lock:
+            return dict(self._load_index()['metadata'])
+
+    # ==================== 读写 ====================
+
+    def _write_blob(self, name, obj):
+        buffer = io.BytesIO()
+        torch.save(obj, buffer)
+        path = os.path.join(self.history_dir, name)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(_compress(buffer.getvalue()))
+        os.replace(tmp_path, path)
+
+    def _read_blob(self, name):
+        with open(os.path.join(self.history_dir, name), 'rb') as f:
+            return torch.load(io.BytesIO(_decompress(f.read())), map_location='cpu')
+
+    def append(self, version, state_dict, metadata=None):
+        """
+        保存一个新版本。距上一个关键帧满 K 个版本、或没有可用的上一版本时写关键帧，否则写增量。
+        """
+        with self._lock:
+            index = self._load_index()
+            os.makedirs(self.history_dir, exist_ok=True)
+            state = {k: v.detach().cpu() for k, v in state_dict.items()}
+            if metadata:
+                index['metadata'].update({k: v for k, v in metadata.items() if k != 'epoch'})
+
+            previous = self.latest_version()
+            if previous is not None and previous >= version:
+                self.truncate_after(version - 1)
+                previous = self.latest_version()
+
+            write_keyframe = previous is None
+            if not write_keyframe:
+                entry = index['versions'][str(previous)]
+                write_keyframe = version - entry['keyframe'] >= self.keyframe_every
+
+            if write_keyframe:
+                name = f'v{version}.key'
+                self._write_blob(name, state)
+                index['versions'][str(version)] = {'file': name, 'kind': 'key', 'keyframe': version,
+                                                   'parent': None}
+                self._last_state = state
+            else:
+                if self._last_version != previous:
+                    self._last_state = self._reconstruct(previous)
+                base = self._last_state
+                encoded = {k: _quantize(state[k] - base[k] if state[k].is_floating_point() else state[k],
+                                        self.delta_dtype)
+                           for k in state}
+                name = f'v{version}.delta'
+                self._write_blob(name, {'dtype': self.delta_dtype, 'tensors': encoded})
+                index['versions'][str(version)] = {'file': name, 'kind': 'delta',
+                                                   'keyframe': entry['keyframe'], 'parent': previous}
+                self._last_state = self._apply_delta(base, encoded)
+
+            self._last_version = version
+            self._apply_retention()
+            self._save_index()
+
+    @staticmethod
+    def _apply_delta(base, encoded):
+        out = {}
+        for k, like in base.items():
+            value = _dequantize(encoded[k], like)
+            out[k] = like + value if like.is_floating_point() else value
+        return out
+
+    def _reconstruct(self, version):
+        index = self._load_index()
+        entry = index['versions'].get(str(version))
+        if entry is None:
+            raise KeyError(f"历史中没有版本 {version}")
+
+        chain = []
+        while entry['kind'] != 'key':
+            chain.append(entry)
+            entry = index['versions'][str(entry['parent'])]
+        state = self._read_blob(entry['file'])
+        for delta_entry in reversed(chain):
+            state = self._apply_delta(state, self._read_blob(delta_entry['file'])['tensors'])
+        return state
+
+    def load(self, version=None):
+        """
+        重建指定版本（默认最新），返回 (state_dict, metadata)
+        """
+        with self._lock:
+            if version is None:
+                version = self.latest_version()
+                if version is None:
+                    raise KeyError("模型历史为空")
+            state = self._reconstruct(int(version))
+            metadata = dict(self._load_index()['metadata'], epoch=int(version))
+        return state, metadata
+
+    # ==================== 保留策略 ====================
+
+    def _remove_versions(self, versions):
+        index = self._load_index()
+        for v in versions:
+            entry = index['versions'].pop(str(v), None)
+            if entry is None:
+                continue
+            try:
+                os.remove(os.path.join(self.history_dir, entry['file']))
+            except OSError:
+                pass
+
+    def _apply_retention(self):
+        if self.keep_keyframes <= 0:
+            return
+        index = self._load_index()
+        keyframes = sorted(int(v) for v, e in index['versions'].items() if e['kind'] == 'key')
+        if len(keyframes) <= self.keep_keyframes:
+            return
+        cutoff = keyframes[-self.keep_keyframes]
+        expired = [int(v) for v in index['versions'] if int(v) < cutoff]
+        self._remove_versions(expired)
+        if self.logger:
+            self.logger.info(f"模型历史保留策略：删除 {len(expired)} 个早于版本 {cutoff} 的版本")
+
+    def truncate_after(self, version):
+        """删除 version 之后的所有版本（从检查点恢复后这些轮次会重新训练）"""
+        with self._lock:
+            later = [v for v in self.versions() if v > version]
+            if not later:
+                return
+            self._remove_versions(later)
+            self._last_version = None
+            self._last_state = None
+            self._save_index()
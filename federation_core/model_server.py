@@ -0,0 +1,410 @@
+# model_server.py
+"""
+进程内模型预测服务
+
+加载好的 eval 模式模型按 (task_id, version) 缓存在 LRU 中，并记录加载时模型文件的
+mtime；文件被重新发布后下一次请求会自动重新加载。缓存同时受模型个数和
+参数内存（MB）上限约束。Django 的预测视图与 model_predict 命令行共用这个服务。
+
+任务发布过推理产物（见 publish.py）且清单未过期时，最新版本加载清单选中的产物
+（准确度容差内最快的 TorchScript/int8 模型），否则加载规范模型。
+
+并发的单张预测可经 predict_batched（阻塞）或 submit_batched（返回 Future）交给按
+(task_id, version, dataset_type) 划分的微批处理器（见 micro_batcher），合并成批次推理。
+模型被 LRU 淘汰或移除时，对应的微批处理器随之停止并丢弃。
+
+前向由任务选择的推理后端执行（见 inference_backend）；缓存键包含后端。
+onnxruntime 后端优先使用发布时已评估的 ONNX 产物，没有时从加载的模型导出；
+onnxruntime 不可用或导出失败时回退到 PyTorch。
+"""
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import torch
+
+from device import device
+from inference_backend import DEFAULT_BACKEND, OnnxRuntimeBackend, TorchBackend, export_runtime_onnx
+from micro_batcher import MicroBatcher
+from model_artifacts import (find_model_file, find_task_dir, load_model_artifact, read_model_metadata,
+                             select_serving_artifact, serving_dir)
+from model_history import ModelHistory
+from models.registry import INPUT_SHAPES, create_model
+
+# CIFAR-10 类别标签
+CIFAR10_CLASSES = [
+    'airplane', 'automobile', 'bird', 'cat', 'deer',
+    'dog', 'frog', 'horse', 'ship', 'truck'
+]
+
+DEFAULT_MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'saved_models')
+
+
+def model_nbytes(model):
+    return sum(t.numel() * t.element_size() for t in list(model.parameters()) + list(model.buffers()))
+
+
+def format_prediction(probabilities, dataset_type='CIFAR10'):
+    """把单张图像的概率向量整理为预测结果字典"""
+    confidence, predicted = torch.max(probabilities, 0)
+    predicted_class = predicted.item()
+    if dataset_type == 'CIFAR10':
+        class_name = CIFAR10_CLASSES[predicted_class]
+    else:
+        class_name = str(predicted_class)
+    return {
+        'predicted_class': predicted_class,
+        'class_name': class_name,
+        'confidence': confidence.item(),
+        'all_probabilities': {i: prob for i, prob in enumerate(probabilities.tolist())}
+    }
+
+
+class LoadedModel:
+    def __init__(self, task_id, version, model, metadata, path, mtime, task_dir=None, artifact=None,
+                 model_device=device):
+        self.task_id = str(task_id)
+        self.version = version
+        self.model = model
+        self.task_dir = task_dir or os.path.dirname(path)
+        self.artifact = artifact['name'] if artifact else 'original'
+        self.device = model_device
+        self.architecture = metadata.get('architecture', 'r8')
+        self.dataset = metadata.get('dataset', 'CIFAR10')
+        self.epoch = metadata.get('epoch')
+        self.path = path
+        self.mtime = mtime
+        # 冻结的 TorchScript 模块把权重保存为常量，按文件大小估算；ONNX 产物没有 PyTorch 模型（model 为 None）
+        if model is None:
+            self.nbytes = 0
+            self.backend = None
+        else:
+            self.nbytes = max(model_nbytes(model), os.path.getsize(path) if artifact else 0)
+            self.backend = TorchBackend(model, model_device)
+
+    def set_backend(self, backend):
+        self.backend = backend
+        self.nbytes += backend.nbytes
+
+    @property
+    def cache_version(self):
+        """结果缓存使用的模型版本标识：文件被重新发布后随 mtime 改变，不同后端的输出分开缓存"""
+        return f'{self.epoch}@{self.mtime}:{self.backend.name}'
+
+    def to_dict(self):
+        return {
+            'task_id': self.task_id,
+            'version': self.version,
+            'architecture': self.architecture,
+            'dataset': self.dataset,
+            'epoch': self.epoch,
+            'artifact': self.artifact,
+            'backend': self.backend.name,
+            'path': self.path,
+            'size_mb': round(self.nbytes / 1024 / 1024, 2),
+        }
+
+
+class ModelServer:
+    def __init__(self, model_dir=None, max_models=8, max_memory_mb=512, intra_op_threads=2, logger=None,
+                 task_name_resolver=None):
+        """
+        task_name_resolver(task_id) 返回任务名称（未知时返回 None），用于按 "<task_id>_<task_name>"
+        精确定位模型目录；未提供时按任务ID匹配目录（见 find_task_dir）
+        """
+        self.model_dir = model_dir or DEFAULT_MODEL_DIR
+        self.task_name_resolver = task_name_resolver
+        self.max_models = max(1, int(max_models))
+        self.max_bytes = int(float(max_memory_mb) * 1024 * 1024)
+        self.intra_op_threads = int(intra_op_threads)
+        self.logger = logger
+
+        self._cache = OrderedDict()  # (task_id, version, backend) -> LoadedModel
+        self._batchers = {}  # (task_id, version, backend, dataset_type) -> MicroBatcher
+        self._load_locks = {}  # (task_id, version, backend) -> 正在加载时持有的锁
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def _log(self, message):
+        if self.logger:
+            self.logger.info(message)
+
+    # ==================== 加载 ====================
+
+    @staticmethod
+    def _key(task_id, version=None, backend=None):
+        return str(task_id), None if version is None else int(version), backend or DEFAULT_BACKEND
+
+    def _resolve(self, task_id, version=None, backend=DEFAULT_BACKEND):
+        """返回 (任务目录, 要加载的文件路径, mtime, 推理产物条目或 None)"""
+        task_name = self.task_name_resolver(task_id) if self.task_name_resolver else None
+        task_dir = find_task_dir(self.model_dir, task_id, task_name)
+        if task_dir is None:
+            raise FileNotFoundError(f"未找到任务 {task_id} 的模型目录")
+        artifact = None
+        if version is None:
+            path = find_model_file(task_dir)
+            if path is not None:
+                artifact = select_serving_artifact(task_dir, path, backend)
+        else:
+            path = ModelHistory(task_dir).version_file(int(version))
+        if path is None:
+            what = '模型文件' if version is None else f'模型版本 {version}'
+            raise FileNotFoundError(f"在目录 {task_dir} 中未找到{what}")
+        if artifact is not None:
+            return task_dir, artifact['path'], os.path.getmtime(artifact['path']), artifact
+        return task_dir, path, os.path.getmtime(path), None
+
+    def _load_artifact(self, task_id, task_dir, path, mtime, artifact):
+        """加载发布的推理产物（TorchScript 或蒸馏得到的学生模型权重，在 CPU 上运行）"""
+        metadata = read_model_metadata(find_model_file(task_dir))
+        if artifact['format'] == 'state_dict':
+            state_dict, _ = load_model_artifact(path, map_location='cpu')
+            model = create_model(artifact['architecture'], metadata.get('dataset', 'CIFAR10'), num_classes=10)
+            model.load_state_dict(state_dict)
+        else:
+            model = torch.jit.load(path, map_location='cpu')
+        model.eval()
+        return LoadedModel(task_id, None, model, metadata, path, mtime, task_dir=task_dir, artifact=artifact,
+                           model_device=torch.device('cpu'))
+
+    def _load_onnx_artifact(self, task_id, task_dir, path, mtime, artifact):
+        """直接由 onnxruntime 执行发布时导出并评估过的 ONNX 产物，不加载 PyTorch 模型"""
+        backend = OnnxRuntimeBackend(path, self.intra_op_threads)
+        metadata = read_model_metadata(find_model_file(task_dir))
+        loaded = LoadedModel(task_id, None, None, metadata, path, mtime, task_dir=task_dir, artifact=artifact,
+                             model_device=torch.device('cpu'))
+        loaded.set_backend(backend)
+        return loaded
+
+    def _load(self, task_id, version, backend, task_dir, path, mtime, artifact=None):
+        if artifact is not None and artifact['format'] == 'onnx':
+            try:
+                return self._load_onnx_artifact(task_id, task_dir, path, mtime, artifact)
+            except Exception as e:
+                # 与其他产物相同，缓存条目仍以产物文件的路径与 mtime 为准
+                self._log(f"加载 ONNX 推理产物 {artifact['name']} 失败，改为从规范模型导出: {e}")
+                loaded = self._load_model(task_id, version, task_dir, path, mtime,
+                                          source_path=find_model_file(task_dir))
+        else:
+            loaded = self._load_model(task_id, version, task_dir, path, mtime, artifact)
+        if backend == 'onnxruntime':
+            name = loaded.artifact if version is None else f'v{version}'
+            onnx_path = os.path.join(serving_dir(task_dir), f'runtime_{name}.onnx')
+            try:
+                export_runtime_onnx(loaded.model, INPUT_SHAPES[loaded.dataset], onnx_path, mtime)
+                loaded.set_backend(OnnxRuntimeBackend(onnx_path, self.intra_op_threads))
+            except Exception as e:
+                self._log(f"任务 {task_id} 的 onnxruntime 后端不可用，回退到 PyTorch: {e}")
+        return loaded
+
+    def _load_model(self, task_id, version, task_dir, path, mtime, artifact=None, source_path=None):
+        source_path = source_path or path
+        if artifact is not None:
+            try:
+                return self._load_artifact(task_id, task_dir, path, mtime, artifact)
+            except Exception as e:
+                # 缓存条目仍以产物文件的路径与 mtime 为准，产物不变时不会反复重试
+                self._log(f"加载推理产物 {artifact['name']} 失败，改用规范模型: {e}")
+                source_path = find_model_file(task_dir)
+
+        if version is None:
+            state_dict, metadata = load_model_artifact(source_path, map_location=device)
+        else:
+            state_dict, metadata = ModelHistory(task_dir).load(int(version))
+
+        # 旧模型文件没有记录结构，默认 ResNet8/CIFAR10
+        model = create_model(metadata.get('architecture', 'r8'), metadata.get('dataset', 'CIFAR10'), num_classes=10)
+        model.load_state_dict(state_dict)
+        model.to(device)
+        model.eval()
+        return LoadedModel(task_id, version, model, metadata, path, mtime, task_dir=task_dir)
+
+    def _evict_over_limit(self, keep_key):
+        total = sum(m.nbytes for m in self._cache.values())
+        while len(self._cache) > 1 and (len(self._cache) > self.max_models or total > self.max_bytes):
+            key = next(iter(self._cache))
+            if key == keep_key:
+                self._cache.move_to_end(key)
+                key = next(iter(self._cache))
+            evicted = self._cache.pop(key)
+            self._drop_batchers(lambda k: k == key)
+            total -= evicted.nbytes
+            self._log(f"模型缓存淘汰: 任务 {evicted.task_id} 版本 {evicted.version}")
+
+    def _drop_batchers(self, matches):
+        """停止并移除模型键 (task_id, version, backend) 满足 matches 的微批处理器（需持有 _lock）"""
+        for key in [k for k in self._batchers if matches(k[:3])]:
+            self._batchers.pop(key).stop()
+
+    def _install(self, key, loaded):
+        with self._lock:
+            self._cache[key] = loaded
+            self._cache.move_to_end(key)
+            self._evict_over_limit(key)
+        self._log(f"已加载任务 {key[0]} 的模型（版本 {key[1] or '最新'}，{loaded.architecture}，"
+                  f"{loaded.artifact}，{loaded.backend.name}）")
+
+    def get_model(self, task_id, version=None, backend=None):
+        """
+        返回缓存中的模型，不存在或文件已更新时重新加载。
+
+        加载在全局锁之外进行，其他模型的请求不受影响；同一模型正在重新加载时，
+        并发请求继续使用旧模型，加载完成后原子替换缓存条目。backend 为空时使用默认的 PyTorch 后端。
+        """
+        key = self._key(task_id, version, backend)
+        task_dir, path, mtime, artifact = self._resolve(*key)
+
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached.path == path and cached.mtime == mtime:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return cached
+            self.misses += 1
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        if cached is not None and not load_lock.acquire(blocking=False):
+            return cached
+        if cached is None:
+            load_lock.acquire()
+        try:
+            with self._lock:
+                current = self._cache.get(key)
+            if current is not None and current.path == path and current.mtime == mtime:
+                return current
+            loaded = self._load(key[0], key[1], key[2], task_dir, path, mtime, artifact)
+            self._install(key, loaded)
+            return loaded
+        finally:
+            load_lock.release()
+
+    def is_resident(self, task_id, version=None, backend=None):
+        with self._lock:
+            return self._key(task_id, version, backend) in self._cache
+
+    def preload(self, task_ids, backends=None):
+        """
+        预热加载一组任务的最新模型。按给定顺序加载，越靠后越晚被 LRU 淘汰，
+        因此调用方应把最重要的任务放在最后；超出个数或内存上限的模型不会常驻。
+        backends 为 {task_id: 推理后端}，未列出的任务使用默认后端。
+        """
+        backends = {str(k): v for k, v in (backends or {}).items()}
+        loaded = []
+        for task_id in task_ids:
+            backend = backends.get(str(task_id))
+            try:
+                self.get_model(task_id, backend=backend)
+                loaded.append((str(task_id), backend))
+            except Exception as e:
+                self._log(f"预热加载任务 {task_id} 的模型失败: {e}")
+        return [t for t, backend in loaded if self.is_resident(t, backend=backend)]
+
+    def refresh(self, task_dir=None):
+        """
+        重新检查常驻的最新模型，文件已被重新发布的立即重新加载（文件监听器调用）。
+        task_dir 为空时检查全部常驻模型。
+        """
+        task_dir = os.path.abspath(task_dir) if task_dir else None
+        with self._lock:
+            # 对应模型已不在缓存中的微批处理器（如加载失败后遗留的）一并停止
+            self._drop_batchers(lambda k: k not in self._cache)
+            keys = [k for k, m in self._cache.items()
+                    if k[1] is None and (task_dir is None or os.path.abspath(m.task_dir) == task_dir)]
+        for task_id, _, backend in keys:
+            try:
+                self.get_model(task_id, backend=backend)
+            except FileNotFoundError:
+                self.evict(task_id)
+            except Exception as e:
+                self._log(f"重新加载任务 {task_id} 的模型失败: {e}")
+
+    def evict(self, task_id):
+        """移除某个任务的全部缓存模型及其微批处理器"""
+        with self._lock:
+            for key in [k for k in self._cache if k[0] == str(task_id)]:
+                del self._cache[key]
+            self._drop_batchers(lambda k: k[0] == str(task_id))
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self._drop_batchers(lambda k: True)
+
+    # ==================== 预测 ====================
+
+    def predict_batch(self, task_id, images, dataset_type='CIFAR10', version=None, backend=None):
+        """对一个 [N, C, H, W] 批次预测，返回 N 个结果字典"""
+        loaded = self.get_model(task_id, version, backend)
+        with torch.inference_mode():
+            outputs = loaded.backend(images)
+            probabilities = torch.nn.functional.softmax(outputs, dim=1).cpu()
+        return [format_prediction(row, dataset_type) for row in probabilities]
+
+    def predict(self, task_id, image_tensor, dataset_type='CIFAR10', version=None, backend=None):
+        """单张图像预测，image_tensor 形状为 [C, H, W] 或 [1, C, H, W]"""
+        if image_tensor.dim() == 3:
+            image_tensor = image_tensor.unsqueeze(0)
+        return self.predict_batch(task_id, image_tensor, dataset_type, version, backend)[0]
+
+    def get_batcher(self, task_id, dataset_type='CIFAR10', version=None, max_batch_size=16, max_wait_ms=5,
+                    backend=None):
+        """返回（必要时创建）该模型、后端与数据集类型的微批处理器，并同步任务的批处理配置"""
+        key = self._key(task_id, version, backend) + (dataset_type,)
+        with self._lock:
+            batcher = self._batchers.get(key)
+            if batcher is None:
+                batcher = MicroBatcher(
+                    lambda images: self.predict_batch(key[0], images, dataset_type, key[1], key[2]),
+                    max_batch_size=max_batch_size, max_wait_ms=max_wait_ms,
+                    name=f'batcher-{key[0]}-{key[1] or "latest"}-{key[2]}-{dataset_type}')
+                self._batchers[key] = batcher
+            else:
+                batcher.configure(max_batch_size, max_wait_ms)
+        return batcher
+
+    def submit_batched(self, task_id, image_tensor, dataset_type='CIFAR10', version=None,
+                       max_batch_size=16, max_wait_ms=5, backend=None):
+        """
+        把单张图像交给微批处理器，立即返回结果的 Future（不等待批次凑满）；
+        max_batch_size <= 1 时在调用线程直接推理，返回已完成的 Future
+        """
+        if max_batch_size <= 1:
+            future = Future()
+            future.set_result(self.predict(task_id, image_tensor, dataset_type, version, backend))
+            return future
+        if image_tensor.dim() == 4:
+            image_tensor = image_tensor[0]
+        # 先在调用线程确认模型可用，加载失败直接报错而不是进入队列（也不会留下无模型的批处理器）
+        self.get_model(task_id, version, backend)
+        while True:
+            batcher = self.get_batcher(task_id, dataset_type, version, max_batch_size, max_wait_ms, backend)
+            try:
+                return batcher.submit(image_tensor)
+            except RuntimeError:
+                # 取到批处理器后模型恰好被淘汰，批处理器已停止：重新创建
+                if not batcher.stopped:
+                    raise
+
+    def predict_batched(self, task_id, image_tensor, dataset_type='CIFAR10', version=None,
+                        max_batch_size=16, max_wait_ms=5, timeout=None, backend=None):
+        """
+        经微批处理器预测单张图像，阻塞等待结果；max_batch_size <= 1 时直接推理
+        """
+        return self.submit_batched(task_id, image_tensor, dataset_type, version, max_batch_size, max_wait_ms,
+                                   backend).result(timeout=timeout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'models': [m.to_dict() for m in self._cache.values()],
+                'batchers': {f'{k[0]}:{k[1] or "latest"}:{k[2]}:{k[3]}': b.stats()
+                             for k, b in self._batchers.items()},
+                'memory_mb': round(sum(m.nbytes for m in self._cache.values()) / 1024 / 1024, 2),
+                'max_models': self.max_models,
+                'max_memory_mb': round(self.max_bytes / 1024 / 1024, 2),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
@@ -0,0 +1,110 @@
+# model_watcher.py
+"""
+发布模型文件监听
+
+模型文件（global_model.safetensors / global_model.pth）或推理产物清单（serving/manifest.json）
+被重写后，通知预测服务重新加载常驻的该任务模型；同一目录的连续事件在 debounce 秒内合并为一次重新加载。
+未安装 watchdog 时退回按 poll_interval 秒轮询常驻模型的 mtime。
+"""
+import os
+import threading
+
+from model_artifacts import LEGACY_MODEL_FILENAME, MANIFEST_FILENAME, MODEL_FILENAME, SERVING_DIRNAME
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+    HAS_WATCHDOG = True
+except ImportError:
+    FileSystemEventHandler = object
+    HAS_WATCHDOG = False
+
+WATCHED_FILENAMES = (MODEL_FILENAME, LEGACY_MODEL_FILENAME)
+
+
+class _ModelFileHandler(FileSystemEventHandler):
+    def __init__(self, watcher):
+        super().__init__()
+        self.watcher = watcher
+
+    def _handle(self, path):
+        name = os.path.basename(path)
+        if name in WATCHED_FILENAMES:
+            self.watcher.schedule(os.path.dirname(path))
+        elif name == MANIFEST_FILENAME and os.path.basename(os.path.dirname(path)) == SERVING_DIRNAME:
+            self.watcher.schedule(os.path.dirname(os.path.dirname(path)))
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self._handle(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self._handle(event.src_path)
+
+    def on_moved(self, event):
+        # 原子写入是 "写临时文件 + 重命名"，目标文件名出现在 dest_path
+        if not event.is_directory:
+            self._handle(event.dest_path)
+
+
+class ModelWatcher:
+    def __init__(self, server, debounce=1.0, poll_interval=5.0, logger=None):
+        self.server = server
+        self.debounce = float(debounce)
+        self.poll_interval = float(poll_interval)
+        self.logger = logger
+
+        self._timers = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._observer = None
+        self._poller = None
+
+    def _log(self, message):
+        if self.logger:
+            self.logger.info(message)
+
+    def schedule(self, task_dir):
+        """在 debounce 秒后重新加载该目录的常驻模型（期间的重复事件合并）"""
+        with self._lock:
+            timer = self._timers.pop(task_dir, None)
+            if timer is not None:
+                timer.cancel()
+            timer = threading.Timer(self.debounce, self._reload, args=(task_dir,))
+            timer.daemon = True
+            self._timers[task_dir] = timer
+            timer.start()
+
+    def _reload(self, task_dir):
+        with self._lock:
+            self._timers.pop(task_dir, None)
+        self._log(f"检测到模型文件更新: {task_dir}")
+        self.server.refresh(task_dir)
+
+    def _poll_loop(self):
+        while not self._stop.wait(self.poll_interval):
+            self.server.refresh()
+
+    def start(self):
+        os.makedirs(self.server.model_dir, exist_ok=True)
+        if HAS_WATCHDOG:
+            self._observer = Observer()
+            self._observer.schedule(_ModelFileHandler(self), self.server.model_dir, recursive=True)
+            self._observer.daemon = True
+            self._observer.start()
+            self._log(f"模型文件监听已启动: {self.server.model_dir}")
+        else:
+            self._poller = threading.Thread(target=self._poll_loop, name='model-watcher', daemon=True)
+            self._poller.start()
+            self._log(f"未安装 watchdog，按 {self.poll_interval} 秒轮询模型文件")
+
+    def stop(self):
+        self._stop.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join(timeout=5)
+        with self._lock:
+            for timer in self._timers.values():
+                timer.cancel()
+            self._timers.clear()
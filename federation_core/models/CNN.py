@@ -0,0 +1,56 @@
+'''轻量 CNN：MNIST（单通道 28x28）与 CIFAR10（三通道 32x32）'''
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+
+class CNNMnist(nn.Module):
+    """两层卷积 + 两层全连接，width 控制第一层卷积通道数"""
+
+    def __init__(self, num_classes=10, width=32):
+        super(CNNMnist, self).__init__()
+        self.conv1 = nn.Conv2d(1, width, kernel_size=5, padding=2)
+        self.conv2 = nn.Conv2d(width, width * 2, kernel_size=5, padding=2)
+        self.fc1 = nn.Linear(width * 2 * 7 * 7, 128)
+        self.fc2 = nn.Linear(128, num_classes)
+
+    def forward(self, x):
+        out = F.max_pool2d(F.relu(self.conv1(x)), 2)
+        out = F.max_pool2d(F.relu(self.conv2(out)), 2)
+        out = torch.flatten(out, 1)
+        out = F.relu(self.fc1(out))
+        out = self.fc2(out)
+        return out
+
+
+class CNNCifar10(nn.Module):
+    """三层卷积（每层后 BN + 池化）+ 两层全连接"""
+
+    def __init__(self, num_classes=10, width=32):
+        super(CNNCifar10, self).__init__()
+        self.conv1 = nn.Conv2d(3, width, kernel_size=3, padding=1, bias=False)
+        self.bn1 = nn.BatchNorm2d(width)
+        self.conv2 = nn.Conv2d(width, width * 2, kernel_size=3, padding=1, bias=False)
+        self.bn2 = nn.BatchNorm2d(width * 2)
+        self.conv3 = nn.Conv2d(width * 2, width * 4, kernel_size=3, padding=1, bias=False)
+        self.bn3 = nn.BatchNorm2d(width * 4)
+        self.fc1 = nn.Linear(width * 4 * 4 * 4, 256)
+        self.fc2 = nn.Linear(256, num_classes)
+
+    def forward(self, x):
+        out = F.max_pool2d(F.relu(self.bn1(self.conv1(x))), 2)
+        out = F.max_pool2d(F.relu(self.bn2(self.conv2(out))), 2)
+        out = F.max_pool2d(F.relu(self.bn3(self.conv3(out))), 2)
+        out = torch.flatten(out, 1)
+        out = F.relu(self.fc1(out))
+        out = self.fc2(out)
+        return out
+
+
+def CNNMnistSmall(num_classes=10):
+    return CNNMnist(num_classes, width=8)
+
+
+if __name__ == '__main__':
+    model = CNNMnist()
+    print(model)
@@ -37,17 +37,17 @@ class BasicBlock(nn.Module):
 
 
 class ResNet(nn.Module):
-    def __init__(self, block, num_blocks, num_classes=10):
+    def __init__(self, block, num_blocks, num_classes=10, width=128, in_channels=3):
         super(ResNet, self).__init__()
-        self.in_planes = 128
+        self.in_planes = width
 
-        self.conv1 = nn.Conv2d(3, 128, kernel_size=3, stride=1, padding=1, bias=False)
-        self.bn1 = nn.BatchNorm2d(128)
-        self.layer1 = self._make_layer(block, 128, num_blocks[0], stride=1)
-        self.layer2 = self._make_layer(block, 256, num_blocks[1], stride=2)
-        self.layer3 = self._make_layer(block, 512, num_blocks[2], stride=2)
+        self.conv1 = nn.Conv2d(in_channels, width, kernel_size=3, stride=1, padding=1, bias=False)
+        self.bn1 = nn.BatchNorm2d(width)
+        self.layer1 = self._make_layer(block, width, num_blocks[0], stride=1)
+        self.layer2 = self._make_layer(block, width * 2, num_blocks[1], stride=2)
+        self.layer3 = self._make_layer(block, width * 4, num_blocks[2], stride=2)
         self.avgpool = nn.AdaptiveAvgPool2d((1, 1))
-        self.linear1 = nn.Linear(512 * block.expansion, num_classes)
+        self.linear1 = nn.Linear(width * 4 * block.expansion, num_classes)
 
     def _make_layer(self, block, planes, num_blocks, stride):
         strides = [stride] + [1] * (num_blocks - 1)
@@ -69,8 +69,10 @@ class ResNet(nn.Module):
         return out
 
 
-def ResNet8(num_classes=10):
-    return ResNet(BasicBlock, [1, 1, 1], num_classes)
+def ResNet8(num_classes=10, width_mult=1.0, in_channels=3):
+    """width_mult 按比例缩放各层通道数（默认 128/256/512）"""
+    width = max(8, int(128 * width_mult))
+    return ResNet(BasicBlock, [1, 1, 1], num_classes, width=width, in_channels=in_channels)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,166 @@
+# models/registry.py
+"""
+模型注册表：按 (模型名, 数据集) 登记模型构造函数。
+
+登记时只记录模块路径和函数名，构建模型时才导入对应模块。
+参数量与 FLOPs（单样本，乘加计 2 次）随登记一并记录，任务创建页通过
+/api/models/registry/ 列出，供任务创建者按成本选择模型；未提供统计的登记
+在首次查询时实例化一次 CPU 模型统计并缓存。修改内置模型结构后用
+    python -c "from models.registry import *; print(count_params_and_flops(create_model('r8', 'CIFAR10'), (3, 32, 32)))"
+重新统计并更新下方登记。
+"""
+import importlib
+import threading
+
+INPUT_SHAPES = {
+    'CIFAR10': (3, 32, 32),
+    'MNIST': (1, 28, 28),
+}
+
+_REGISTRY = {}
+_stats_lock = threading.Lock()
+
+
+class ModelSpec:
+    def __init__(self, name, dataset, module, factory, description='', kwargs=None, params=None, flops=None):
+        self.name = name
+        self.dataset = dataset
+        self.module = module
+        self.factory = factory
+        self.description = description
+        self.kwargs = kwargs or {}
+        self._params = params
+        self._flops = flops
+
+    def build(self, num_classes=10):
+        factory = getattr(importlib.import_module(self.module), self.factory)
+        return factory(num_classes=num_classes, **self.kwargs)
+
+    def _compute_stats(self):
+        with _stats_lock:
+            if self._params is None:
+                self._params, self._flops = count_params_and_flops(self.build(), INPUT_SHAPES[self.dataset])
+
+    @property
+    def params(self):
+        if self._params is None:
+            self._compute_stats()
+        return self._params
+
+    @property
+    def flops(self):
+        if self._flops is None:
+            self._compute_stats()
+        return self._flops
+
+    def cached_stats(self):
+        """返回已记录的 (参数量, FLOPs)，尚未统计时为 (None, None)，不会构建模型"""
+        return self._params, self._flops
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'dataset': self.dataset,
+            'description': self.description,
+            'params': self.params,
+            'flops': self.flops,
+        }
+
+
+def register_model(name, dataset, module, factory, description='', params=None, flops=None, **kwargs):
+    """
+    登记一个模型构造函数；同名同数据集的重复登记会覆盖旧条目
+
+    params / flops 为该数据集输入下的参数量与单样本 FLOPs，省略时首次查询再统计
+    """
+    _REGISTRY[(name, dataset)] = ModelSpec(name, dataset, module, factory, description, kwargs, params, flops)
+
+
+def get_model_spec(name, dataset):
+    spec = _REGISTRY.get((name, dataset))
+    if spec is None:
+        raise ValueError(f"不支持的模型: {name} (数据集: {dataset})")
+    return spec
+
+
+def create_model(name, dataset, num_classes=10):
+    """根据模型名和数据集构建模型实例"""
+    return get_model_spec(name, dataset).build(num_classes)
+
+
+def list_models(dataset=None):
+    """列出已登记的模型（可按数据集过滤），包含参数量和 FLOPs"""
+    return [spec.to_dict() for (name, ds), spec in _REGISTRY.items() if dataset is None or ds == dataset]
+
+
+def count_params_and_flops(model, input_shape):
+    """
+    统计参数量和单样本前向 FLOPs（按乘加计 2 次浮点运算，只统计卷积和全连接层）
+    """
+    import torch
+    import torch.nn as nn
+
+    flops = [0]
+
+    def conv_hook(module, inputs, output):
+        kernel_ops = module.kernel_size[0] * module.kernel_size[1] * (module.in_channels // module.groups)
+        flops[0] += 2 * kernel_ops * output.numel()
+
+    def linear_hook(module, inputs, output):
+        flops[0] += 2 * module.in_features * output.numel()
+
+    hooks = []
+    for m in model.modules():
+        if isinstance(m, nn.Conv2d):
+            hooks.append(m.register_forward_hook(conv_hook))
+        elif isinstance(m, nn.Linear):
+            hooks.append(m.register_forward_hook(linear_hook))
+
+    model.eval()
+    with torch.no_grad():
+        model(torch.zeros(1, *input_shape))
+    for h in hooks:
+        h.remove()
+
+    params = sum(p.numel() for p in model.parameters())
+    return params, flops[0]
+
+
+# ==================== 模型登记 ====================
+
+register_model('CNN', 'MNIST', 'models.CNN', 'CNNMnist', '两层卷积 CNN',
+               params=454922, flops=22130176)
+register_model('CNN', 'CIFAR10', 'models.CNN', 'CNNCifar10', '三层卷积 CNN',
+               params=620586, flops=21697536)
+register_model('cnn_small', 'MNIST', 'models.CNN', 'CNNMnistSmall', '窄版 MNIST CNN，适合 CPU',
+               params=105194, flops=1771264)
+
+# (数据集, 输入通道, {模型名: (参数量, FLOPs)})
+_RESNET_STATS = (
+    ('CIFAR10', 3, {
+        'r8': (4896394, 1550592000),
+        'r8_half': (1227594, 389420032),
+        'r8_slim': (308650, 98241024),
+        'r18': (11173962, 1110845440),
+        'r34': (21282122, 2318804992),
+    }),
+    ('MNIST', 1, {
+        'r8': (4894090, 1183561728),
+        'r8_half': (1226442, 296344576),
+        'r8_slim': (308074, 74313216),
+        'r18': (11172810, 911601664),
+        'r34': (21280970, 1871835136),
+    }),
+)
+
+for _dataset, _channels, _stats in _RESNET_STATS:
+    register_model('r8', _dataset, 'models.ResNet8', 'ResNet8', 'ResNet8（128/256/512 通道）',
+                   *_stats['r8'], in_channels=_channels)
+    register_model('r8_half', _dataset, 'models.ResNet8', 'ResNet8', 'ResNet8 0.5 倍宽度',
+                   *_stats['r8_half'], width_mult=0.5, in_channels=_channels)
+    register_model('r8_slim', _dataset, 'models.ResNet8', 'ResNet8', 'ResNet8 0.25 倍宽度，适合 CPU',
+                   *_stats['r8_slim'], width_mult=0.25, in_channels=_channels)
+    register_model('r18', _dataset, 'models.ResNet', 'ResNet18', 'ResNet18',
+                   *_stats['r18'], in_channels=_channels)
+    register_model('r34', _dataset, 'models.ResNet', 'ResNet34', 'ResNet34',
+                   *_stats['r34'], in_channels=_channels)
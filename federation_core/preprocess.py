@@ -0,0 +1,92 @@
+# preprocess.py
+"""
+预测输入图像的预处理，与 model_predict 命令行和进程内预测服务共用
+
+图像直接从内存中的上传数据解码，不落盘。大图在解码阶段就降采样：JPEG 使用 draft 模式
+让解码器按 1/2、1/4、1/8 缩放输出，其他格式用 Image.reduce 整数倍缩小，
+之后才做精确的 Resize。每种数据集的预处理流程只构建一次。
+"""
+import io
+import threading
+
+import torchvision.transforms as transforms
+from PIL import Image
+
+INPUT_SIZES = {
+    'CIFAR10': (32, 32),
+    'MNIST': (28, 28),
+}
+
+# 各 Pillow 版本的 Image.reduce 都支持的模式；其他模式（P、1、I;16 等）先转为 RGB 再降采样
+REDUCE_MODES = ('RGB', 'RGBA', 'L', 'LA')
+
+_transforms = {}
+_transforms_lock = threading.Lock()
+
+
+def build_transform(dataset_type):
+    """构建数据集对应的预处理流程"""
+    if dataset_type == 'CIFAR10':
+        # CIFAR-10 预处理：32x32，标准化
+        return transforms.Compose([
+            transforms.Resize((32, 32)),  # 调整大小到32x32
+            transforms.CenterCrop((32, 32)),  # 中心裁剪确保32x32
+            transforms.ToTensor(),
+            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
+        ])
+    if dataset_type == 'MNIST':
+        # MNIST 预处理：28x28，灰度，标准化
+        return transforms.Compose([
+            transforms.Resize((28, 28)),
+            transforms.CenterCrop((28, 28)),
+            transforms.Grayscale(num_output_channels=1),  # 转换为单通道
+            transforms.ToTensor(),
+            transforms.Normalize((0.1307,), (0.3081,))
+        ])
+    raise ValueError(f"不支持的dataset_type: {dataset_type}")
+
+
+def get_transform(dataset_type):
+    """返回缓存的预处理流程（每种数据集只构建一次）"""
+    transform = _transforms.get(dataset_type)
+    if transform is None:
+        with _transforms_lock:
+            transform = _transforms.get(dataset_type)
+            if transform is None:
+                transform = build_transform(dataset_type)
+                _transforms[dataset_type] = transform
+    return transform
+
+
+def decode_image(source, dataset_type='CIFAR10'):
+    """
+    解码图像并在解码阶段尽量降采样（保留至少 2 倍目标尺寸，供 Resize 抗锯齿）
+
+    Args:
+        source: 图像字节、文件对象或文件路径
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    image = Image.open(source)
+
+    target_w, target_h = INPUT_SIZES.get(dataset_type, (32, 32))
+    min_size = (target_w * 2, target_h * 2)
+    if image.format == 'JPEG':
+        image.draft('RGB', min_size)
+    else:
+        factor = min(image.width // min_size[0], image.height // min_size[1])
+        if factor >= 2:
+            if image.mode not in REDUCE_MODES:
+                image = image.convert('RGB')
+            image = image.reduce(factor)
+    return image.convert('RGB')
+
+
+def preprocess_bytes(data, dataset_type='CIFAR10'):
+    """从内存中的图像数据解码并预处理，返回 [C, H, W] 的 CPU 张量"""
+    return get_transform(dataset_type)(decode_image(data, dataset_type))
+
+
+def preprocess_image(image_path, dataset_type='CIFAR10'):
+    """读取图像文件并预处理，返回 [1, C, H, W] 的 CPU 张量"""
+    return get_transform(dataset_type)(decode_image(image_path, dataset_type)).unsqueeze(0)
@@ -0,0 +1,250 @@
+# publish.py
+"""
+任务完成时的推理优化发布
+
+在最终全局模型（规范模型，贡献度与股份都以它为准）之外，生成面向预测服务的推理产物：
+    1. BN 折叠进卷积（torch.fx 融合），导出 TorchScript（冻结）和/或 ONNX
+    2. 可选 int8 静态量化：用缓存测试集的前若干样本做校准（卷积与全连接层都量化）
+    3. 可选知识蒸馏（见 distill.py）：学生模型同样经过上述优化，容差由 distill_accuracy_tolerance 单独配置
+每个产物在缓存的测试张量上评估准确度并测量单张延迟（ONNX 产物由 ONNX Runtime 执行），
+写入 <task_dir>/serving/manifest.json。预测服务在准确度下降不超过容差（百分点）的产物中选择
+最快的一个：PyTorch 后端从 PyTorch/TorchScript 产物中选（selected），onnxruntime 后端从
+ONNX 产物中选（selected_onnx）。
+"""
+import copy
+import json
+import logging
+import os
+import time
+
+import torch
+
+from distill import distill_student, split_transfer_set
+from inference_backend import OnnxRuntimeBackend
+from model_artifacts import MANIFEST_FILENAME, read_model_metadata, save_model_artifact, serving_dir
+from test import evaluate_tensors
+
+logger = logging.getLogger("logger")
+
+
+# ==================== 优化步骤 ====================
+
+def fold_batchnorm(model, log=None):
+    """把 eval 模式下的 Conv-BN 折叠为单个卷积；无法符号追踪的模型记录警告后原样返回"""
+    try:
+        from torch.fx.experimental.optimization import fuse
+        return fuse(copy.deepcopy(model).eval())
+    except Exception as e:
+        (log or logger).warning(f"BN 折叠失败，使用未折叠的模型 {type(model).__name__}: {e}")
+        return copy.deepcopy(model).eval()
+
+
+def _quantized_engine():
+    engines = torch.backends.quantized.supported_engines
+    for engine in ('x86', 'fbgemm', 'qnnpack'):
+        if engine in engines:
+            return engine
+    return None
+
+
+def quantize_static(model, calibration_images, batch_size=128):
+    """FX 图模式静态量化，用校准样本统计激活范围"""
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    engine = _quantized_engine()
+    if engine is None:
+        raise RuntimeError("当前 PyTorch 不支持量化后端")
+    torch.backends.quantized.engine = engine
+
+    example = (calibration_images[:1],)
+    prepared = prepare_fx(copy.deepcopy(model).eval(), get_default_qconfig_mapping(engine), example)
+    with torch.inference_mode():
+        for start in range(0, calibration_images.size(0), batch_size):
+            prepared(calibration_images[start:start + batch_size])
+    return convert_fx(prepared)
+
+
+def export_torchscript(model, example, path):
+    with torch.no_grad():
+        scripted = torch.jit.freeze(torch.jit.trace(model.eval(), example))
+    tmp_path = f'{path}.tmp'
+    torch.jit.save(scripted, tmp_path)
+    os.replace(tmp_path, path)
+    return scripted
+
+
+def export_onnx(model, example, path):
+    tmp_path = f'{path}.tmp'
+    torch.onnx.export(model.eval(), example, tmp_path, input_names=['input'], output_names=['output'],
+                      dynamic_axes={'input': {0: 'batch'}, 'output': {0: 'batch'}}, opset_version=17)
+    os.replace(tmp_path, path)
+
+
+# ==================== 评估 ====================
+
+def measure_latency(model, example, repeats=30):
+    """单张输入的中位延迟（毫秒）"""
+    with torch.inference_mode():
+        for _ in range(5):
+            model(example)
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            model(example)
+            timings.append((time.perf_counter() - start) * 1000.0)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def measure_accuracy(model, images, labels, batch_size):
+    _, correct = evaluate_tensors(model, images, labels, batch_size)
+    return 100.0 * correct.item() / labels.size(0)
+
+
+# ==================== 发布 ====================
+
+def publish_serving_artifacts(handle, model_path):
+    """
+    为规范模型生成推理产物并写出清单，返回清单字典
+
+    Args:
+        model_path: 已保存的规范模型文件（清单据此判断是否过期）
+    """
+    params = handle.params
+    logger = handle.logger
+    out_dir = serving_dir(handle.folder_path)
+    os.makedirs(out_dir, exist_ok=True)
+
+    tolerance = float(params.get('publish_accuracy_tolerance', 1.0))
+    export = params.get('publish_export', 'torchscript')
+    quantize = params.get('publish_quantize', 'static')
+    if quantize == 'dynamic':
+        # PyTorch 的动态量化只支持全连接/循环层，对卷积网络几乎没有加速，统一使用静态量化
+        logger.warning("publish_quantize: dynamic 已不再支持，改用 static")
+        quantize = 'static'
+    batch_size = int(params.get('eval_batch_size', 1024))
+
+    student_arch = params.get('distill_student')
+    student_tolerance = float(params.get('distill_accuracy_tolerance', 2.0))
+
+    # 推理产物面向 CPU 服务，统一在 CPU 上评估；蒸馏时只在留出部分上评估
+    all_images, all_labels = handle.get_test_tensors()
+    transfer_set = None
+    if student_arch:
+        transfer_set, (images, labels) = split_transfer_set(all_images, all_labels,
+                                                            float(params.get('distill_holdout', 0.2)))
+    else:
+        images, labels = all_images, all_labels
+    images, labels = images.cpu(), labels.cpu()
+    calibration = all_images[:int(params.get('publish_calibration_size', 512))].cpu()
+    example = images[:1]
+
+    teacher = copy.deepcopy(handle.model).cpu().eval()
+    baseline = measure_accuracy(teacher, images, labels, batch_size)
+    artifacts = [{
+        'name': 'original', 'file': None, 'format': 'pytorch', 'precision': 'fp32',
+        'accuracy': baseline, 'accuracy_delta': 0.0, 'tolerance': tolerance,
+        'latency_ms': measure_latency(teacher, example)
+    }]
+
+    def add_artifact(name, model, precision, artifact_tolerance=tolerance):
+        try:
+            if export in ('torchscript', 'both'):
+                file_name = f'{name}.pt'
+                served = export_torchscript(model, example, os.path.join(out_dir, file_name))
+                accuracy = measure_accuracy(served, images, labels, batch_size)
+                artifacts.append({
+                    'name': name, 'file': file_name, 'format': 'torchscript', 'precision': precision,
+                    'accuracy': accuracy, 'accuracy_delta': accuracy - baseline, 'tolerance': artifact_tolerance,
+                    'latency_ms': measure_latency(served, example)
+                })
+            if export in ('onnx', 'both') and precision == 'fp32':
+                file_name = f'{name}.onnx'
+                onnx_path = os.path.join(out_dir, file_name)
+                export_onnx(model, example, onnx_path)
+                # 用 onnxruntime 推理后端评估，与预测服务执行方式一致
+                served = OnnxRuntimeBackend(onnx_path)
+                accuracy = measure_accuracy(served, images, labels, batch_size)
+                artifacts.append({
+                    'name': f'{name}_onnx', 'file': file_name, 'format': 'onnx', 'precision': precision,
+                    'accuracy': accuracy, 'accuracy_delta': accuracy - baseline, 'tolerance': artifact_tolerance,
+                    'latency_ms': measure_latency(served, example)
+                })
+        except Exception as e:
+            logger.warning(f"生成推理产物 {name} 失败: {e}")
+
+    def add_optimized(prefix, model, artifact_tolerance):
+        folded = fold_batchnorm(model, logger)
+        add_artifact(f'{prefix}fp32_folded', folded, 'fp32', artifact_tolerance)
+
+        if quantize == 'static':
+            try:
+                quantized = quantize_static(folded, calibration)
+                add_artifact(f'{prefix}int8_{quantize}', quantized, 'int8', artifact_tolerance)
+            except Exception as e:
+                logger.warning(f"int8 量化失败，跳过: {e}")
+
+    add_optimized('', teacher, tolerance)
+
+    student_info = None
+    if student_arch:
+        try:
+            student = distill_student(handle, teacher, *transfer_set)
+            student_accuracy = measure_accuracy(student, images, labels, batch_size)
+            # 元数据沿用规范模型的 epoch/任务信息，只替换结构
+            metadata = dict(read_model_metadata(model_path), architecture=student_arch)
+            student_path = save_model_artifact(student.state_dict(), metadata, out_dir,
+                                               filename='student.safetensors')
+            artifacts.append({
+                'name': 'student', 'file': os.path.basename(student_path), 'format': 'state_dict',
+                'precision': 'fp32',
+                'architecture': student_arch, 'accuracy': student_accuracy,
+                'accuracy_delta': student_accuracy - baseline, 'tolerance': student_tolerance,
+                'latency_ms': measure_latency(student, example)
+            })
+            student_info = {'architecture': student_arch, 'accuracy': student_accuracy,
+                            'accuracy_delta': student_accuracy - baseline, 'tolerance': student_tolerance}
+            logger.info(f"知识蒸馏完成: 教师 {params['model']} {baseline:.2f}%, 学生 {student_arch} "
+                        f"{student_accuracy:.2f}%（留出集）")
+            add_optimized('student_', student, student_tolerance)
+        except Exception as e:
+            logger.warning(f"知识蒸馏失败，跳过: {e}")
+
+    def within_tolerance(a):
+        return a['accuracy_delta'] is not None and a['accuracy_delta'] >= -a['tolerance']
+
+    eligible = [a for a in artifacts
+                if a['format'] in ('pytorch', 'torchscript', 'state_dict') and within_tolerance(a)]
+    selected = min(eligible, key=lambda a: a['latency_ms'])
+    eligible_onnx = [a for a in artifacts if a['format'] == 'onnx' and within_tolerance(a)]
+    selected_onnx = min(eligible_onnx, key=lambda a: a['latency_ms']) if eligible_onnx else None
+
+    manifest = {
+        'source_file': os.path.basename(model_path),
+        'source_mtime': os.path.getmtime(model_path),
+        'architecture': params['model'],
+        'dataset': params['type'],
+        'baseline_accuracy': baseline,
+        'teacher': {'architecture': params['model'], 'accuracy': baseline},
+        'student': student_info,
+        'tolerance': tolerance,
+        'artifacts': artifacts,
+        'selected': selected['name'],
+        'selected_onnx': selected_onnx['name'] if selected_onnx else None,
+        'published_at': time.time(),
+    }
+    manifest_path = os.path.join(out_dir, MANIFEST_FILENAME)
+    tmp_path = f'{manifest_path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+    for a in artifacts:
+        if a['accuracy'] is not None:
+            logger.info(f"推理产物 {a['name']}: 准确度 {a['accuracy']:.2f}% (Δ {a['accuracy_delta']:+.2f}), "
+                        f"单张延迟 {a['latency_ms']:.3f} ms")
+    logger.info(f"预测服务将使用推理产物: {selected['name']}（容差 {tolerance} 个百分点）")
+    if selected_onnx:
+        logger.info(f"onnxruntime 推理后端将使用推理产物: {selected_onnx['name']}")
+    return manifest
@@ -0,0 +1,58 @@
+# result_cache.py
+"""
+预测结果缓存
+
+以 (task_id, 模型版本, dataset_type, 输入内容哈希) 为键缓存预测结果，容量有上限（LRU），
+条目超过 TTL 后失效。模型版本取自加载的模型文件（轮次 + mtime），模型重新发布后
+旧结果自然不再命中。
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+def content_hash(data):
+    """输入数据的 blake2b 哈希（64 位十六进制，与 ModelUsageRecord.input_data_hash 长度一致）"""
+    return hashlib.blake2b(data, digest_size=32).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, max_entries=10000, ttl_seconds=3600):
+        self.max_entries = max(0, int(max_entries))
+        self.ttl = float(ttl_seconds) if ttl_seconds else None
+        self._entries = OrderedDict()  # key -> (过期时间, 结果)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[0] is None or entry[0] > time.monotonic()):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, result):
+        if self.max_entries == 0:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (expires, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'max_entries': self.max_entries, 'ttl_seconds': self.ttl,
+                    'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,114 @@
+# scheduler.py
+"""
+事件驱动的轮次调度器
+
+用条件变量代替轮询和固定休眠：成员变化、暂停/恢复、停止请求都会立即唤醒等待方；
+满足法定人数时各轮背靠背执行，如需限速由 round_min_interval 显式配置。
+"""
+import threading
+import time
+
+
+class RoundScheduler:
+    def __init__(self, min_clients=2, min_round_interval=0.0):
+        self.min_clients = min_clients
+        self.min_round_interval = float(min_round_interval or 0)
+
+        self._cond = threading.Condition()
+        self._generation = 0  # 每次状态变化递增，用于避免丢失唤醒
+        self._stopped = False
+        self._paused = False
+        self._member_count = lambda: 0
+        self._last_round_start = None
+        self._listeners = []
+
+    def bind_member_count(self, fn):
+        """设置获取当前成员数的函数"""
+        self._member_count = fn
+
+    def add_listener(self, fn):
+        """注册状态变化回调（在锁外调用）"""
+        self._listeners.append(fn)
+
+    def remove_listener(self, fn):
+        if fn in self._listeners:
+            self._listeners.remove(fn)
+
+    def _changed(self):
+        with self._cond:
+            self._generation += 1
+            self._cond.notify_all()
+        for fn in list(self._listeners):
+            try:
+                fn()
+            except Exception:
+                pass
+
+    # ==================== 事件 ====================
+
+    def notify_membership_changed(self):
+        self._changed()
+
+    def pause(self):
+        self._paused = True
+        self._changed()
+
+    def resume(self):
+        self._paused = False
+        self._changed()
+
+    def start(self):
+        self._stopped = False
+        self._changed()
+
+    def stop(self):
+        self._stopped = True
+        self._changed()
+
+    # ==================== 查询与等待 ====================
+
+    @property
+    def stopped(self):
+        return self._stopped
+
+    @property
+    def paused(self):
+        return self._paused
+
+    def has_quorum(self):
+        return self._member_count() >= self.min_clients
+
+    def runnable(self):
+        return not self._stopped and not self._paused and self.has_quorum()
+
+    def poll(self):
+        """返回 (是否可运行, 当前代号)，配合 wait_for_change 使用"""
+        with self._cond:
+            return self.runnable(), self._generation
+
+    def wait_for_change(self, generation, timeout=None):
+        """阻塞直到状态在 generation 之后发生变化、被停止或超时"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._stopped or self._generation != generation, timeout)
+
+    def wait_stopped(self, timeout=None):
+        with self._cond:
+            return self._cond.wait_for(lambda: self._stopped, timeout)
+
+    def pace(self):
+        """
+        显式限速：距上一轮开始不足 round_min_interval 秒时等待（可被停止/暂停打断）。
+        返回 False 表示等待期间调度器已不可运行。
+        """
+        now = time.monotonic()
+        if self._last_round_start is not None and self.min_round_interval > 0:
+            deadline = self._last_round_start + self.min_round_interval
+            with self._cond:
+                while self.runnable():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            now = time.monotonic()
+        self._last_round_start = now
+        return self.runnable()
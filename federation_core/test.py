@@ -4,11 +4,75 @@ import torch.nn.functional as F
 from device import device
 # 移除全局logger定义，使用handle传入的logger
 
+
+def evaluate_tensors(model, images, labels, batch_size):
+    """
+    在已缓存的测试张量上评估模型，损失与正确数在张量上累加，最后只同步一次
+
+    Returns:
+        (loss_sum, correct): 两个张量
+    """
+    model.eval()
+    loss_sum = torch.zeros((), device=images.device)
+    correct = torch.zeros((), device=images.device, dtype=torch.long)
+
+    with torch.inference_mode():
+        for start in range(0, labels.size(0), batch_size):
+            data = images[start:start + batch_size]
+            target = labels[start:start + batch_size]
+            log_probs = model(data)
+            loss_sum += F.cross_entropy(log_probs, target, reduction='sum')
+            correct += log_probs.argmax(dim=1).eq(target).sum()
+
+    return loss_sum, correct
+
+
+def _select_eval_range(epoch, params, total):
+    """
+    确定本轮评估的样本区间：配置了 eval_subset_size 时每轮评估一个轮换子集，
+    每 eval_full_every 轮以及最后一轮评估完整测试集
+    """
+    subset_size = int(params.get('eval_subset_size', 0) or 0)
+    full_every = int(params.get('eval_full_every', 1) or 1)
+
+    if subset_size <= 0 or subset_size >= total:
+        return 0, total, True
+    if epoch % full_every == 0 or epoch >= params.get('epochs', epoch):
+        return 0, total, True
+
+    num_windows = (total + subset_size - 1) // subset_size
+    start = ((epoch - 1) % num_windows) * subset_size
+    return start, min(start + subset_size, total), False
+
+
 def normal_test(epoch, model, data_loader, params, handle, poison=False):
-    """优化测试函数，减少不必要的操作"""
+    """
+    优化测试函数，减少不必要的操作
+
+    启用轮换子集评估时返回的是子集准确度，handle.last_eval_full 标明本次是否为完整评估
+    """
     # 使用当前任务的logger
     logger = handle.logger
     
+    if params.get('eval_cached_tensor', True) and handle.test_dataset is not None:
+        images, labels = handle.get_test_tensors()
+        start, end, is_full = _select_eval_range(epoch, params, labels.size(0))
+        loss_sum, correct = evaluate_tensors(model, images[start:end], labels[start:end],
+                                             int(params.get('eval_batch_size', 1024)))
+
+        data_num = end - start
+        test_loss = loss_sum.item() / data_num
+        correct = int(correct.item())
+        accuracy = 100.00 * correct / data_num
+
+        logger.info('___Global_Test___g_epoch:{}  Average loss: {:.4f} Accuracy: {}/{} ({:.2f}%){}'.format(
+            epoch, test_loss, correct, data_num, accuracy, '' if is_full else ' [subset {}:{}]'.format(start, end)))
+
+        # 子集评估的准确度不是完整测试集准确度，record_global_accuracy 据此跳过入库
+        handle.last_eval_full = is_full
+        return accuracy
+
+    handle.last_eval_full = True
     model.eval()
     test_loss = 0.0
     correct = 0
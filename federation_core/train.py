@@ -1,4 +1,7 @@
+import contextlib
 import logging
+import math
+import time
 import torch
 from torch import nn
 from device import device  # 你的 device 定义（例如 torch.device("cuda") / cpu）
@@ -26,7 +29,14 @@ def standard_train(epoch, dataset_size, client, params, model, dataset, handle):
     # 使用当前任务的logger
     logger = handle.logger
     
+    # CPU 加速模式：model 是任务共享的加速实例，前向走编译后的 runner
+    accelerator = getattr(handle, 'accelerator', None)
+    if accelerator is not None and model is not accelerator.module:
+        accelerator = None
+    runner = accelerator.runner if accelerator is not None else model
+
     model.train()
+    runner.train()
     index = -1
     local_epoch = int(params.get('local_epochs', 1))
     lr = float(params.get('lr', 0.01))
@@ -45,6 +55,23 @@ def standard_train(epoch, dataset_size, client, params, model, dataset, handle):
 
     data_iterator = _get_data_iterator(dataset)
 
+    # 本地训练预算：local_steps 固定优化步数（替代 local_epochs），local_deadline_seconds 墙钟截止时间
+    local_steps = int(params.get('local_steps', 0) or 0)
+    deadline = float(params.get('local_deadline_seconds', 0) or 0)
+    try:
+        steps_per_epoch = len(data_iterator)
+    except TypeError:
+        steps_per_epoch = 0
+    if local_steps > 0:
+        planned_steps = local_steps
+        local_epoch = math.ceil(local_steps / steps_per_epoch) if steps_per_epoch else local_steps
+    else:
+        planned_steps = local_epoch * steps_per_epoch
+    steps = 0
+    avg_loss = float('nan')
+    stop_reason = None
+    start_time = time.monotonic()
+
     # 若 dataset 是 DataLoader，确保用户设置 pin_memory=True 和合理 num_workers，否则这一部分可能仍然是瓶颈。
     use_amp = (device.type == 'cuda') and torch.cuda.is_available()
     scaler = torch.cuda.amp.GradScaler() if use_amp else None
@@ -72,6 +99,8 @@ def standard_train(epoch, dataset_size, client, params, model, dataset, handle):
             # 移动到设备（non_blocking 以配合 pin_memory）
             images = images.to(device, non_blocking=True)
             labels = labels.to(device, non_blocking=True)
+            if accelerator is not None:
+                images = images.contiguous(memory_format=torch.channels_last)
             batch_size = images.size(0)
             if batch_size == 0:
                 continue
@@ -88,8 +117,9 @@ def standard_train(epoch, dataset_size, client, params, model, dataset, handle):
                 scaler.step(optimizer)
                 scaler.update()
             else:
-                outputs = model(images)
-                loss = loss_func(outputs, labels)
+                with accelerator.autocast() if accelerator is not None else contextlib.nullcontext():
+                    outputs = runner(images)
+                    loss = loss_func(outputs, labels)
                 loss.backward()
                 optimizer.step()
 
@@ -99,6 +129,14 @@ def standard_train(epoch, dataset_size, client, params, model, dataset, handle):
             correct_tensor += preds.eq(labels).sum()
             processed += batch_size
 
+            steps += 1
+            if local_steps > 0 and steps >= local_steps:
+                stop_reason = 'steps'
+                break
+            if deadline > 0 and time.monotonic() - start_time >= deadline:
+                stop_reason = 'deadline'
+                break
+
         # epoch 结束，移动统计到 cpu 并记录
         if processed == 0:
             avg_loss = float('nan')
@@ -111,5 +149,24 @@ def standard_train(epoch, dataset_size, client, params, model, dataset, handle):
         logger.info('___Local_Train , g_epoch {:3d}, l_epoch {:3d}, local model {},  Average loss: {:.4f}, Accuracy: {}/{} ({:.4f}%)'.format(
             epoch, local_ep + 1, client, avg_loss, int(correct_tensor.cpu().item()), processed, accuracy))
 
+        if stop_reason is not None:
+            break
+
+    elapsed = time.monotonic() - start_time
+    handle.client_train_stats[client] = {
+        'steps': steps,
+        'planned_steps': planned_steps,
+        'elapsed': elapsed,
+        'stop_reason': stop_reason or 'completed'
+    }
+    if not math.isnan(avg_loss):
+        # 最近一次本地损失，供 power_of_choice 采样使用（NaN 不记录）
+        handle.client_train_stats[client]['loss'] = avg_loss
+    logger.info('___Local_Train_Budget , g_epoch {:3d}, local model {}, steps {}/{}, {:.2f}s, stop: {}'.format(
+        epoch, client, steps, planned_steps, elapsed, stop_reason or 'completed'))
+
     # 返回模型参数副本（与原来接口一致）
+    if accelerator is not None:
+        # 共享实例会被下一个客户端覆盖，必须返回拷贝
+        return accelerator.state_dict()
     return model.state_dict()
\ No newline at end of file
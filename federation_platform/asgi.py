@@ -5,11 +5,16 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+
+预测与任务状态接口是异步视图，在 ASGI 服务器下运行（如
+``uvicorn federation_platform.asgi:application``）时一个 worker 可同时处理多个请求。
 """
 
 import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'federation_platform.settings')
+# 标记为服务进程，federation_app 据此在启动时预热预测模型（见 federation_app/apps.py）
+os.environ.setdefault('FEDERATION_SERVING', '1')
 
 application = get_asgi_application()
\ No newline at end of file
@@ -83,4 +83,30 @@ FEDERATION_CONFIG = {
     'model_save_dir': 'saved_models/',
     'log_dir': 'logs/',
     'core_path': FEDERATION_CORE_PATH,
-}
\ No newline at end of file
+}
+# 进程内模型预测服务配置
+PREDICTION_CONFIG = {
+    'model_dir': None,           # 发布模型目录，为空时使用 federation_core/saved_models
+    'model_cache_size': 8,       # 最多缓存的模型个数
+    'model_cache_memory_mb': 512,  # 缓存模型参数内存上限（MB）
+    'max_batch_images': 1000,    # 批量预测单次最多图像数
+    'max_batch_bytes': 200 * 1024 * 1024,  # 批量预测单次图像（zip 按解压后大小）总字节上限
+    'batch_chunk_size': 256,     # 批量预测每次前向的最大批大小
+    'decode_workers': 4,         # 批量预测并行解码线程数
+    'result_cache_size': 10000,  # 预测结果缓存条目上限（0 关闭缓存）
+    'result_cache_ttl': 3600,    # 预测结果缓存有效期（秒）
+    'preload_on_startup': True,  # 服务进程（ASGI/WSGI 入口或 runserver）启动时预热加载已上线任务的模型
+    'watch_model_files': True,   # 监听模型文件，重新发布后热替换常驻模型
+    'watch_debounce': 1.0,       # 同一模型文件连续变更的合并窗口（秒）
+    'watch_poll_interval': 5.0,  # 未安装 watchdog 时的轮询间隔（秒）
+    'onnx_intra_op_threads': 2,  # onnxruntime 推理后端每次推理的 intra-op 线程数
+}
+
+# ASGI 异步视图（预测、任务状态）的线程池与背压
+ASYNC_CONFIG = {
+    'inference_workers': 8,         # 推理线程池大小（只做缓存查询、解码和提交，微批结果在事件循环上等待）
+    'chain_workers': 4,             # Web3 / 支付线程池大小
+    'status_workers': 4,            # 任务状态查询线程池大小
+    'max_inflight_per_model': 32,   # 每个模型同时处理中的预测请求上限，超出返回 429
+    'retry_after': 1,               # 429 响应的 Retry-After（秒）
+}
@@ -11,5 +11,7 @@ import os
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'federation_platform.settings')
+# 标记为服务进程，federation_app 据此在启动时预热预测模型（见 federation_app/apps.py）
+os.environ.setdefault('FEDERATION_SERVING', '1')
 
 application = get_wsgi_application()
\ No newline at end of file